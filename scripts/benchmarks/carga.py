@@ -0,0 +1,569 @@
+# scripts/benchmarks/carga.py
+"""
+Prueba de carga de punta a punta sin red externa. Levanta Canvas y OpenAI
+falsos, la web y el worker reales (SQLite temporal o el Postgres que se
+indique) y simula estudiantes que:
+1. entran por LTI (/lti/login → authorize de Canvas → /lti/launch),
+2. preguntan (POST /),
+3. hacen polling de /estado_consulta hasta la respuesta.
+
+Reporta throughput, latencias p50/p95/p99 por paso y de punta a punta, y
+CPU/RSS de la web y el worker.
+
+    python scripts/benchmarks/carga.py --usuarios 20 --duracion 120
+    python scripts/benchmarks/carga.py --salida base.json          # guardar una base
+    python scripts/benchmarks/carga.py --comparar base.json        # medir un cambio (exit 1 si empeora)
+    python scripts/benchmarks/carga.py --solo-falsos               # solo los servidores falsos
+
+La latencia de punta a punta incluye hasta un intervalo de polling
+(--intervalo-polling), igual que la que percibe el navegador.
+"""
+import argparse
+import html
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, RAIZ)
+
+from servidor_base import Comportamiento
+from falso_canvas import CanvasFalso
+from falso_openai import OpenAIFalso, Escenario
+import resultados
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CLIENT_ID = "bench-client"
+DEPLOYMENT_ID = "bench-deployment"
+COURSE_ID = "bench-curso"
+ASISTENTE_ID = "asst_bench"
+VECTOR_STORE_ID = "vs_bench"
+ESTADOS_TERMINALES = ("completado", "error")
+_PATRON_CONSULTA = re.compile(r'id="consulta_id" value="([^"]+)"')
+_PATRON_CAMPO = re.compile(r'name="(\w+)" value="([^"]*)"')
+
+# Preguntas repetidas entre estudiantes (ejercitan la caché y la búsqueda de similares)
+PREGUNTAS_FRECUENTES = [
+    "¿Qué es la elasticidad precio de la demanda?",
+    "¿Cuándo se entrega el trabajo final?",
+    "¿Cómo interpreto el coeficiente de una regresión lineal?",
+    "¿Qué diferencia hay entre costo fijo y costo variable?",
+]
+TEMAS = ["la elasticidad", "el costo marginal", "una regresión", "el punto de equilibrio",
+         "la demanda agregada", "un intervalo de confianza", "el valor presente neto"]
+
+# Métricas que se comparan contra la base y qué dirección es mejor
+METRICAS = {
+    "throughput.consultas_por_segundo": "mayor",
+    "consultas_fallidas.proporcion": "menor",
+    "latencias.de_punta_a_punta.p50_ms": "menor",
+    "latencias.de_punta_a_punta.p95_ms": "menor",
+    "latencias.de_punta_a_punta.p99_ms": "menor",
+    "latencias.enviar.p95_ms": "menor",
+    "latencias.estado.p95_ms": "menor",
+    "latencias.lti_launch.p95_ms": "menor",
+    "recursos.web.cpu_ms_por_consulta": "menor",
+    "recursos.worker.cpu_ms_por_consulta": "menor",
+    "recursos.web.rss_max_mb": "menor",
+    "recursos.worker.rss_max_mb": "menor",
+}
+
+
+# === Entorno de la app ===
+def variables_app(args, canvas, openai, trabajo):
+    """Variables de entorno de la web y el worker apuntando a los servidores falsos."""
+    return {
+        "DATABASE_URL": args.database_url or "sqlite:///" + os.path.join(trabajo, "benchmark.db"),
+        "SECRET_KEY": "benchmark",
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": f"{openai.url}/v1",
+        "CANVAS_TOKEN": "benchmark",
+        "CANVAS_BASE_URL": f"{canvas.url}/api/v1",
+        "CANVAS_WEB_URL": canvas.url,
+        "CANVAS_ISSUER": canvas.url,
+        "CANVAS_JWKS_URL": f"{canvas.url}/api/lti/security/jwks",
+        "CANVAS_LOGIN_URL": f"{canvas.url}/api/lti/authorize_redirect",
+        "CANVAS_CLIENT_ID": CLIENT_ID,
+        "LIMITE_CONSULTAS_MENSUAL": "100000000",
+        "POLLING_INTERVAL": str(args.polling_worker),
+        "LOG_LEVEL": "WARNING",
+        "METRICAS_PUERTO_WORKER": "0",
+        "TEMP_DIR": os.path.join(trabajo, "temp_files"),
+        "DIRECTORIO_ARCHIVO": os.path.join(trabajo, "archivo_historico"),
+    }
+
+
+def sembrar_db(variables):
+    """Migra el esquema y crea el curso, el asistente y su vínculo (idempotente)."""
+    os.environ.update(variables)  # shared.config se lee al importar
+    from shared.helpers.helpers import create_app
+    from shared.models.db import db, Curso, Asistente, curso_asistente
+    from shared.models.migraciones import migrar
+
+    app = create_app()
+    with app.app_context():
+        migrar()
+        if not db.session.get(Curso, COURSE_ID):
+            db.session.add(Curso(
+                course_id=COURSE_ID,
+                nombre="Curso de carga",
+                lti_deployment_id=DEPLOYMENT_ID,
+                vector_store_id=VECTOR_STORE_ID,
+                asistente_principal_id=ASISTENTE_ID
+            ))
+        if not db.session.get(Asistente, ASISTENTE_ID):
+            db.session.add(Asistente(
+                asistente_id=ASISTENTE_ID,
+                nombre="Asistente de carga",
+                categoria="externo",
+                subtipo="general",
+                vector_store_id=VECTOR_STORE_ID
+            ))
+        db.session.flush()
+        vinculo = db.session.execute(
+            curso_asistente.select().where(curso_asistente.c.course_id == COURSE_ID)
+        ).first()
+        if not vinculo:
+            db.session.execute(curso_asistente.insert().values(
+                course_id=COURSE_ID, asistente_id=ASISTENTE_ID, rol="principal"
+            ))
+        db.session.commit()
+
+
+# === Procesos de la app ===
+def _lanzar(comando, entorno, ruta_log):
+    log = open(ruta_log, "w", encoding="utf-8")
+    return subprocess.Popen(comando, cwd=RAIZ, env=entorno, stdout=log, stderr=subprocess.STDOUT)
+
+
+def iniciar_procesos(args, variables, trabajo):
+    entorno = {**os.environ, **variables}
+    entorno["PYTHONPATH"] = os.pathsep.join(filter(None, [RAIZ, os.environ.get("PYTHONPATH")]))
+    if args.servidor_web == "gunicorn":
+        comando_web = [
+            sys.executable, "-m", "gunicorn", "--config", os.path.join("web", "gunicorn.conf.py"),
+            "--bind", f"127.0.0.1:{args.puerto_web}",
+            "--workers", "1", "--worker-class", "gthread", "--threads", str(args.hilos_web),
+            "web.app:app"
+        ]
+    else:
+        comando_web = [
+            sys.executable, "-m", "flask", "--app", "web.app:app", "run",
+            "--port", str(args.puerto_web), "--with-threads"
+        ]
+    web = _lanzar(comando_web, entorno, os.path.join(trabajo, "web.log"))
+    worker = _lanzar([sys.executable, os.path.join("worker", "worker.py")], entorno,
+                     os.path.join(trabajo, "worker.log"))
+    return web, worker
+
+
+def esperar_web(url, proceso, limite=60):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError("La web terminó al iniciar (ver web.log)")
+        try:
+            requests.get(f"{url}/", timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f"La web no respondió en {limite}s")
+
+
+def detener(proceso):
+    if proceso.poll() is not None:
+        return
+    proceso.terminate()
+    try:
+        proceso.wait(10)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+
+
+# === Recursos (CPU y memoria) ===
+def _descendientes(pid):
+    """pid y todos sus descendientes según /proc (gunicorn: maestro + workers)."""
+    pids = [pid]
+    for actual in pids:
+        try:
+            for tid in os.listdir(f"/proc/{actual}/task"):
+                with open(f"/proc/{actual}/task/{tid}/children") as f:
+                    pids.extend(int(hijo) for hijo in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def _uso(pid):
+    """(cpu_segundos, rss_bytes) del proceso y sus descendientes; (None, None) si no se puede medir."""
+    if psutil is not None:
+        try:
+            raiz = psutil.Process(pid)
+            procesos = [raiz] + raiz.children(recursive=True)
+        except psutil.Error:
+            return None, None
+        cpu = rss = 0
+        for proceso in procesos:
+            try:
+                tiempos = proceso.cpu_times()
+                cpu += tiempos.user + tiempos.system
+                rss += proceso.memory_info().rss
+            except psutil.Error:
+                pass
+        return cpu, rss
+
+    if not os.path.exists(f"/proc/{pid}"):
+        return None, None
+    tick = os.sysconf("SC_CLK_TCK")
+    pagina = os.sysconf("SC_PAGE_SIZE")
+    cpu = rss = 0
+    for actual in _descendientes(pid):
+        try:
+            with open(f"/proc/{actual}/stat") as f:
+                campos = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(campos[11]) + int(campos[12])) / tick  # utime + stime
+            rss += int(campos[21]) * pagina
+        except (OSError, IndexError, ValueError):
+            pass
+    return cpu, rss
+
+
+class MonitorRecursos(threading.Thread):
+    """Muestrea CPU acumulada y RSS de cada proceso durante la carga."""
+
+    INTERVALO = 0.5
+
+    def __init__(self, procesos):
+        super().__init__(daemon=True, name="monitor-recursos")
+        self.procesos = procesos  # nombre -> pid
+        self.cpu_inicial = {}
+        self.cpu_final = {}
+        self.rss_max = {}
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.is_set():
+            for nombre, pid in self.procesos.items():
+                cpu, rss = _uso(pid)
+                if cpu is None:
+                    continue
+                self.cpu_inicial.setdefault(nombre, cpu)
+                self.cpu_final[nombre] = cpu
+                self.rss_max[nombre] = max(self.rss_max.get(nombre, 0), rss)
+            self._detener.wait(self.INTERVALO)
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+    def resumen(self, duracion, consultas):
+        datos = {}
+        for nombre in self.procesos:
+            if nombre not in self.cpu_final:
+                datos[nombre] = None
+                continue
+            cpu = self.cpu_final[nombre] - self.cpu_inicial[nombre]
+            datos[nombre] = {
+                "cpu_s": round(cpu, 2),
+                "cpu_pct": round(cpu / duracion * 100, 1),
+                "cpu_ms_por_consulta": round(cpu * 1000 / consultas, 2) if consultas else None,
+                "rss_max_mb": round(self.rss_max[nombre] / 2 ** 20, 1)
+            }
+        return datos
+
+
+# === Estudiantes simulados ===
+class Registro:
+    """Mediciones de todos los usuarios virtuales (seguro entre hilos)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}          # paso -> [segundos]
+        self.errores = Counter()     # paso -> peticiones fallidas (excepción o HTTP >= 400)
+        self.consultas = Counter()   # estado final -> n
+        self.de_punta_a_punta = []
+        self.polls = []
+        self.peticiones = 0
+
+    def medir(self, paso, segundos, ok=True):
+        with self._lock:
+            self.peticiones += 1
+            self.latencias.setdefault(paso, []).append(segundos)
+            if not ok:
+                self.errores[paso] += 1
+
+    def consulta(self, estado, segundos=None, polls=None):
+        with self._lock:
+            self.consultas[estado] += 1
+            # Solo las completadas: un error rápido no debe mejorar los percentiles
+            if segundos is not None and estado == "completado":
+                self.de_punta_a_punta.append(segundos)
+            if polls is not None:
+                self.polls.append(polls)
+
+
+class UsuarioVirtual(threading.Thread):
+
+    def __init__(self, numero, args, web, canvas, registro, fin):
+        super().__init__(daemon=True, name=f"usuario-{numero}")
+        self.user_id = f"bench-usuario-{numero}"
+        self.args = args
+        self.web = web
+        self.canvas = canvas
+        self.registro = registro
+        self.fin = fin
+        self.http = requests.Session()
+        self.cookie = None  # la cookie de Flask es Secure: sobre http se envía a mano
+
+    def _pedir(self, paso, metodo, url, **kwargs):
+        """Petición HTTP medida con la cookie de sesión de la app; None si falló la conexión."""
+        cabeceras = {"Cookie": f"session={self.cookie}"} if self.cookie else {}
+        inicio = time.monotonic()
+        try:
+            respuesta = self.http.request(metodo, url, headers=cabeceras, allow_redirects=False,
+                                          timeout=30, **kwargs)
+        except requests.RequestException:
+            self.registro.medir(paso, time.monotonic() - inicio, ok=False)
+            return None
+        self.registro.medir(paso, time.monotonic() - inicio, ok=respuesta.status_code < 400)
+        sesion = respuesta.cookies.get("session")
+        if sesion:
+            self.cookie = sesion
+        return respuesta
+
+    def entrar(self):
+        """Login LTI 1.3 completo; True si terminó con la sesión iniciada."""
+        r = self._pedir("lti_login", "GET", f"{self.web}/lti/login", params={
+            "iss": self.canvas,
+            "login_hint": self.user_id,
+            "target_link_uri": f"{self.web}/lti/launch",
+            "client_id": CLIENT_ID,
+            "lti_deployment_id": DEPLOYMENT_ID
+        })
+        if r is None or r.status_code != 302:
+            return False
+        try:
+            autorizado = self.http.get(r.headers["Location"], timeout=30)
+        except requests.RequestException:
+            return False
+        campos = {nombre: html.unescape(valor) for nombre, valor in _PATRON_CAMPO.findall(autorizado.text)}
+        r = self._pedir("lti_launch", "POST", f"{self.web}/lti/launch", data=campos)
+        return r is not None and r.status_code == 302
+
+    def _pregunta(self, n):
+        if random.random() < self.args.repetidas:
+            return random.choice(PREGUNTAS_FRECUENTES)
+        return f"¿Me explicas {random.choice(TEMAS)} con un ejemplo? ({self.user_id}, pregunta {n})"
+
+    def preguntar(self, n):
+        inicio = time.monotonic()
+        r = self._pedir("enviar", "POST", f"{self.web}/", data={
+            "pregunta": self._pregunta(n),
+            "asistente_id": ASISTENTE_ID
+        })
+        encontrado = _PATRON_CONSULTA.search(r.text) if r is not None and r.status_code == 200 else None
+        if not encontrado:
+            self.registro.consulta("rechazada")
+            return
+
+        consulta_id = encontrado.group(1)
+        polls = 0
+        while time.monotonic() - inicio < self.args.timeout_consulta:
+            time.sleep(self.args.intervalo_polling)
+            r = self._pedir("estado", "GET", f"{self.web}/estado_consulta/{consulta_id}")
+            polls += 1
+            if r is None or r.status_code != 200:
+                continue
+            estado = r.json().get("estado")
+            if estado in ESTADOS_TERMINALES:
+                self.registro.consulta(estado, time.monotonic() - inicio, polls)
+                return
+        self.registro.consulta("timeout", polls=polls)
+
+    def run(self):
+        if not self.entrar():
+            self.registro.consulta("sin_sesion")
+            return
+        n = 0
+        while time.monotonic() < self.fin:
+            if self.args.preguntas_por_usuario and n >= self.args.preguntas_por_usuario:
+                return
+            self.preguntar(n)
+            n += 1
+            if self.args.pausa:
+                time.sleep(random.expovariate(1 / self.args.pausa))
+
+
+# === Reporte ===
+def armar_reporte(args, registro, duracion, recursos, canvas, openai):
+    completadas = registro.consultas.get("completado", 0)
+    terminadas = completadas + registro.consultas.get("error", 0)
+    enviadas = sum(registro.consultas.values())
+    fallidas = enviadas - completadas  # error, timeout, rechazada, sin_sesion
+    latencias = {paso: resultados.resumen_latencias(valores) for paso, valores in registro.latencias.items()}
+    latencias["de_punta_a_punta"] = resultados.resumen_latencias(registro.de_punta_a_punta)
+    return {
+        "entorno": resultados.entorno(),
+        "parametros": {clave: valor for clave, valor in vars(args).items() if clave not in ("salida", "comparar")},
+        "duracion_s": round(duracion, 1),
+        "consultas": dict(registro.consultas),
+        "consultas_fallidas": {
+            "n": fallidas,
+            "proporcion": round(fallidas / enviadas, 4) if enviadas else None
+        },
+        "throughput": {
+            "consultas_por_segundo": round(completadas / duracion, 3),
+            "peticiones_por_segundo": round(registro.peticiones / duracion, 2)
+        },
+        "latencias": latencias,
+        "errores_http": dict(registro.errores),
+        "polls_por_consulta": round(sum(registro.polls) / len(registro.polls), 2) if registro.polls else None,
+        "recursos": recursos.resumen(duracion, terminadas),
+        "servidores_falsos": {"canvas": canvas.estadisticas(), "openai": openai.estadisticas()}
+    }
+
+
+def imprimir_reporte(datos):
+    print(f"\n⏱️ {datos['duracion_s']}s · consultas {datos['consultas']} · "
+          f"fallidas {datos['consultas_fallidas']['n']} ({datos['consultas_fallidas']['proporcion']})")
+    print(f"🚀 {datos['throughput']['consultas_por_segundo']} consultas/s · "
+          f"{datos['throughput']['peticiones_por_segundo']} peticiones/s · "
+          f"{datos['polls_por_consulta']} polls por consulta")
+    print(f"\n{'paso':<18}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errores':>9}")
+    for paso, lat in datos["latencias"].items():
+        print(f"{paso:<18}{lat['n']:>7}{str(lat['p50_ms']):>10}{str(lat['p95_ms']):>10}"
+              f"{str(lat['p99_ms']):>10}{str(lat['max_ms']):>10}{datos['errores_http'].get(paso, 0):>9}")
+    print()
+    for nombre, uso in datos["recursos"].items():
+        if uso:
+            print(f"🖥️ {nombre}: CPU {uso['cpu_s']}s ({uso['cpu_pct']}%), "
+                  f"{uso['cpu_ms_por_consulta']} ms/consulta, RSS máx {uso['rss_max_mb']} MB")
+        else:
+            print(f"🖥️ {nombre}: sin datos de recursos")
+    for nombre, rutas in datos["servidores_falsos"].items():
+        print(f"🔌 {nombre} falso: {rutas}")
+
+
+# === Principal ===
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Prueba de carga de punta a punta con Canvas y OpenAI falsos.")
+    carga = parser.add_argument_group("carga")
+    carga.add_argument("--usuarios", type=int, default=10, help="Estudiantes simultáneos")
+    carga.add_argument("--duracion", type=float, default=60, help="Segundos enviando preguntas")
+    carga.add_argument("--rampa", type=float, default=5, help="Segundos para arrancar a todos los usuarios")
+    carga.add_argument("--preguntas-por-usuario", type=int, default=0, help="0 = hasta cumplir la duración")
+    carga.add_argument("--pausa", type=float, default=2.0, help="Pausa media entre preguntas (s, exponencial)")
+    carga.add_argument("--intervalo-polling", type=float, default=0.5)
+    carga.add_argument("--timeout-consulta", type=float, default=180)
+    carga.add_argument("--repetidas", type=float, default=0.1, help="Fracción de preguntas frecuentes (caché)")
+
+    app = parser.add_argument_group("app")
+    app.add_argument("--database-url", help="Por defecto, SQLite en el directorio de trabajo")
+    app.add_argument("--directorio", help="Directorio de trabajo (logs, DB); por defecto uno temporal")
+    app.add_argument("--servidor-web", choices=("gunicorn", "flask"), default="gunicorn")
+    app.add_argument("--puerto-web", type=int, default=5055)
+    app.add_argument("--hilos-web", type=int, default=32)
+    app.add_argument("--polling-worker", type=int, default=1, help="POLLING_INTERVAL del worker")
+    app.add_argument("--calentamiento", type=float, default=5,
+                     help="Segundos antes de medir (migraciones y primera sincronización)")
+
+    falsos = parser.add_argument_group("servidores falsos")
+    falsos.add_argument("--openai-latencia-ms", type=float, default=50)
+    falsos.add_argument("--openai-variacion-ms", type=float, default=20)
+    falsos.add_argument("--openai-fallas", type=float, default=0.0)
+    falsos.add_argument("--openai-limite-rpm", type=int, default=0)
+    falsos.add_argument("--openai-cola-ms", type=float, default=300)
+    falsos.add_argument("--openai-deltas", type=int, default=20)
+    falsos.add_argument("--openai-intervalo-delta-ms", type=float, default=30)
+    falsos.add_argument("--canvas-latencia-ms", type=float, default=30)
+    falsos.add_argument("--canvas-variacion-ms", type=float, default=10)
+    falsos.add_argument("--canvas-fallas", type=float, default=0.0)
+    falsos.add_argument("--canvas-limite-rpm", type=int, default=0)
+    falsos.add_argument("--canvas-archivos", type=int, default=20)
+    falsos.add_argument("--canvas-tamano-kb", type=int, default=64)
+    falsos.add_argument("--solo-falsos", action="store_true",
+                        help="Solo levantar los servidores falsos e imprimir las variables de entorno")
+
+    salida = parser.add_argument_group("resultados")
+    salida.add_argument("--salida", help="Guardar los resultados en este JSON")
+    salida.add_argument("--comparar", help="JSON de una corrida base para comparar")
+    salida.add_argument("--tolerancia", type=float, default=10, help="%% de empeoramiento tolerado")
+    return parser.parse_args()
+
+
+def main():
+    args = _argumentos()
+    trabajo = args.directorio or tempfile.mkdtemp(prefix="benchmark_")
+    os.makedirs(trabajo, exist_ok=True)
+
+    canvas = CanvasFalso(
+        Comportamiento(args.canvas_latencia_ms, args.canvas_variacion_ms, args.canvas_fallas, args.canvas_limite_rpm),
+        args.canvas_archivos, args.canvas_tamano_kb
+    ).iniciar_en_hilo()
+    openai = OpenAIFalso(
+        Comportamiento(args.openai_latencia_ms, args.openai_variacion_ms, args.openai_fallas, args.openai_limite_rpm),
+        Escenario(args.openai_cola_ms, args.openai_deltas, args.openai_intervalo_delta_ms)
+    ).iniciar_en_hilo()
+    variables = variables_app(args, canvas, openai, trabajo)
+
+    if args.solo_falsos:
+        print("🔌 Servidores falsos listos. Para la app:")
+        for clave, valor in variables.items():
+            print(f"export {clave}={valor}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            return
+
+    print(f"📂 Directorio de trabajo: {trabajo}")
+    sembrar_db(variables)
+    web, worker = iniciar_procesos(args, variables, trabajo)
+    url_web = f"http://127.0.0.1:{args.puerto_web}"
+    try:
+        esperar_web(url_web, web)
+        time.sleep(args.calentamiento)
+
+        recursos = MonitorRecursos({"web": web.pid, "worker": worker.pid})
+        recursos.start()
+        registro = Registro()
+        inicio = time.monotonic()
+        fin = inicio + args.duracion
+        print(f"🏁 {args.usuarios} usuarios durante {args.duracion:g}s contra {url_web}")
+
+        usuarios = [UsuarioVirtual(i, args, url_web, canvas.url, registro, fin) for i in range(args.usuarios)]
+        for usuario in usuarios:
+            usuario.start()
+            time.sleep(args.rampa / max(1, args.usuarios))
+        for usuario in usuarios:
+            usuario.join()
+        duracion = time.monotonic() - inicio
+        recursos.detener()
+    finally:
+        detener(web)
+        detener(worker)
+        canvas.shutdown()
+        openai.shutdown()
+
+    datos = armar_reporte(args, registro, duracion, recursos, canvas, openai)
+    imprimir_reporte(datos)
+    if args.salida:
+        resultados.guardar(args.salida, datos)
+    if args.comparar:
+        filas = resultados.comparar(datos, resultados.cargar(args.comparar), METRICAS, args.tolerancia)
+        if resultados.imprimir_comparacion(filas, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
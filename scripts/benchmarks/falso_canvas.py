@@ -0,0 +1,137 @@
+# scripts/benchmarks/falso_canvas.py
+"""
+Canvas falso: API de archivos (paginada con Link, como la real), descargas,
+JWKS y el authorize_redirect del login LTI 1.3, que firma un id_token RS256
+con su propia clave. La app se apunta con CANVAS_BASE_URL, CANVAS_ISSUER,
+CANVAS_JWKS_URL y CANVAS_LOGIN_URL (ver variables_app en carga.py).
+
+    python scripts/benchmarks/falso_canvas.py --puerto 8092 --archivos 50
+"""
+import argparse
+import html
+import json
+import time
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from servidor_base import ManejadorBase, ServidorFalso, Comportamiento
+
+KID = "bench-1"
+CLAIM_CONTEXT = "https://purl.imsglobal.org/spec/lti/claim/context"
+CLAIM_DEPLOYMENT_ID = "https://purl.imsglobal.org/spec/lti/claim/deployment_id"
+EXTENSIONES = ("txt", "md", "csv")
+FECHA_ARCHIVOS = "2025-03-01T12:00:00Z"
+
+
+class ManejadorCanvas(ManejadorBase):
+    rutas = [
+        ("GET", r"/api/v1/courses/([^/]+)/files", "listar_archivos"),
+        ("GET", r"/files/(\d+)/download", "descargar"),
+        ("GET", r"/api/lti/security/jwks", "jwks"),
+        ("GET", r"/api/lti/authorize_redirect", "autorizar"),
+    ]
+
+    # --- Rate limit con el formato de Canvas (403 + X-Rate-Limit-Remaining) ---
+    def cabeceras_limite(self, restantes, reinicio):
+        return {"X-Rate-Limit-Remaining": str(restantes)}
+
+    def rechazar_por_limite(self, reinicio):
+        self.enviar(403, b"403 Forbidden (Rate Limit Exceeded)", "text/plain")
+
+    # --- Archivos ---
+    def listar_archivos(self, course_id):
+        por_pagina = int(self.query.get("per_page", 10))
+        pagina = int(self.query.get("page", 1))
+        total = self.server.archivos
+        inicio = (pagina - 1) * por_pagina
+        ids = range(1000 + inicio, 1000 + min(total, inicio + por_pagina))
+
+        cabeceras = {}
+        if inicio + por_pagina < total:
+            siguiente = f"{self.server.url}/api/v1/courses/{course_id}/files?page={pagina + 1}&per_page={por_pagina}"
+            cabeceras["Link"] = f'<{siguiente}>; rel="next"'
+        self.enviar_json(200, [self.server.archivo(file_id) for file_id in ids], cabeceras)
+
+    def descargar(self, file_id):
+        self.enviar(200, self.server.contenido(int(file_id)), "application/octet-stream")
+
+    # --- LTI ---
+    def jwks(self):
+        self.enviar_json(200, {"keys": [self.server.jwk_publica]}, {"Cache-Control": "max-age=3600"})
+
+    def autorizar(self):
+        """Respuesta form_post de Canvas: formulario con state e id_token para /lti/launch."""
+        q = self.query
+        ahora = int(time.time())
+        claims = {
+            "iss": self.server.url,
+            "aud": q.get("client_id"),
+            "sub": q.get("login_hint"),
+            "nonce": q.get("nonce"),
+            "iat": ahora,
+            "exp": ahora + 300,
+            "name": f"Estudiante {q.get('login_hint')}",
+            CLAIM_DEPLOYMENT_ID: q.get("lti_deployment_id"),
+            CLAIM_CONTEXT: {"id": "bench-curso", "title": "Curso de carga"}
+        }
+        id_token = jwt.encode(claims, self.server.clave_privada, algorithm="RS256", headers={"kid": KID})
+        campos = "".join(
+            f'<input type="hidden" name="{nombre}" value="{html.escape(valor)}">'
+            for nombre, valor in (("state", q.get("state", "")), ("id_token", id_token))
+        )
+        formulario = f'<form method="post" action="{html.escape(q.get("redirect_uri", ""))}">{campos}</form>'
+        self.enviar(200, formulario.encode("utf-8"), "text/html")
+
+
+class CanvasFalso(ServidorFalso):
+    def __init__(self, comportamiento=None, archivos=20, tamano_kb=64, puerto=0):
+        super().__init__(ManejadorCanvas, comportamiento, puerto)
+        self.archivos = archivos
+        self.tamano = tamano_kb * 1024
+        self.clave_privada = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.clave_privada.public_key()))
+        self.jwk_publica = {**jwk, "kid": KID, "alg": "RS256", "use": "sig"}
+
+    def archivo(self, file_id):
+        extension = EXTENSIONES[file_id % len(EXTENSIONES)]
+        nombre = f"apunte_{file_id}.{extension}"
+        return {
+            "id": file_id,
+            "filename": nombre,
+            "display_name": nombre,
+            "size": self.tamano,
+            "updated_at": FECHA_ARCHIVOS,
+            "url": f"{self.url}/files/{file_id}/download"
+        }
+
+    def contenido(self, file_id):
+        if EXTENSIONES[file_id % len(EXTENSIONES)] == "csv":
+            fila = f"{file_id},producto,12.5,3,2025-03-01\n"
+            return ("id,nombre,precio,cantidad,fecha\n" + fila * (self.tamano // len(fila))).encode("utf-8")
+        linea = f"Apunte {file_id}: la elasticidad precio de la demanda mide la sensibilidad de la cantidad.\n"
+        return (linea * (self.tamano // len(linea) + 1)).encode("utf-8")[:self.tamano]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Canvas falso para pruebas de carga.")
+    parser.add_argument("--puerto", type=int, default=8092)
+    parser.add_argument("--latencia-ms", type=float, default=30)
+    parser.add_argument("--variacion-ms", type=float, default=10)
+    parser.add_argument("--fallas", type=float, default=0.0)
+    parser.add_argument("--limite-rpm", type=int, default=0)
+    parser.add_argument("--archivos", type=int, default=20)
+    parser.add_argument("--tamano-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    servidor = CanvasFalso(
+        Comportamiento(args.latencia_ms, args.variacion_ms, args.fallas, args.limite_rpm),
+        args.archivos, args.tamano_kb, args.puerto
+    )
+    print(f"🎓 Canvas falso en {servidor.url} (Ctrl-C para salir)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# scripts/benchmarks/falso_openai.py
+"""
+OpenAI falso con los endpoints que usan la web y el worker: threads, mensajes,
+runs (con streaming SSE como runs.stream del SDK), files y vector stores.
+Envía encabezados x-ratelimit-* y 429 con retry-after-ms como el real, así el
+gobernador de rate limit se comporta igual que en producción.
+
+Se apunta el SDK con OPENAI_BASE_URL=<url>/v1. También se puede correr solo:
+    python scripts/benchmarks/falso_openai.py --puerto 8091 --cola-ms 500
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from servidor_base import ManejadorBase, ServidorFalso, Comportamiento
+
+MODELO = "gpt-4o-mini"
+_PALABRAS = (
+    "la demanda agregada depende del consumo la inversión el gasto público y las exportaciones netas "
+    "un modelo de regresión estima la relación entre variables a partir de datos observados "
+    "el costo marginal iguala al ingreso marginal en el punto de máxima utilidad de la empresa"
+).split()
+
+
+class Escenario:
+    """Forma de las respuestas y tiempos del run (además del Comportamiento HTTP)."""
+
+    def __init__(self, cola_ms=300, deltas=20, intervalo_delta_ms=30, palabras=250, citas=3):
+        self.cola_ms = cola_ms                        # queued → in_progress
+        self.deltas = deltas                          # trozos de texto en el stream
+        self.intervalo_delta_ms = intervalo_delta_ms
+        self.palabras = palabras                      # largo de cada respuesta
+        self.citas = citas                            # anotaciones file_citation por respuesta
+
+
+def _ahora():
+    return int(time.time())
+
+
+class EstadoOpenAI:
+    """Lo que el servidor recuerda entre peticiones (ids, mensajes por run, archivos)."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.mensajes_por_run = {}   # run_id -> mensaje del asistente
+        self.ultimo_por_hilo = {}    # thread_id -> mensaje del asistente más reciente
+        self.runs = {}               # run_id -> run (no streaming)
+        self.archivos = {}           # file_id -> objeto file
+
+    def nuevo_id(self, prefijo):
+        with self._lock:
+            return f"{prefijo}_bench{next(self._ids):08d}"
+
+    def archivos_citables(self, n):
+        with self._lock:
+            ids = list(self.archivos)
+        if not ids:
+            ids = [f"file_bench{i}" for i in range(max(n, 1))]
+        return [random.choice(ids) for _ in range(n)]
+
+
+def _texto_y_anotaciones(escenario, estado):
+    palabras = [random.choice(_PALABRAS) for _ in range(escenario.palabras)]
+    texto = " ".join(palabras)
+    anotaciones = []
+    for i, file_id in enumerate(estado.archivos_citables(escenario.citas)):
+        marcador = f"【4:{i}†apunte_{i}.pdf】"
+        inicio = len(texto)
+        texto += f" {marcador}"
+        anotaciones.append({
+            "type": "file_citation",
+            "text": marcador,
+            "start_index": inicio + 1,
+            "end_index": inicio + 1 + len(marcador),
+            "file_citation": {"file_id": file_id}
+        })
+    return texto, anotaciones
+
+
+def _run(run_id, thread_id, assistant_id, status, usage=None):
+    return {
+        "id": run_id, "object": "thread.run", "created_at": _ahora(),
+        "assistant_id": assistant_id, "thread_id": thread_id, "status": status,
+        "started_at": _ahora() if status != "queued" else None,
+        "completed_at": _ahora() if status == "completed" else None,
+        "expires_at": None, "cancelled_at": None, "failed_at": None,
+        "last_error": None, "incomplete_details": None, "required_action": None,
+        "model": MODELO, "instructions": "", "tools": [{"type": "file_search"}],
+        "metadata": {}, "usage": usage, "temperature": 1.0, "top_p": 1.0,
+        "max_prompt_tokens": None, "max_completion_tokens": None,
+        "truncation_strategy": {"type": "auto", "last_messages": None},
+        "response_format": "auto", "tool_choice": "auto", "parallel_tool_calls": True,
+        "tool_resources": {}
+    }
+
+
+def _mensaje(mensaje_id, thread_id, run_id, assistant_id, contenido, status="completed", role="assistant"):
+    return {
+        "id": mensaje_id, "object": "thread.message", "created_at": _ahora(),
+        "thread_id": thread_id, "run_id": run_id, "assistant_id": assistant_id,
+        "role": role, "content": contenido, "status": status, "attachments": [],
+        "metadata": {}, "completed_at": _ahora() if status == "completed" else None,
+        "incomplete_at": None, "incomplete_details": None
+    }
+
+
+def _contenido_texto(texto, anotaciones):
+    return [{"type": "text", "text": {"value": texto, "annotations": anotaciones}}]
+
+
+def _paso(paso_id, thread_id, run_id, assistant_id, status, usage=None):
+    return {
+        "id": paso_id, "object": "thread.run.step", "created_at": _ahora(),
+        "assistant_id": assistant_id, "thread_id": thread_id, "run_id": run_id,
+        "type": "tool_calls", "status": status,
+        "step_details": {"type": "tool_calls", "tool_calls": [
+            {"id": f"call_{paso_id}", "type": "file_search", "file_search": {}}
+        ]},
+        "usage": usage, "cancelled_at": None, "completed_at": None, "expired_at": None,
+        "failed_at": None, "last_error": None, "metadata": {}
+    }
+
+
+class ManejadorOpenAI(ManejadorBase):
+    rutas = [
+        ("POST", r"/v1/threads", "crear_hilo"),
+        ("POST", r"/v1/threads/([^/]+)/messages", "crear_mensaje"),
+        ("GET", r"/v1/threads/([^/]+)/messages", "listar_mensajes"),
+        ("POST", r"/v1/threads/([^/]+)/runs", "crear_run"),
+        ("GET", r"/v1/threads/([^/]+)/runs/([^/]+)", "obtener_run"),
+        ("POST", r"/v1/files", "subir_archivo"),
+        ("GET", r"/v1/files/([^/]+)", "obtener_archivo"),
+        ("DELETE", r"/v1/files/([^/]+)", "borrar_archivo"),
+        ("POST", r"/v1/vector_stores/([^/]+)/files", "asociar_archivo"),
+        ("GET", r"/v1/vector_stores/([^/]+)/files", "listar_archivos_vs"),
+    ]
+
+    @property
+    def estado(self):
+        return self.server.estado
+
+    @property
+    def escenario(self):
+        return self.server.escenario
+
+    # --- Rate limit con el formato de OpenAI ---
+    def cabeceras_limite(self, restantes, reinicio):
+        return {
+            "x-ratelimit-limit-requests": str(self.server.limite.por_minuto),
+            "x-ratelimit-remaining-requests": str(restantes),
+            "x-ratelimit-reset-requests": f"{reinicio:.1f}s"
+        }
+
+    def rechazar_por_limite(self, reinicio):
+        self.enviar_json(429, {"error": {
+            "message": "Rate limit reached for requests (servidor falso)",
+            "type": "requests", "code": "rate_limit_exceeded"
+        }}, {"retry-after-ms": str(int(reinicio * 1000))})
+
+    def responder_falla(self):
+        self.enviar_json(503, {"error": {"message": "Falla simulada", "type": "server_error"}})
+
+    # --- Threads y mensajes ---
+    def crear_hilo(self):
+        self.enviar_json(200, {
+            "id": self.estado.nuevo_id("thread"), "object": "thread",
+            "created_at": _ahora(), "metadata": {}, "tool_resources": {}
+        })
+
+    def crear_mensaje(self, thread_id):
+        datos = self.json_cuerpo()
+        contenido = _contenido_texto(str(datos.get("content", "")), [])
+        self.enviar_json(200, _mensaje(self.estado.nuevo_id("msg"), thread_id, None, None,
+                                       contenido, role=datos.get("role", "user")))
+
+    def listar_mensajes(self, thread_id):
+        run_id = self.query.get("run_id")
+        if run_id:
+            mensaje = self.estado.mensajes_por_run.get(run_id)
+        else:
+            mensaje = self.estado.ultimo_por_hilo.get(thread_id)
+        datos = [mensaje] if mensaje else []
+        self.enviar_json(200, {
+            "object": "list", "data": datos, "has_more": False,
+            "first_id": datos[0]["id"] if datos else None,
+            "last_id": datos[-1]["id"] if datos else None
+        })
+
+    # --- Runs ---
+    def _guardar_mensaje(self, run_id, mensaje):
+        self.estado.mensajes_por_run[run_id] = mensaje
+        self.estado.ultimo_por_hilo[mensaje["thread_id"]] = mensaje
+
+    def crear_run(self, thread_id):
+        datos = self.json_cuerpo()
+        assistant_id = datos.get("assistant_id")
+        run_id = self.estado.nuevo_id("run")
+        if datos.get("stream"):
+            self._run_en_stream(thread_id, run_id, assistant_id)
+            return
+
+        # Sin streaming (análisis de código del uploader): se completa al primer retrieve
+        texto, anotaciones = _texto_y_anotaciones(self.escenario, self.estado)
+        self._guardar_mensaje(run_id, _mensaje(self.estado.nuevo_id("msg"), thread_id, run_id,
+                                               assistant_id, _contenido_texto(texto, anotaciones)))
+        self.estado.runs[run_id] = _run(run_id, thread_id, assistant_id, "completed",
+                                        {"prompt_tokens": 800, "completion_tokens": 400, "total_tokens": 1200})
+        self.enviar_json(200, _run(run_id, thread_id, assistant_id, "queued"))
+
+    def obtener_run(self, thread_id, run_id):
+        run = self.estado.runs.get(run_id)
+        if not run:
+            self.enviar_json(404, {"error": {"message": f"No run found with id '{run_id}'"}})
+            return
+        self.enviar_json(200, run)
+
+    def _evento(self, nombre, datos):
+        self.enviar_trozo(f"event: {nombre}\ndata: {json.dumps(datos)}\n\n".encode("utf-8"))
+
+    def _run_en_stream(self, thread_id, run_id, assistant_id):
+        """Secuencia de eventos de un run con file_search, como la emite la API."""
+        escenario = self.escenario
+        texto, anotaciones = _texto_y_anotaciones(escenario, self.estado)
+        mensaje_id = self.estado.nuevo_id("msg")
+        paso_id = self.estado.nuevo_id("step")
+        uso_paso = {"prompt_tokens": 1500, "completion_tokens": 20, "total_tokens": 1520}
+        uso_run = {"prompt_tokens": 2500, "completion_tokens": len(texto) // 4,
+                   "total_tokens": 2500 + len(texto) // 4}
+
+        self.iniciar_stream()
+        self._evento("thread.run.created", _run(run_id, thread_id, assistant_id, "queued"))
+        self._evento("thread.run.queued", _run(run_id, thread_id, assistant_id, "queued"))
+        time.sleep(escenario.cola_ms / 1000)
+        self._evento("thread.run.in_progress", _run(run_id, thread_id, assistant_id, "in_progress"))
+        self._evento("thread.run.step.created", _paso(paso_id, thread_id, run_id, assistant_id, "in_progress"))
+        self._evento("thread.run.step.completed",
+                     _paso(paso_id, thread_id, run_id, assistant_id, "completed", uso_paso))
+        self._evento("thread.message.created", _mensaje(mensaje_id, thread_id, run_id, assistant_id,
+                                                        [], status="in_progress"))
+
+        tamano = max(1, len(texto) // max(1, escenario.deltas) + 1)
+        for i in range(0, len(texto), tamano):
+            time.sleep(escenario.intervalo_delta_ms / 1000)
+            self._evento("thread.message.delta", {
+                "id": mensaje_id, "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text",
+                                       "text": {"value": texto[i:i + tamano], "annotations": []}}]}
+            })
+
+        mensaje = _mensaje(mensaje_id, thread_id, run_id, assistant_id, _contenido_texto(texto, anotaciones))
+        self._guardar_mensaje(run_id, mensaje)
+        self._evento("thread.message.completed", mensaje)
+        self._evento("thread.run.completed", _run(run_id, thread_id, assistant_id, "completed", uso_run))
+        self.enviar_trozo(b"event: done\ndata: [DONE]\n\n")
+        self.cerrar_stream()
+
+    # --- Files y vector stores ---
+    def subir_archivo(self):
+        file_id = self.estado.nuevo_id("file")
+        archivo = {
+            "id": file_id, "object": "file", "bytes": len(self.cuerpo), "created_at": _ahora(),
+            "filename": f"{file_id}.txt", "purpose": "assistants", "status": "processed"
+        }
+        self.estado.archivos[file_id] = archivo
+        self.enviar_json(200, archivo)
+
+    def obtener_archivo(self, file_id):
+        archivo = self.estado.archivos.get(file_id)
+        if not archivo:
+            self.enviar_json(404, {"error": {"message": f"No such File object: {file_id}"}})
+            return
+        self.enviar_json(200, archivo)
+
+    def borrar_archivo(self, file_id):
+        self.estado.archivos.pop(file_id, None)
+        self.enviar_json(200, {"id": file_id, "object": "file", "deleted": True})
+
+    def asociar_archivo(self, vector_store_id):
+        file_id = self.json_cuerpo().get("file_id")
+        self.enviar_json(200, {
+            "id": file_id, "object": "vector_store.file", "created_at": _ahora(),
+            "vector_store_id": vector_store_id, "status": "completed",
+            "usage_bytes": self.estado.archivos.get(file_id, {}).get("bytes", 0), "last_error": None
+        })
+
+    def listar_archivos_vs(self, vector_store_id):
+        datos = [
+            {"id": file_id, "object": "vector_store.file", "created_at": a["created_at"],
+             "vector_store_id": vector_store_id, "status": "completed",
+             "usage_bytes": a["bytes"], "last_error": None}
+            for file_id, a in list(self.estado.archivos.items())
+        ]
+        self.enviar_json(200, {"object": "list", "data": datos, "has_more": False,
+                               "first_id": None, "last_id": None})
+
+
+class OpenAIFalso(ServidorFalso):
+    def __init__(self, comportamiento=None, escenario=None, puerto=0):
+        super().__init__(ManejadorOpenAI, comportamiento, puerto)
+        self.escenario = escenario or Escenario()
+        self.estado = EstadoOpenAI()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor OpenAI falso para pruebas de carga.")
+    parser.add_argument("--puerto", type=int, default=8091)
+    parser.add_argument("--latencia-ms", type=float, default=50)
+    parser.add_argument("--variacion-ms", type=float, default=20)
+    parser.add_argument("--fallas", type=float, default=0.0)
+    parser.add_argument("--limite-rpm", type=int, default=0)
+    parser.add_argument("--cola-ms", type=float, default=300)
+    parser.add_argument("--deltas", type=int, default=20)
+    parser.add_argument("--intervalo-delta-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    servidor = OpenAIFalso(
+        Comportamiento(args.latencia_ms, args.variacion_ms, args.fallas, args.limite_rpm),
+        Escenario(args.cola_ms, args.deltas, args.intervalo_delta_ms),
+        args.puerto
+    )
+    print(f"🤖 OpenAI falso en {servidor.url}/v1 (Ctrl-C para salir)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
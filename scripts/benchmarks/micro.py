@@ -0,0 +1,306 @@
+# scripts/benchmarks/micro.py
+"""
+Micro-benchmarks de las funciones de texto que están en el camino de cada
+respuesta (procesar_respuesta_con_fuentes, extraer_fuentes, render HTML) y de
+cada sincronización (normalizar_fecha, convertir_a_txt, es_*), con corpus
+realistas: respuestas largas con muchas citas y CSV/XLSX de 10k a 1M filas.
+
+Por caso mide el tiempo por llamada (mínimo y mediana de varias repeticiones)
+y el pico de memoria con tracemalloc (en una llamada aparte, para no
+inflar el tiempo).
+
+    python scripts/benchmarks/micro.py --salida base_micro.json     # guardar una base
+    python scripts/benchmarks/micro.py --comparar base_micro.json   # exit 1 si algo empeora
+    python scripts/benchmarks/micro.py --rapido --casos respuesta   # solo lo chico y lo que coincida
+
+Los CSV/XLSX se generan una vez en --corpus y se reutilizan entre corridas.
+"""
+import argparse
+import datetime
+import gc
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, RAIZ)
+sys.path.insert(1, os.path.join(RAIZ, "worker"))  # el worker importa "services.x", "openai_utils.x"
+
+import resultados
+
+# shared.config y el worker exigen estas variables al importar; aquí no se usan
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("TEMP_DIR", os.path.join(tempfile.gettempdir(), "benchmark_micro"))
+
+FILAS_CSV = (10_000, 100_000, 1_000_000)
+FILAS_XLSX = (10_000, 100_000)
+_PALABRAS = (
+    "la elasticidad precio de la demanda mide cuánto cambia la cantidad demandada ante un cambio "
+    "en el precio y depende de la existencia de sustitutos del horizonte temporal y de la proporción "
+    "del ingreso que se destina al bien en el corto plazo suele ser menor que en el largo plazo"
+).split()
+
+
+# === Corpus ===
+def respuesta_larga(palabras, citas, seed=7):
+    """
+    Respuesta como las del asistente: secciones numeradas, ### títulos, viñetas
+    mal indentadas y marcadores 【n:m†archivo】. Retorna (texto, anotaciones).
+    """
+    azar = random.Random(seed)
+    archivos = [f"apunte_{i}.pdf" for i in range(max(1, citas // 3))]
+    anotaciones = []
+    partes = []
+    seccion = 1
+    for i in range(palabras):
+        partes.append(azar.choice(_PALABRAS))
+        if i % 120 == 0:
+            partes.append(f"\n{seccion}. Concepto {seccion}:")
+            seccion += 1
+        elif i % 300 == 150:
+            partes.append("\n### Ejemplo práctico\n")
+        elif i % 40 == 20:
+            partes.append("\n   - Propósito:")
+        if citas and i % max(1, palabras // citas) == 0 and len(anotaciones) < citas:
+            nombre = archivos[len(anotaciones) % len(archivos)]
+            marcador = f"【{len(anotaciones)}:{len(anotaciones) % 5}†{nombre}】"
+            partes.append(marcador)
+            anotaciones.append({
+                "marcador": marcador,
+                "file_id": f"file-{nombre}",
+                "nombre": nombre,
+                "canvas_file_id": str(1000 + len(anotaciones)),
+                "url": f"https://canvas.example/files/{1000 + len(anotaciones)}"
+            })
+    return " ".join(partes), anotaciones
+
+
+def respuesta_con_fuentes_explicitas(palabras, fuentes, seed=11):
+    """Texto con [Fuente: x.pdf] intercalado (el formato que busca extraer_fuentes)."""
+    azar = random.Random(seed)
+    partes = [azar.choice(_PALABRAS) for _ in range(palabras)]
+    for i in range(fuentes):
+        partes.insert(azar.randrange(len(partes)), f"[Fuente: guia_{i % 7}.pdf]")
+    return " ".join(partes)
+
+
+def fechas(n, seed=3):
+    """Mezcla de lo que llega de Canvas y de la DB: ISO con T/Z, sin T/Z, datetime y None."""
+    azar = random.Random(seed)
+    base = datetime.datetime(2025, 3, 1, 12, 0, 0)
+    valores = []
+    for i in range(n):
+        fecha = base + datetime.timedelta(minutes=azar.randrange(500_000))
+        tipo = i % 4
+        if tipo == 0:
+            valores.append(fecha.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        elif tipo == 1:
+            valores.append(fecha.strftime("%Y-%m-%d %H:%M:%S.%f"))
+        elif tipo == 2:
+            valores.append(fecha)
+        else:
+            valores.append(None if i % 8 == 3 else fecha.strftime("%Y-%m-%dT%H:%M:%S-03:00"))
+    return valores
+
+
+def rutas(n, seed=5):
+    azar = random.Random(seed)
+    extensiones = ["pdf", "PDF", "docx", "xlsx", "csv", "txt", "py", "R", "ipynb", "png", "zip", "mp4", "sql", ""]
+    return [f"/tmp/temp_files/curso_{i % 30}/archivo_{i}.{azar.choice(extensiones)}".rstrip(".") for i in range(n)]
+
+
+def tabla(filas, seed=13):
+    """DataFrame con tipos mixtos como las planillas de los cursos."""
+    import numpy as np
+    import pandas as pd
+    azar = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": np.arange(filas),
+        "producto": azar.choice(["arroz", "leche", "pan", "café", "azúcar"], filas),
+        "precio": azar.normal(1500, 300, filas).round(2),
+        "cantidad": azar.integers(1, 50, filas),
+        "fecha": pd.Timestamp("2025-03-01") + pd.to_timedelta(azar.integers(0, 365, filas), unit="D"),
+        "comentario": azar.choice(["", "oferta", "sin stock", "precio con IVA incluido"], filas)
+    })
+
+
+def archivo_tabular(directorio, filas, extension):
+    """Ruta de un CSV/XLSX de `filas` filas; se genera solo si no existe."""
+    ruta = os.path.join(directorio, f"tabla_{filas}.{extension}")
+    if not os.path.exists(ruta):
+        print(f"🧱 Generando {ruta}...")
+        datos = tabla(filas)
+        temporal = os.path.join(directorio, f"tabla_{filas}.parcial.{extension}")  # pandas exige la extensión
+        if extension == "csv":
+            datos.to_csv(temporal, index=False)
+        else:
+            datos.to_excel(temporal, index=False, engine="openpyxl")
+        os.replace(temporal, ruta)
+    return ruta
+
+
+# === Medición ===
+def _bucle(funcion, veces):
+    inicio = time.perf_counter()
+    for _ in range(veces):
+        funcion()
+    return time.perf_counter() - inicio
+
+
+def medir(funcion, repeticiones, presupuesto_s, minimo_s=0.2):
+    """
+    Tiempo por llamada: las funciones rápidas se repiten en bucle hasta durar
+    `minimo_s` (como timeit.autorange); las lentas hacen menos repeticiones
+    para no pasarse de `presupuesto_s` por caso. El pico de memoria se toma
+    en una llamada aparte con tracemalloc.
+    """
+    funcion()  # calentamiento (imports perezosos, cachés de regex)
+    bucle = 1
+    while True:
+        duracion = _bucle(funcion, bucle)
+        if duracion >= minimo_s or bucle >= 1_000_000:
+            break
+        bucle *= 10
+    repeticiones = max(1, min(repeticiones, int(presupuesto_s / duracion)))
+
+    gc.collect()
+    tiempos = [_bucle(funcion, bucle) / bucle for _ in range(repeticiones)]
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "tiempo_ms": round(min(tiempos) * 1000, 4),
+        "mediana_ms": round(statistics.median(tiempos) * 1000, 4),
+        "memoria_pico_kb": round(pico / 1024, 1),
+        "repeticiones": repeticiones,
+        "llamadas_por_repeticion": bucle
+    }
+
+
+# === Casos ===
+def casos_respuestas():
+    from shared.helpers.helpers import procesar_respuesta_con_fuentes, extraer_fuentes, renderizar_respuesta_html
+
+    casos = []
+    for palabras, citas in ((1_500, 10), (5_000, 60), (20_000, 300)):
+        texto, anotaciones = respuesta_larga(palabras, citas)
+        etiqueta = f"{palabras}p_{citas}c"
+        casos.append((f"procesar_respuesta_con_fuentes/anotaciones_{etiqueta}",
+                      lambda t=texto, a=anotaciones: procesar_respuesta_con_fuentes(t, a)))
+        casos.append((f"procesar_respuesta_con_fuentes/marcadores_{etiqueta}",
+                      lambda t=texto: procesar_respuesta_con_fuentes(t)))
+        casos.append((f"extraer_fuentes/sin_fuentes_{etiqueta}", lambda t=texto: extraer_fuentes(t)))
+        explicitas = respuesta_con_fuentes_explicitas(palabras, citas)
+        casos.append((f"extraer_fuentes/explicitas_{etiqueta}", lambda t=explicitas: extraer_fuentes(t)))
+        formateado, _ = procesar_respuesta_con_fuentes(texto, anotaciones)
+        if renderizar_respuesta_html(formateado) is not None:  # None: faltan markdown/bleach
+            casos.append((f"renderizar_respuesta_html/{etiqueta}",
+                          lambda t=formateado: renderizar_respuesta_html(t)))
+    return casos
+
+
+def casos_sincronizacion():
+    from shared.helpers.helpers import normalizar_fecha
+    from services.archivo_service import normalizar_fecha as normalizar_fecha_worker
+    from openai_utils.uploader import es_documento_permitido, es_archivo_codigo, es_archivo_tabular
+
+    valores = fechas(10_000)
+    caminos = rutas(10_000)
+    return [
+        ("normalizar_fecha/shared_10k", lambda: [normalizar_fecha(v) for v in valores]),
+        ("normalizar_fecha/worker_10k", lambda: [normalizar_fecha_worker(v) for v in valores]),
+        ("es_documento_permitido/10k", lambda: [es_documento_permitido(c) for c in caminos]),
+        ("es_archivo_codigo/10k", lambda: [es_archivo_codigo(c) for c in caminos]),
+        ("es_archivo_tabular/10k", lambda: [es_archivo_tabular(c) for c in caminos]),
+    ]
+
+
+def casos_conversion(directorio, filas_csv, filas_xlsx):
+    from openai_utils.uploader import convertir_a_txt
+
+    def convertir(ruta):
+        os.remove(convertir_a_txt(ruta))
+
+    casos = []
+    for extension, tamanos in (("csv", filas_csv), ("xlsx", filas_xlsx)):
+        for filas in tamanos:
+            ruta = archivo_tabular(directorio, filas, extension)
+            casos.append((f"convertir_a_txt/{extension}_{filas}", lambda r=ruta: convertir(r)))
+    return casos
+
+
+# === Principal ===
+def _lista_enteros(valor):
+    return tuple(int(v) for v in valor.split(",") if v.strip())
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de helpers y conversión de archivos.")
+    parser.add_argument("--casos", help="Regex: solo los casos cuyo nombre coincida")
+    parser.add_argument("--rapido", action="store_true", help="Solo el tamaño más chico de CSV/XLSX")
+    parser.add_argument("--filas-csv", type=_lista_enteros, default=FILAS_CSV, help="Ej: 10000,100000,1000000")
+    parser.add_argument("--filas-xlsx", type=_lista_enteros, default=FILAS_XLSX, help="Ej: 10000,100000")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "benchmark_corpus"),
+                        help="Dónde se generan y reutilizan los CSV/XLSX")
+    parser.add_argument("--repeticiones", type=int, default=7)
+    parser.add_argument("--presupuesto", type=float, default=20, help="Segundos máximos por caso")
+    parser.add_argument("--salida", help="Guardar los resultados en este JSON")
+    parser.add_argument("--comparar", help="JSON de una corrida base para comparar")
+    parser.add_argument("--tolerancia", type=float, default=15, help="%% de empeoramiento tolerado")
+    return parser.parse_args()
+
+
+def main():
+    args = _argumentos()
+    if args.rapido:
+        args.filas_csv, args.filas_xlsx = args.filas_csv[:1], args.filas_xlsx[:1]
+    os.makedirs(args.corpus, exist_ok=True)
+
+    filtro = re.compile(args.casos) if args.casos else None
+    casos = casos_respuestas() + casos_sincronizacion()
+    if not filtro or filtro.search("convertir_a_txt"):
+        casos += casos_conversion(args.corpus, args.filas_csv, args.filas_xlsx)
+    if filtro:
+        casos = [(nombre, funcion) for nombre, funcion in casos if filtro.search(nombre)]
+
+    ancho = max((len(nombre) for nombre, _ in casos), default=10)
+    print(f"\n{'caso':<{ancho}}{'min ms':>12}{'mediana ms':>12}{'pico KB':>12}{'reps':>7}")
+    medidos = {}
+    for nombre, funcion in casos:
+        medidos[nombre] = medir(funcion, args.repeticiones, args.presupuesto)
+        m = medidos[nombre]
+        print(f"{nombre:<{ancho}}{m['tiempo_ms']:>12.4g}{m['mediana_ms']:>12.4g}"
+              f"{m['memoria_pico_kb']:>12.1f}{m['repeticiones']:>7}")
+
+    datos = {
+        "entorno": resultados.entorno(),
+        "parametros": {clave: valor for clave, valor in vars(args).items() if clave not in ("salida", "comparar")},
+        "casos": medidos
+    }
+    if args.salida:
+        resultados.guardar(args.salida, datos)
+    if args.comparar:
+        metricas = {}
+        for nombre in medidos:
+            metricas[f"casos.{nombre}.tiempo_ms"] = "menor"
+            metricas[f"casos.{nombre}.memoria_pico_kb"] = "menor"
+        filas = resultados.comparar(datos, resultados.cargar(args.comparar), metricas, args.tolerancia)
+        if resultados.imprimir_comparacion(filas, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
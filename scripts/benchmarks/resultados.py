@@ -0,0 +1,99 @@
+# scripts/benchmarks/resultados.py
+"""Percentiles, guardado de resultados y comparación contra una base (carga y micro)."""
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (p en 0-100) de una lista sin ordenar."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+def resumen_latencias(segundos):
+    """{n, p50_ms, p95_ms, p99_ms, max_ms} de una lista de duraciones en segundos."""
+    def ms(valor):
+        return round(valor * 1000, 1) if valor is not None else None
+    return {
+        "n": len(segundos),
+        "p50_ms": ms(percentil(segundos, 50)),
+        "p95_ms": ms(percentil(segundos, 95)),
+        "p99_ms": ms(percentil(segundos, 99)),
+        "max_ms": ms(max(segundos) if segundos else None)
+    }
+
+
+def entorno():
+    """Dónde se midió: comparar bases de máquinas distintas no tiene sentido."""
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+
+def guardar(ruta, datos):
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados guardados en {ruta}")
+
+
+def cargar(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def aplanar(datos, prefijo=""):
+    """{'a': {'b': 1}} → {'a.b': 1} (solo valores numéricos)."""
+    plano = {}
+    for clave, valor in datos.items():
+        nombre = f"{prefijo}{clave}"
+        if isinstance(valor, dict):
+            plano.update(aplanar(valor, nombre + "."))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            plano[nombre] = valor
+    return plano
+
+
+def comparar(actual, base, metricas, tolerancia_pct):
+    """
+    Compara métricas contra la base. `metricas` es {nombre_aplanado: "menor" | "mayor"}
+    (qué dirección es mejor). Retorna filas (nombre, base, actual, cambio_pct, regresion).
+    """
+    actual, base = aplanar(actual), aplanar(base)
+    filas = []
+    for nombre, mejor in metricas.items():
+        if nombre not in actual or nombre not in base:
+            continue
+        if base[nombre]:
+            cambio = (actual[nombre] - base[nombre]) / abs(base[nombre]) * 100
+        else:
+            # Base en cero (p. ej. 0 fallas): cualquier valor distinto es un cambio infinito
+            cambio = math.copysign(math.inf, actual[nombre]) if actual[nombre] else 0.0
+        empeora = cambio > 0 if mejor == "menor" else cambio < 0
+        filas.append((nombre, base[nombre], actual[nombre], cambio, empeora and abs(cambio) > tolerancia_pct))
+    return filas
+
+
+def imprimir_comparacion(filas, tolerancia_pct):
+    """Tabla de cambios contra la base; retorna True si hubo regresiones."""
+    if not filas:
+        print("⚠️ Nada comparable con la base")
+        return False
+    ancho = max(len(f[0]) for f in filas)
+    print(f"\n📊 Comparación con la base (tolerancia {tolerancia_pct:g}%)")
+    for nombre, valor_base, valor_actual, cambio, regresion in filas:
+        marca = "❌" if regresion else "✅"
+        print(f"  {marca} {nombre:<{ancho}}  {valor_base:>12.4g} → {valor_actual:>12.4g}  ({cambio:+.1f}%)")
+    regresiones = sum(1 for f in filas if f[4])
+    if regresiones:
+        print(f"❌ {regresiones} regresiones por encima de la tolerancia")
+    return regresiones > 0
@@ -0,0 +1,201 @@
+# scripts/benchmarks/servidor_base.py
+"""
+Base de los servidores falsos (Canvas y OpenAI) de las pruebas de carga:
+HTTP/1.1 con keep-alive, latencia, fallas y rate limit configurables, y
+conteo de peticiones por ruta y estado para el reporte.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class Comportamiento:
+    """Cómo responde un servidor falso; todo es opcional (por defecto: instantáneo y sin fallas)."""
+
+    def __init__(self, latencia_ms=0, variacion_ms=0, fallas=0.0, limite_por_minuto=0):
+        self.latencia_ms = latencia_ms          # antes de los encabezados de cada respuesta
+        self.variacion_ms = variacion_ms        # jitter uniforme ±
+        self.fallas = fallas                    # fracción de peticiones que responden 503
+        self.limite_por_minuto = limite_por_minuto  # 0 = sin rate limit
+
+    def demora(self):
+        ms = self.latencia_ms + random.uniform(-self.variacion_ms, self.variacion_ms)
+        return max(0, ms) / 1000
+
+
+class LimitePorMinuto:
+    """Ventana fija de 60 s compartida por todos los hilos del servidor."""
+
+    def __init__(self, por_minuto):
+        self.por_minuto = por_minuto
+        self._inicio = time.monotonic()
+        self._usadas = 0
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        """(permitido, restantes, segundos_hasta_reinicio)."""
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora - self._inicio >= 60:
+                self._inicio, self._usadas = ahora, 0
+            reinicio = 60 - (ahora - self._inicio)
+            if self._usadas >= self.por_minuto:
+                return False, 0, reinicio
+            self._usadas += 1
+            return True, self.por_minuto - self._usadas, reinicio
+
+
+class ManejadorBase(BaseHTTPRequestHandler):
+    """
+    Las subclases declaran `rutas = [(método, regex_de_ruta, nombre_de_método)]`;
+    el método recibe los grupos del regex. self.cuerpo y self.query ya vienen leídos.
+    """
+    protocol_version = "HTTP/1.1"
+    rutas = []
+
+    def log_message(self, formato, *args):
+        pass  # sin una línea por petición en la consola
+
+    def do_GET(self):
+        self._despachar("GET")
+
+    def do_POST(self):
+        self._despachar("POST")
+
+    def do_DELETE(self):
+        self._despachar("DELETE")
+
+    # --- Entrada ---
+    def _leer_cuerpo(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            partes = []
+            while True:
+                largo = int(self.rfile.readline().split(b";")[0], 16)
+                if largo == 0:
+                    self.rfile.readline()
+                    return b"".join(partes)
+                partes.append(self.rfile.read(largo))
+                self.rfile.readline()
+        largo = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(largo) if largo else b""
+
+    def json_cuerpo(self):
+        try:
+            return json.loads(self.cuerpo or b"{}")
+        except ValueError:
+            return {}
+
+    # --- Salida ---
+    def enviar(self, status, cuerpo, tipo="application/json", cabeceras=None):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for clave, valor in {**self.cabeceras_extra, **(cabeceras or {})}.items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+        self.server.contar(self.ruta_nombre, status)
+
+    def enviar_json(self, status, datos, cabeceras=None):
+        self.enviar(status, json.dumps(datos).encode("utf-8"), cabeceras=cabeceras)
+
+    def iniciar_stream(self, tipo="text/event-stream"):
+        """Respuesta en trozos (chunked): para SSE sin cerrar la conexión."""
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Transfer-Encoding", "chunked")
+        for clave, valor in self.cabeceras_extra.items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.server.contar(self.ruta_nombre, 200)
+
+    def enviar_trozo(self, datos):
+        self.wfile.write(f"{len(datos):x}\r\n".encode("ascii") + datos + b"\r\n")
+        self.wfile.flush()
+
+    def cerrar_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # --- Comportamiento configurable ---
+    def cabeceras_limite(self, restantes, reinicio):
+        """Encabezados de rate limit de cada servicio (se agregan a toda respuesta)."""
+        return {}
+
+    def rechazar_por_limite(self, reinicio):
+        self.enviar_json(429, {"error": "rate limit"}, {"Retry-After": str(int(reinicio) + 1)})
+
+    def responder_falla(self):
+        self.enviar_json(503, {"error": "falla simulada"})
+
+    def _despachar(self, metodo):
+        partes = urlsplit(self.path)
+        self.query = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+        self.cuerpo = self._leer_cuerpo()  # siempre, para no romper el keep-alive
+        self.cabeceras_extra = {}
+
+        for metodo_ruta, patron, nombre in self.rutas:
+            coincidencia = re.fullmatch(patron, partes.path)
+            if metodo_ruta == metodo and coincidencia:
+                break
+        else:
+            self.ruta_nombre = "desconocida"
+            self.enviar_json(404, {"error": f"{metodo} {partes.path} no existe en el servidor falso"})
+            return
+        self.ruta_nombre = nombre
+
+        comportamiento = self.server.comportamiento
+        if self.server.limite is not None:
+            permitido, restantes, reinicio = self.server.limite.tomar()
+            self.cabeceras_extra = self.cabeceras_limite(restantes, reinicio)
+            if not permitido:
+                self.rechazar_por_limite(reinicio)
+                return
+        time.sleep(comportamiento.demora())
+        if comportamiento.fallas and random.random() < comportamiento.fallas:
+            self.responder_falla()
+            return
+        getattr(self, nombre)(*coincidencia.groups())
+
+
+class ServidorFalso(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, manejador, comportamiento=None, puerto=0):
+        super().__init__(("127.0.0.1", puerto), manejador)
+        self.comportamiento = comportamiento or Comportamiento()
+        limite = self.comportamiento.limite_por_minuto
+        self.limite = LimitePorMinuto(limite) if limite else None
+        self._conteo = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def contar(self, ruta, status):
+        with self._lock:
+            self._conteo[(ruta, status)] += 1
+
+    def estadisticas(self):
+        """{ruta: {status: n}} de todas las peticiones atendidas."""
+        with self._lock:
+            resumen = {}
+            for (ruta, status), n in sorted(self._conteo.items()):
+                resumen.setdefault(ruta, {})[str(status)] = n
+            return resumen
+
+    def handle_error(self, request, client_address):
+        # Un cliente que corta una conexión keep-alive (p. ej. al detener la app) no es un error
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def iniciar_en_hilo(self):
+        threading.Thread(target=self.serve_forever, daemon=True, name=type(self).__name__).start()
+        return self
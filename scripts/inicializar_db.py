@@ -0,0 +1,37 @@
+# scripts/inicializar_db.py
+import sys
+import os
+import argparse
+import logging
+
+# Asegurar que el directorio raíz esté en el path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.helpers.helpers import create_app
+from shared.models.migraciones import migrar, verificar_indices
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea/actualiza el esquema de la base de datos.")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Después de migrar, revisar con EXPLAIN que las consultas frecuentes usen índices")
+    parser.add_argument("--solo-verificar", action="store_true",
+                        help="No migrar; solo correr la verificación con EXPLAIN")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not args.solo_verificar:
+            migrar()
+        if args.verificar or args.solo_verificar:
+            fallas = verificar_indices()
+            if fallas:
+                print(f"❌ {len(fallas)} consultas frecuentes sin índice")
+                sys.exit(1)
+            print("✅ Todas las consultas frecuentes usan índices")
+
+
+if __name__ == "__main__":
+    main()
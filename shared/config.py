@@ -13,7 +13,8 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 # === CANVAS ===
 CANVAS_TOKEN = os.getenv("CANVAS_TOKEN")
-CANVAS_BASE_URL = 'https://canvas.instructure.com/api/v1'
+CANVAS_BASE_URL = os.getenv("CANVAS_BASE_URL", 'https://canvas.instructure.com/api/v1')
+CANVAS_WEB_URL = os.getenv("CANVAS_WEB_URL", CANVAS_BASE_URL.split("/api/")[0])  # enlaces a archivos
 
 # === DATABASE ===
 DATABASE_URL = os.getenv("DATABASE_URL", SUPABASE_URL)
@@ -21,19 +22,88 @@ if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL no está definido")
 
 
+# === REDIS ===
+REDIS_URL = os.getenv("REDIS_URL")
+
 # === OPENAI ===
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MAX_CONEXIONES = int(os.getenv("OPENAI_MAX_CONEXIONES", 20))  # por proceso
+OPENAI_CONEXIONES_KEEPALIVE = int(os.getenv("OPENAI_CONEXIONES_KEEPALIVE", 10))
+OPENAI_KEEPALIVE_SEGUNDOS = float(os.getenv("OPENAI_KEEPALIVE_SEGUNDOS", 30))
+OPENAI_TIMEOUT_CONEXION = float(os.getenv("OPENAI_TIMEOUT_CONEXION", 5))
+OPENAI_TIMEOUT_LECTURA = float(os.getenv("OPENAI_TIMEOUT_LECTURA", 60))  # entre bytes (también en streaming)
+OPENAI_MAX_REINTENTOS = int(os.getenv("OPENAI_MAX_REINTENTOS", 2))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"  # requiere el paquete h2
+# Gobernador de rate limit (presupuesto compartido vía Redis, backoff y circuit breaker)
+OPENAI_GOBERNADOR_HABILITADO = os.getenv("OPENAI_GOBERNADOR_HABILITADO", "true").lower() == "true"
+OPENAI_GOBERNADOR_REINTENTOS = int(os.getenv("OPENAI_GOBERNADOR_REINTENTOS", 5))
+OPENAI_CIRCUITO_UMBRAL = int(os.getenv("OPENAI_CIRCUITO_UMBRAL", 5))  # fallas seguidas
+OPENAI_CIRCUITO_ENFRIAMIENTO = float(os.getenv("OPENAI_CIRCUITO_ENFRIAMIENTO", 30))  # segundos
 
 # === LTI ===
-CANVAS_ISSUER = "https://canvas.instructure.com"
-CANVAS_JWKS_URL = "https://sso.canvaslms.com/api/lti/security/jwks"
+# Configurables para apuntar a un Canvas local (scripts/benchmarks)
+CANVAS_ISSUER = os.getenv("CANVAS_ISSUER", "https://canvas.instructure.com")
+CANVAS_JWKS_URL = os.getenv("CANVAS_JWKS_URL", "https://sso.canvaslms.com/api/lti/security/jwks")
 CANVAS_CLIENT_ID = os.getenv("CANVAS_CLIENT_ID")
 
 # ✅ CORREGIDO: Nombre consistente
-CANVAS_LOGIN_URL = "https://sso.canvaslms.com/api/lti/authorize_redirect"
+CANVAS_LOGIN_URL = os.getenv("CANVAS_LOGIN_URL", "https://sso.canvaslms.com/api/lti/authorize_redirect")
 
 TOKEN_URL = "https://sso.canvaslms.com/login/oauth2/token"
 
+# === CUOTA DE CONSULTAS ===
+LIMITE_CONSULTAS_MENSUAL = int(os.getenv("LIMITE_CONSULTAS_MENSUAL", 25))
+USO_REDIS_HABILITADO = os.getenv("USO_REDIS_HABILITADO", "false").lower() == "true"  # contador en Redis + write-behind
+
+# === CACHÉ DE METADATOS (cursos, asistentes, usuarios) ===
+METADATOS_TTL = int(os.getenv("METADATOS_TTL", 300))  # segundos
+
+# === CACHÉ DE RESPUESTAS ===
+CACHE_RESPUESTAS_TTL = int(os.getenv("CACHE_RESPUESTAS_TTL", 7 * 24 * 3600))  # segundos
+CACHE_RESPUESTAS_MAX = int(os.getenv("CACHE_RESPUESTAS_MAX", 5000))  # entradas en memoria
+
+# === PREGUNTAS SIMILARES (MinHash/LSH) ===
+SIMILITUD_UMBRAL = float(os.getenv("SIMILITUD_UMBRAL", 0.6))  # sugerencia
+SIMILITUD_UMBRAL_DIRECTO = float(os.getenv("SIMILITUD_UMBRAL_DIRECTO", 0.9))  # se omite el run
+SIMILITUD_MAX_POR_CURSO = int(os.getenv("SIMILITUD_MAX_POR_CURSO", 5000))
+
+# === POLÍTICA DE HILOS (rotación y contexto) ===
+HILO_MAX_MENSAJES = int(os.getenv("HILO_MAX_MENSAJES", 30))
+HILO_MAX_TOKENS_CONTEXTO = int(os.getenv("HILO_MAX_TOKENS_CONTEXTO", 40000))  # prompt del último run
+HILO_MAX_DIAS = int(os.getenv("HILO_MAX_DIAS", 14))
+HILO_TRUNCAR_ULTIMOS = int(os.getenv("HILO_TRUNCAR_ULTIMOS", 10))  # 0 = sin truncar
+HILO_MAX_PROMPT_TOKENS = int(os.getenv("HILO_MAX_PROMPT_TOKENS", 0))  # 0 = sin límite
+HILO_RESUMEN_MENSAJES = int(os.getenv("HILO_RESUMEN_MENSAJES", 3))  # 0 = sin resumen al rotar
+
+# === RETENCIÓN Y ARCHIVO HISTÓRICO (historial_consultas, mensajes) ===
+RETENCION_MESES = int(os.getenv("RETENCION_MESES", 6))  # meses que quedan en la tabla caliente
+PARTICIONES_MESES_ADELANTE = int(os.getenv("PARTICIONES_MESES_ADELANTE", 2))
+DIRECTORIO_ARCHIVO = os.getenv("DIRECTORIO_ARCHIVO", "archivo_historico")  # Parquet (zstd) por tabla y mes
+# La retención borra filas de la DB: solo corre si se habilita y DIRECTORIO_ARCHIVO es una ruta
+# absoluta en un volumen persistente compartido con la web (que lee el archivo desde su disco)
+RETENCION_HABILITADA = os.getenv("RETENCION_HABILITADA", "false").lower() == "true"
+
+# === STREAMING (SSE) ===
+# Cada stream ocupa un hilo de gunicorn (gthread) hasta 3 min: con --threads 32 y 24
+# streams quedan 8 hilos para formularios, polling y LTI. Pasado el tope, polling.
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", 24))
+
+# === MÉTRICAS ===
+METRICAS_PUERTO_WORKER = int(os.getenv("METRICAS_PUERTO_WORKER", 9100))  # 0 = sin sidecar
+
+# === TRAZAS (OpenTelemetry) ===
+TRAZAS_EXPORTADOR = os.getenv("TRAZAS_EXPORTADOR", "")  # otlp, archivo o vacío (sin trazas)
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "trazas.jsonl")  # con TRAZAS_EXPORTADOR=archivo
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", 1.0))  # fracción de consultas trazadas
+
+# === LOGGING ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json")  # json o texto
+# Niveles por módulo: "worker.services.archivo_service=DEBUG,httpx=WARNING"
+LOG_NIVELES = os.getenv("LOG_NIVELES", "httpx=WARNING,httpcore=WARNING,openai=WARNING")
+LOG_DEBUG_POR_MINUTO = int(os.getenv("LOG_DEBUG_POR_MINUTO", 60))  # por sitio de llamada
+LOG_DEBUG_MUESTREO = float(os.getenv("LOG_DEBUG_MUESTREO", 1.0))  # fracción de DEBUG emitidos
+
 # === OTROS ===
 TEMP_DIR = os.getenv("TEMP_DIR", "temp_files")
 os.makedirs(TEMP_DIR, exist_ok=True)
\ No newline at end of file
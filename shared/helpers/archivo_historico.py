@@ -0,0 +1,146 @@
+# shared/helpers/archivo_historico.py
+import datetime
+import json
+import logging
+import os
+from shared.config import DIRECTORIO_ARCHIVO
+from shared.models.db import db
+from shared.models.particiones import sumar_meses
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 5000  # filas por lote al exportar (memoria acotada)
+COMPRESION = "zstd"
+
+
+def _pyarrow():
+    """pyarrow es opcional: sin él no se archiva (y por lo tanto no se borra nada)."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def archivo_disponible():
+    return _pyarrow() is not None
+
+
+def ruta_archivo(tabla, mes):
+    return os.path.join(DIRECTORIO_ARCHIVO, tabla, f"{mes:%Y-%m}.parquet")
+
+
+def _esquema(pa, tabla):
+    """Esquema Parquet a partir del modelo (no de los datos: un lote todo NULL no lo altera)."""
+    campos = []
+    for columna in db.Model.metadata.tables[tabla].columns:
+        tipo = type(columna.type).__name__
+        if tipo == "DateTime":
+            tipo_pa = pa.timestamp("us")
+        elif tipo == "Date":
+            tipo_pa = pa.date32()
+        elif tipo == "Integer":
+            tipo_pa = pa.int64()
+        elif tipo == "Boolean":
+            tipo_pa = pa.bool_()
+        elif tipo == "Numeric":
+            tipo_pa = pa.float64()
+        else:
+            tipo_pa = pa.string()  # String, Text y JSON (serializado)
+        campos.append(pa.field(columna.name, tipo_pa))
+    return pa.schema(campos)
+
+
+def _fila_plana(fila, columnas_json, columnas_fecha):
+    fila = dict(fila)
+    for columna in columnas_json:
+        if fila.get(columna) is not None and not isinstance(fila[columna], str):
+            fila[columna] = json.dumps(fila[columna], ensure_ascii=False)
+    for columna in columnas_fecha:
+        # SQLite devuelve las fechas como texto en las consultas con text()
+        if isinstance(fila.get(columna), str):
+            fila[columna] = datetime.datetime.fromisoformat(fila[columna])
+    return fila
+
+
+def exportar_parquet(conn, tabla, sql, parametros, ruta):
+    """
+    Exporta el resultado de `sql` (columnas de `tabla`) a Parquet comprimido
+    con zstd, leyendo por lotes. Escribe a un archivo temporal y lo renombra
+    al final, así nunca queda un archivo a medias. Retorna la cantidad de filas.
+    """
+    pa = _pyarrow()
+    if pa is None:
+        raise RuntimeError("pyarrow no está instalado")
+
+    esquema = _esquema(pa, tabla)
+    columnas = db.Model.metadata.tables[tabla].columns
+    columnas_json = [c.name for c in columnas if type(c.type).__name__ == "JSON"]
+    columnas_fecha = [c.name for c in columnas if type(c.type).__name__ == "DateTime"]
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + ".tmp"
+
+    total = 0
+    resultado = conn.execution_options(stream_results=True).execute(sql, parametros)
+    try:
+        with pa.parquet.ParquetWriter(temporal, esquema, compression=COMPRESION) as escritor:
+            while True:
+                lote = resultado.mappings().fetchmany(TAMANO_LOTE)
+                if not lote:
+                    break
+                filas = [_fila_plana(f, columnas_json, columnas_fecha) for f in lote]
+                escritor.write_table(pa.Table.from_pylist(filas, schema=esquema))
+                total += len(filas)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    os.replace(temporal, ruta)
+    return total
+
+
+def contar_filas_archivo(ruta):
+    """
+    Cuenta las filas leyendo el archivo completo (no solo el footer): si algún
+    row group está corrupto falla aquí, antes de borrar las filas de la DB.
+    """
+    pa = _pyarrow()
+    return pa.parquet.read_table(ruta).num_rows
+
+
+def leer_archivo(tabla, desde=None, hasta=None, filtros=None, columnas=None, limite=None):
+    """
+    Lee filas archivadas de `tabla` entre `desde` y `hasta` (datetime),
+    abriendo solo los archivos de los meses involucrados.
+    `filtros`: {"columna": valor} (igualdad). Retorna una lista de dicts.
+    """
+    pa = _pyarrow()
+    directorio = os.path.join(DIRECTORIO_ARCHIVO, tabla)
+    if pa is None or not os.path.isdir(directorio):
+        return []
+
+    condiciones = [(columna, "=", valor) for columna, valor in (filtros or {}).items()]
+    if desde:
+        condiciones.append(("timestamp", ">=", desde))
+    if hasta:
+        condiciones.append(("timestamp", "<", hasta))
+
+    filas = []
+    for nombre in sorted(os.listdir(directorio), reverse=True):
+        if not nombre.endswith(".parquet"):
+            continue
+        mes = datetime.datetime.strptime(nombre[:7], "%Y-%m")
+        fin_mes = datetime.datetime.combine(sumar_meses(mes.date(), 1), datetime.time())
+        if (hasta and mes >= hasta) or (desde and fin_mes <= desde):
+            continue
+        tabla_pa = pa.parquet.read_table(
+            os.path.join(directorio, nombre),
+            columns=columnas,
+            filters=condiciones or None
+        )
+        filas.extend(tabla_pa.to_pylist())
+        if limite and len(filas) >= limite:
+            return filas[:limite]
+    return filas
@@ -0,0 +1,150 @@
+# shared/helpers/cache.py
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from shared.config import CACHE_RESPUESTAS_TTL, CACHE_RESPUESTAS_MAX
+from shared.helpers.helpers import normalizar_pregunta
+from shared.helpers.redis_cliente import obtener_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CacheLRU:
+    """
+    Caché en memoria con expiración (TTL) y desalojo LRU.
+    Segura entre hilos; pensada para datos pequeños y muy leídos.
+    """
+
+    def __init__(self, max_items=1000, ttl=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos = OrderedDict()  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return default
+            expira_en, valor = entrada
+            if expira_en is not None and expira_en < time.monotonic():
+                del self._datos[clave]
+                return default
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expira_en = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (expira_en, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+# === CACHÉ DE RESPUESTAS (memoria + Redis opcional) ===
+_cache_local = CacheLRU(max_items=CACHE_RESPUESTAS_MAX, ttl=CACHE_RESPUESTAS_TTL)
+_versiones_corpus = {}
+_PREFIJO_RESPUESTA = "respuesta:"
+_PREFIJO_CORPUS = "corpus_version:"
+
+
+def obtener_version_corpus(course_id):
+    """Versión actual de los materiales del curso (cambia con cada sincronización)."""
+    r = obtener_redis()
+    if r is not None:
+        try:
+            return int(r.get(f"{_PREFIJO_CORPUS}{course_id}") or 0)
+        except Exception as e:
+            logger.warning(f"⚠️ Error leyendo versión de corpus en Redis: {e}")
+    return _versiones_corpus.get(course_id, 0)
+
+
+def incrementar_version_corpus(course_id):
+    """
+    Invalida todas las respuestas cacheadas del curso.
+    Llamar cuando la sincronización con Canvas cambia archivos.
+    """
+    version = _versiones_corpus.get(course_id, 0) + 1
+    _versiones_corpus[course_id] = version
+
+    r = obtener_redis()
+    if r is not None:
+        try:
+            version = r.incr(f"{_PREFIJO_CORPUS}{course_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Error incrementando versión de corpus en Redis: {e}")
+
+    logger.info(f"🔄 Corpus del curso {course_id} en versión {version}")
+    return version
+
+
+def clave_respuesta(course_id, asistente_id, pregunta, version=None):
+    """Clave de caché para una pregunta normalizada en un curso/asistente/corpus."""
+    if version is None:
+        version = obtener_version_corpus(course_id)
+    base = f"{course_id}|{asistente_id}|{version}|{normalizar_pregunta(pregunta)}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def buscar_respuesta_cacheada(course_id, asistente_id, pregunta):
+    """
+    Busca una respuesta previa a la misma pregunta.
+    Retorna un dict {"respuesta", "fuentes", "respuesta_html", "render_version"} o None.
+    """
+    clave = clave_respuesta(course_id, asistente_id, pregunta)
+
+    valor = _cache_local.get(clave)
+    if valor is not None:
+        return valor
+
+    r = obtener_redis()
+    if r is not None:
+        try:
+            crudo = r.get(_PREFIJO_RESPUESTA + clave)
+            if crudo:
+                valor = json.loads(crudo)
+                _cache_local.set(clave, valor)
+                return valor
+        except Exception as e:
+            logger.warning(f"⚠️ Error leyendo caché de respuestas en Redis: {e}")
+
+    return None
+
+
+def guardar_respuesta_cacheada(course_id, asistente_id, pregunta, respuesta, fuentes=None,
+                               respuesta_html=None, render_version=None):
+    """Guarda una respuesta completada para reutilizarla en preguntas idénticas."""
+    if not respuesta:
+        return
+    clave = clave_respuesta(course_id, asistente_id, pregunta)
+    valor = {
+        "respuesta": respuesta,
+        "fuentes": fuentes or [],
+        "respuesta_html": respuesta_html,
+        "render_version": render_version
+    }
+
+    _cache_local.set(clave, valor)
+
+    r = obtener_redis()
+    if r is not None:
+        try:
+            r.set(_PREFIJO_RESPUESTA + clave, json.dumps(valor), ex=CACHE_RESPUESTAS_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ Error guardando en caché de respuestas Redis: {e}")
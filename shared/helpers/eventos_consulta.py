@@ -0,0 +1,119 @@
+# shared/helpers/eventos_consulta.py
+# Canal de eventos por consulta entre el worker y el web (Redis pub/sub).
+# El worker publica los fragmentos de texto a medida que llegan del run y un
+# evento final; el endpoint SSE del web los reenvía al navegador. Cada delta
+# lleva su `offset` para descartar duplicados al combinarlo con el parcial.
+import json
+import logging
+import time
+from shared.helpers.redis_cliente import obtener_redis
+
+logger = logging.getLogger(__name__)
+
+TTL_PARCIAL = 10 * 60  # segundos que se conserva el texto parcial
+
+
+def _canal(consulta_id):
+    return f"consulta:{consulta_id}"
+
+
+def _clave_parcial(consulta_id):
+    return f"consulta_parcial:{consulta_id}"
+
+
+def publicar_delta(consulta_id, texto, offset):
+    """Publica un fragmento de respuesta y lo acumula en el parcial."""
+    r = obtener_redis()
+    if r is None or not texto:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.append(_clave_parcial(consulta_id), texto)
+        pipe.expire(_clave_parcial(consulta_id), TTL_PARCIAL)
+        pipe.publish(_canal(consulta_id), json.dumps({
+            "tipo": "delta",
+            "texto": texto,
+            "offset": offset
+        }))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo publicar delta de {consulta_id}: {e}")
+
+
+def publicar_final(consulta_id, estado, respuesta, respuesta_html=None):
+    """Publica el estado terminal de la consulta y descarta el parcial."""
+    r = obtener_redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.publish(_canal(consulta_id), json.dumps({
+            "tipo": "final",
+            "estado": estado,
+            "respuesta": respuesta,
+            "respuesta_html": respuesta_html
+        }))
+        pipe.delete(_clave_parcial(consulta_id))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo publicar final de {consulta_id}: {e}")
+
+
+class AcumuladorDeltas:
+    """
+    Agrupa los deltas del stream de OpenAI y los publica como mucho
+    cada `intervalo` segundos, para no hacer un PUBLISH por token.
+    """
+
+    def __init__(self, consulta_id, intervalo=0.1):
+        self.consulta_id = consulta_id
+        self.intervalo = intervalo
+        self.offset = 0
+        self._buffer = []
+        self._ultimo_envio = 0.0
+
+    def agregar(self, texto):
+        if not texto:
+            return
+        self._buffer.append(texto)
+        if time.monotonic() - self._ultimo_envio >= self.intervalo:
+            self.vaciar()
+
+    def vaciar(self):
+        if not self._buffer:
+            return
+        texto = "".join(self._buffer)
+        self._buffer = []
+        publicar_delta(self.consulta_id, texto, self.offset)
+        self.offset += len(texto)
+        self._ultimo_envio = time.monotonic()
+
+
+def suscribir(consulta_id):
+    """
+    Se suscribe al canal de la consulta.
+    Retorna (pubsub, texto_parcial) o (None, None) si no hay Redis.
+    La suscripción se hace antes de leer el parcial para no perder deltas.
+    """
+    r = obtener_redis()
+    if r is None:
+        return None, None
+    try:
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(_canal(consulta_id))
+        parcial = r.get(_clave_parcial(consulta_id)) or ""
+        return pubsub, parcial
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo suscribir a {consulta_id}: {e}")
+        return None, None
+
+
+def leer_evento(pubsub, timeout=1.0):
+    """Siguiente evento publicado (dict) o None si no llegó nada en `timeout`."""
+    mensaje = pubsub.get_message(timeout=timeout)
+    if not mensaje or mensaje.get("type") != "message":
+        return None
+    try:
+        return json.loads(mensaje["data"])
+    except (TypeError, ValueError):
+        return None
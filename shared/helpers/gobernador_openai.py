@@ -0,0 +1,357 @@
+# shared/helpers/gobernador_openai.py
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+import httpx
+from shared.config import (
+    OPENAI_GOBERNADOR_REINTENTOS,
+    OPENAI_CIRCUITO_UMBRAL,
+    OPENAI_CIRCUITO_ENFRIAMIENTO
+)
+from shared.helpers.redis_cliente import obtener_redis
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 0.5        # segundos
+BACKOFF_MAX = 20
+ESPERA_MAX_TURNO = 60     # pasado esto se envía igual y decide el servidor
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Solo cuentan para el circuit breaker las caídas del servicio; un 429 es el
+# rate limit haciendo su trabajo (lo resuelve el backoff, no el circuito)
+ESTADOS_FALLA_CIRCUITO = {500, 502, 503, 504}
+# Solo se reintentan errores en los que la petición no llegó a salir
+ERRORES_REINTENTABLES = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Un 5xx a un POST puede llegar después de que el servidor lo ejecutó (mensaje o run
+# creado): se reintenta solo si la petición trae clave de idempotencia
+CABECERA_IDEMPOTENCIA = "Idempotency-Key"
+
+TIPOS = ("requests", "tokens")
+_PREFIJO = "openai:limite:"
+_CLAVE_CIRCUITO = "openai:circuito"
+_TTL_LIMITES = 120  # segundos sin noticias del servidor → se olvida el presupuesto
+
+# Toma `costos` de cada balde solo si alcanza en todos; si no, retorna los ms a esperar.
+# -1 = circuito abierto. Sin límites conocidos (aún no hubo respuesta) se deja pasar.
+_LUA_TURNO = """
+if redis.call('EXISTS', KEYS[#KEYS]) == 1 then return -1 end
+local ahora = tonumber(ARGV[1])
+local espera = 0
+local estados = {}
+for i = 1, #KEYS - 1 do
+    local b = redis.call('HMGET', KEYS[i], 'disponible', 'capacidad', 'tasa', 'actualizado')
+    if b[2] then
+        local capacidad = tonumber(b[2])
+        local tasa = tonumber(b[3])
+        local disponible = math.min(capacidad, tonumber(b[1]) + (ahora - tonumber(b[4])) * tasa)
+        local costo = math.min(tonumber(ARGV[i + 1]), capacidad)
+        if disponible < costo and tasa > 0 then
+            espera = math.max(espera, math.ceil((costo - disponible) / tasa))
+        end
+        estados[i] = {disponible, costo}
+    end
+end
+if espera > 0 then return espera end
+for i, e in pairs(estados) do
+    redis.call('HSET', KEYS[i], 'disponible', e[1] - e[2], 'actualizado', ahora)
+end
+return 0
+"""
+
+# Endpoints que consumen tokens del modelo; /files y /vector_stores no gastan TPM
+_PATRON_CON_TOKENS = re.compile(r'/threads/[^/]+/messages$|/runs$|/chat/completions$|/embeddings$')
+_PATRON_DURACION = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_UNIDADES = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class CircuitoAbierto(httpx.TransportError):
+    """OpenAI falló demasiadas veces seguidas: se corta el tráfico un rato."""
+
+
+def _duracion(valor):
+    """'6m0s', '1.5s', '20ms' → segundos."""
+    if not valor:
+        return None
+    return sum(float(n) * _UNIDADES[u] for n, u in _PATRON_DURACION.findall(valor)) or None
+
+
+def _costo_tokens(request):
+    """Estimación previa (≈4 caracteres por token); los encabezados corrigen después."""
+    if request.method != "POST" or not _PATRON_CON_TOKENS.search(request.url.path):
+        return 0
+    return max(1, len(request.content) // 4)
+
+
+class Gobernador:
+    """
+    Presupuesto de requests y tokens por minuto de OpenAI, compartido entre
+    procesos vía Redis (o local si no hay Redis), más circuit breaker.
+    Los límites se aprenden de los encabezados x-ratelimit-* de cada respuesta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locales = {}  # tipo -> {"disponible", "capacidad", "tasa", "actualizado"}
+        self._fallas_seguidas = 0
+        self._abierto_hasta = 0.0
+        self._script = None
+
+    # --- Turno (token bucket) ---
+    def turno(self, costos):
+        """Segundos a esperar antes de enviar (0 = adelante). Lanza CircuitoAbierto."""
+        if time.monotonic() < self._abierto_hasta:
+            raise CircuitoAbierto("Circuito de OpenAI abierto")
+
+        ahora_ms = int(time.time() * 1000)
+        r = obtener_redis()
+        if r is not None:
+            try:
+                if self._script is None:
+                    self._script = r.register_script(_LUA_TURNO)
+                claves = [_PREFIJO + t for t in TIPOS] + [_CLAVE_CIRCUITO]
+                espera = self._script(keys=claves, args=[ahora_ms] + [costos[t] for t in TIPOS])
+                if espera == -1:
+                    raise CircuitoAbierto("Circuito de OpenAI abierto (otro proceso)")
+                return espera / 1000
+            except CircuitoAbierto:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Gobernador sin Redis, se usa presupuesto local: {e}")
+
+        return self._turno_local(ahora_ms, costos)
+
+    def _turno_local(self, ahora_ms, costos):
+        with self._lock:
+            espera = 0
+            estados = {}
+            for tipo in TIPOS:
+                b = self._locales.get(tipo)
+                if not b:
+                    continue
+                disponible = min(b["capacidad"], b["disponible"] + (ahora_ms - b["actualizado"]) * b["tasa"])
+                costo = min(costos[tipo], b["capacidad"])
+                if disponible < costo and b["tasa"] > 0:
+                    espera = max(espera, (costo - disponible) / b["tasa"])
+                estados[tipo] = (disponible, costo)
+            if espera > 0:
+                return espera / 1000
+            for tipo, (disponible, costo) in estados.items():
+                self._locales[tipo].update(disponible=disponible - costo, actualizado=ahora_ms)
+            return 0
+
+    # --- Aprendizaje desde encabezados ---
+    def actualizar_limites(self, cabeceras):
+        ahora_ms = int(time.time() * 1000)
+        nuevos = {}
+        for tipo in TIPOS:
+            limite = cabeceras.get(f"x-ratelimit-limit-{tipo}")
+            restante = cabeceras.get(f"x-ratelimit-remaining-{tipo}")
+            if limite is None or restante is None:
+                continue
+            try:
+                limite, restante = float(limite), float(restante)
+            except ValueError:
+                continue
+            if limite <= 0:
+                continue
+            # Límites por minuto: se recarga la capacidad completa en 60 s
+            nuevos[tipo] = {
+                "disponible": restante,
+                "capacidad": limite,
+                "tasa": limite / 60000,
+                "actualizado": ahora_ms
+            }
+        if not nuevos:
+            return
+
+        with self._lock:
+            self._locales.update(nuevos)
+
+        r = obtener_redis()
+        if r is not None:
+            try:
+                pipe = r.pipeline()
+                for tipo, valores in nuevos.items():
+                    pipe.hset(_PREFIJO + tipo, mapping=valores)
+                    pipe.expire(_PREFIJO + tipo, _TTL_LIMITES)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudieron publicar los límites de OpenAI en Redis: {e}")
+
+    # --- Backoff ---
+    def espera_reintento(self, intento, cabeceras=None):
+        """Retry-After del servidor si lo hay; si no, backoff exponencial con jitter completo."""
+        if cabeceras is not None:
+            ms = cabeceras.get("retry-after-ms")
+            if ms:
+                try:
+                    return float(ms) / 1000
+                except ValueError:
+                    pass
+            segundos = cabeceras.get("retry-after")
+            if segundos:
+                try:
+                    return float(segundos)
+                except ValueError:
+                    pass
+            reinicio = _duracion(cabeceras.get("x-ratelimit-reset-requests")) or 0
+            reinicio = max(reinicio, _duracion(cabeceras.get("x-ratelimit-reset-tokens")) or 0)
+            if reinicio:
+                return min(reinicio, BACKOFF_MAX) * (1 + random.random() * 0.2)
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** intento))
+
+    # --- Circuit breaker ---
+    def registrar_exito(self):
+        self._fallas_seguidas = 0
+
+    def registrar_falla(self):
+        self._fallas_seguidas += 1
+        if self._fallas_seguidas < OPENAI_CIRCUITO_UMBRAL:
+            return
+        # Medio abierto al vencer: una falla más lo vuelve a abrir
+        self._abierto_hasta = time.monotonic() + OPENAI_CIRCUITO_ENFRIAMIENTO
+        logger.error(f"🚫 Circuito de OpenAI abierto {OPENAI_CIRCUITO_ENFRIAMIENTO}s "
+                     f"({self._fallas_seguidas} fallas seguidas)")
+        r = obtener_redis()
+        if r is not None:
+            try:
+                r.set(_CLAVE_CIRCUITO, "1", px=int(OPENAI_CIRCUITO_ENFRIAMIENTO * 1000))
+            except Exception:
+                pass
+
+    def registrar_respuesta(self, respuesta):
+        if respuesta.status_code in ESTADOS_FALLA_CIRCUITO:
+            self.registrar_falla()
+        elif respuesta.status_code != 429:
+            self.registrar_exito()
+
+
+_gobernador = Gobernador()
+
+
+def _costos(request):
+    return {"requests": 1, "tokens": _costo_tokens(request)}
+
+
+def _sin_cuota(respuesta):
+    """429 por cuota agotada (no por rate limit): esperar no lo arregla."""
+    try:
+        error = respuesta.json().get("error") or {}
+    except ValueError:
+        return False
+    return isinstance(error, dict) and error.get("code") == "insufficient_quota"
+
+
+def _reintentable(request, respuesta):
+    """
+    Un 429 siempre se reintenta (no se procesó), salvo cuota agotada; un 5xx
+    solo si repetir la petición no la duplica. El cuerpo de un 429 ya debe estar leído.
+    """
+    if respuesta.status_code not in ESTADOS_REINTENTABLES:
+        return False
+    if respuesta.status_code == 429:
+        if _sin_cuota(respuesta):
+            logger.error("❌ OpenAI sin cuota (insufficient_quota): no se reintenta")
+            return False
+        return True
+    return request.method in ("GET", "HEAD", "DELETE") or CABECERA_IDEMPOTENCIA in request.headers
+
+
+class GobernadorTransport(httpx.BaseTransport):
+    """Transporte httpx que pasa cada petición a OpenAI por el gobernador."""
+
+    def __init__(self, transporte, gobernador=None):
+        self._transporte = transporte
+        self._gob = gobernador or _gobernador
+
+    def _esperar_turno(self, request):
+        costos = _costos(request)
+        limite = time.monotonic() + ESPERA_MAX_TURNO
+        while True:
+            espera = self._gob.turno(costos)
+            if espera <= 0 or time.monotonic() + espera > limite:
+                return
+            time.sleep(espera * (1 + random.random() * 0.1))
+
+    def handle_request(self, request):
+        request.read()  # cuerpo en memoria para poder reenviarlo
+        for intento in range(OPENAI_GOBERNADOR_REINTENTOS + 1):
+            ultimo = intento == OPENAI_GOBERNADOR_REINTENTOS
+            self._esperar_turno(request)
+            try:
+                respuesta = self._transporte.handle_request(request)
+            except ERRORES_REINTENTABLES:
+                self._gob.registrar_falla()
+                if ultimo:
+                    raise
+                time.sleep(self._gob.espera_reintento(intento))
+                continue
+            except httpx.TransportError:
+                self._gob.registrar_falla()
+                raise
+
+            self._gob.actualizar_limites(respuesta.headers)
+            self._gob.registrar_respuesta(respuesta)
+            if respuesta.status_code == 429:
+                respuesta.read()  # el código del error viene en el cuerpo
+            if _reintentable(request, respuesta) and not ultimo:
+                espera = self._gob.espera_reintento(intento, respuesta.headers)
+                logger.warning(f"⏳ OpenAI {respuesta.status_code}, reintento {intento + 1} en {espera:.1f}s")
+                respuesta.close()
+                time.sleep(espera)
+                continue
+            return respuesta
+
+    def close(self):
+        self._transporte.close()
+
+
+class GobernadorTransportAsync(httpx.AsyncBaseTransport):
+    """Variante asyncio de GobernadorTransport (mismo presupuesto compartido)."""
+
+    def __init__(self, transporte, gobernador=None):
+        self._transporte = transporte
+        self._gob = gobernador or _gobernador
+
+    async def _esperar_turno(self, request):
+        costos = _costos(request)
+        limite = time.monotonic() + ESPERA_MAX_TURNO
+        while True:
+            espera = self._gob.turno(costos)
+            if espera <= 0 or time.monotonic() + espera > limite:
+                return
+            await asyncio.sleep(espera * (1 + random.random() * 0.1))
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        for intento in range(OPENAI_GOBERNADOR_REINTENTOS + 1):
+            ultimo = intento == OPENAI_GOBERNADOR_REINTENTOS
+            await self._esperar_turno(request)
+            try:
+                respuesta = await self._transporte.handle_async_request(request)
+            except ERRORES_REINTENTABLES:
+                self._gob.registrar_falla()
+                if ultimo:
+                    raise
+                await asyncio.sleep(self._gob.espera_reintento(intento))
+                continue
+            except httpx.TransportError:
+                self._gob.registrar_falla()
+                raise
+
+            self._gob.actualizar_limites(respuesta.headers)
+            self._gob.registrar_respuesta(respuesta)
+            if respuesta.status_code == 429:
+                await respuesta.aread()  # el código del error viene en el cuerpo
+            if _reintentable(request, respuesta) and not ultimo:
+                espera = self._gob.espera_reintento(intento, respuesta.headers)
+                logger.warning(f"⏳ OpenAI {respuesta.status_code}, reintento {intento + 1} en {espera:.1f}s")
+                await respuesta.aclose()
+                await asyncio.sleep(espera)
+                continue
+            return respuesta
+
+    async def aclose(self):
+        await self._transporte.aclose()
@@ -1,8 +1,31 @@
+import os
 import re
+import secrets
+import threading
+import time
+import unicodedata
 from flask import Flask
 from shared.models.db import db
 from shared.config import DATABASE_URL
 
+# === PATRONES PRECOMPILADOS (post-proceso de respuestas) ===
+PATRON_FUENTE = re.compile(r'【[^†]*†([^】]+)】')
+# Una sola pasada: salto antes de "1. Título" / "### Título" o viñeta mal indentada
+_PATRON_FORMATO = re.compile(
+    r'(?P<salto>\d+\. [A-Z]|### [^-\n])'
+    r'|^(?!  - )[ \t]+- (?=[ \t]*\S)',
+    re.MULTILINE
+)
+
+# Versión del HTML pre-renderizado: subirla al cambiar el formato invalida lo guardado
+RENDER_VERSION = 1
+ETIQUETAS_HTML_PERMITIDAS = [
+    "p", "br", "hr", "strong", "em", "b", "i", "code", "pre", "blockquote",
+    "ul", "ol", "li", "h1", "h2", "h3", "h4", "h5", "h6",
+    "table", "thead", "tbody", "tr", "th", "td", "a", "span"
+]
+ATRIBUTOS_HTML_PERMITIDOS = {"a": ["href", "title", "target", "rel"], "span": ["class"], "code": ["class"]}
+
 def extraer_fuentes(respuesta):
     """
     Extrae fuentes del formato: [Fuente: archivo.pdf] o (archivo.py)
@@ -14,59 +37,157 @@ def extraer_fuentes(respuesta):
     return fuentes or ["Documentos del curso"]
 
 
-def procesar_respuesta_con_fuentes(respuesta):
+def procesar_respuesta_con_fuentes(respuesta, citas=None):
     """
-    - Extrae fuentes del formato OpenAI: 【64:0†archivo.pdf】
+    - Con `citas` (anotaciones file_citation del mensaje) quita sus marcadores
+      del texto y usa sus file_id (y url de Canvas si ya fue resuelta);
+      sin ellas, extrae las fuentes del formato OpenAI: 【64:0†archivo.pdf】
     - Convierte texto plano con - en listas Markdown
     - Añade saltos de línea entre párrafos
     - Devuelve texto con formato mejorado y lista de fuentes
+      [{"nombre", "file_id", "canvas_file_id", "url"}]
     """
-    # Extraer fuentes
-    patron_fuente = r'【[^†]*†([^】]+)】'
-    fuentes = re.findall(patron_fuente, respuesta)
-    fuentes_unicas = list(set(fuentes))
-
-    # Eliminar fuentes del texto
-    texto_limpio = re.sub(patron_fuente, "", respuesta)
-
-    # Añadir saltos de línea antes de números o títulos
-    texto_limpio = re.sub(r'(\d+\. [A-Z])', r'\n\n\1', texto_limpio)  # 1. Geocodificación → \n\n1. Geocodificación
-    texto_limpio = re.sub(r'(### [^-\n])', r'\n\n\1', texto_limpio)   # ### Sugerencias → \n\n### Sugerencias
-
-    # Convertir "- Propósito:" en listas Markdown
-    # Asegura que cada - esté precedido por \n si no lo está
-    lines = texto_limpio.split('\n')
-    processed_lines = []
-    for line in lines:
-        stripped = line.strip()
-        if stripped.startswith('- ') and not line.startswith('  - ') and not line.startswith('- '):
-            processed_lines.append(f"- {stripped[2:]}")
-        else:
-            processed_lines.append(line)
+    fuentes_unicas = []
+
+    if citas:
+        vistos = set()
+        texto_limpio = respuesta
+        for cita in citas:
+            if cita.get("marcador"):
+                texto_limpio = texto_limpio.replace(cita["marcador"], "")
+            clave = cita.get("file_id") or cita.get("nombre")
+            if clave and clave not in vistos:
+                vistos.add(clave)
+                fuentes_unicas.append({
+                    "nombre": cita.get("nombre") or cita.get("file_id"),
+                    "file_id": cita.get("file_id"),
+                    "canvas_file_id": cita.get("canvas_file_id"),
+                    "url": cita.get("url")
+                })
+        # Por si quedó algún marcador sin anotación
+        texto_limpio = PATRON_FUENTE.sub("", texto_limpio)
+    else:
+        # Extraer fuentes (sin repetir, en orden de aparición)
+        fuentes = PATRON_FUENTE.findall(respuesta)
+        fuentes_unicas = [
+            {"nombre": f, "file_id": None, "canvas_file_id": None, "url": None}
+            for f in dict.fromkeys(fuentes)
+        ]
+
+        # Eliminar fuentes del texto
+        texto_limpio = PATRON_FUENTE.sub("", respuesta)
 
-    texto_formateado = '\n'.join(processed_lines)
+    # En una sola pasada:
+    # - 1. Geocodificación → \n\n1. Geocodificación ; ### Sugerencias → \n\n### Sugerencias
+    # - "   - Propósito:" → "- Propósito:" (lista Markdown)
+    texto_formateado = _PATRON_FORMATO.sub(
+        lambda m: "\n\n" + m.group("salto") if m.group("salto") else "- ",
+        texto_limpio
+    )
 
     # Añadir fuentes al final en Markdown
     if fuentes_unicas:
-        fuentes_md = "\n\n---\n\n**📄 Fuentes utilizadas:**\n" + "\n".join([f"- `{fuente}`" for fuente in fuentes_unicas])
+        fuentes_md = "\n\n---\n\n**📄 Fuentes utilizadas:**\n" + "\n".join([
+            f"- [{fuente['nombre']}]({fuente['url']})" if fuente.get("url") else f"- `{fuente['nombre']}`"
+            for fuente in fuentes_unicas
+        ])
         texto_final = texto_formateado + fuentes_md
     else:
         texto_final = texto_formateado
 
     return texto_final, fuentes_unicas
 
+def renderizar_respuesta_html(texto_markdown):
+    """
+    Convierte la respuesta (Markdown) en HTML sanitizado, una sola vez en el worker.
+    Retorna None si faltan markdown/bleach: el navegador la renderiza como antes.
+    """
+    if not texto_markdown:
+        return None
+    try:
+        import bleach
+        from markdown import markdown
+    except ImportError:
+        return None
+
+    html = markdown(texto_markdown, extensions=["extra", "sane_lists", "nl2br"])
+    return bleach.clean(
+        html,
+        tags=ETIQUETAS_HTML_PERMITIDAS,
+        attributes=ATRIBUTOS_HTML_PERMITIDOS,
+        protocols=["http", "https", "mailto"],
+        strip=True
+    )
+
+def normalizar_pregunta(pregunta):
+    """
+    Normaliza una pregunta para compararla con otras:
+    minúsculas, sin tildes, sin signos de puntuación y con espacios simples.
+    Ej: "¿Cuándo es el  PARCIAL?" → "cuando es el parcial"
+    """
+    if not pregunta:
+        return ""
+    texto = unicodedata.normalize("NFKD", pregunta.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^\w\s]', ' ', texto)
+    return " ".join(texto.split())
+
 def limpiar_respuesta_openai(respuesta):
     """
     Limpia y normaliza la respuesta del asistente.
     """
     return respuesta.strip()
 
+# === IDS ORDENABLES POR TIEMPO (estilo ULID) ===
+_ALFABETO_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_estado_ids = {"ms": 0, "aleatorio": 0}
+_lock_ids = threading.Lock()
+
+def _reiniciar_estado_ids():
+    # Tras un fork, el hijo no debe continuar la secuencia del padre
+    _estado_ids["ms"] = 0
+    _estado_ids["aleatorio"] = 0
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_estado_ids)
+
+def generar_ulid():
+    """
+    ULID de 26 caracteres: 48 bits de milisegundos + 80 bits aleatorios.
+    Ordenable por tiempo (buena localidad en índices B-tree) y monótono
+    dentro del proceso: en el mismo milisegundo se incrementa la parte
+    aleatoria. Entre procesos/nodos la unicidad la dan los 80 bits aleatorios.
+    """
+    with _lock_ids:
+        ms = int(time.time() * 1000)
+        if ms <= _estado_ids["ms"]:
+            # Mismo milisegundo (o reloj hacia atrás): seguir la secuencia
+            ms = _estado_ids["ms"]
+            aleatorio = _estado_ids["aleatorio"] + 1
+            if aleatorio >> 80:
+                ms += 1
+                aleatorio = secrets.randbits(80)
+        else:
+            aleatorio = secrets.randbits(80)
+        _estado_ids["ms"] = ms
+        _estado_ids["aleatorio"] = aleatorio
+
+    valor = (ms << 80) | aleatorio
+    caracteres = []
+    for _ in range(26):
+        caracteres.append(_ALFABETO_CROCKFORD[valor & 31])
+        valor >>= 5
+    return "".join(reversed(caracteres))
+
+def generar_id(prefijo):
+    """Genera un ID único con prefijo legible. Ej: consulta_01J8Z3...."""
+    return f"{prefijo}_{generar_ulid()}"
+
 def generar_id_unico():
     """
     Genera un ID único para consultas o archivos.
     """
-    import time
-    return f"item_{int(time.time())}"
+    return generar_id("item")
 
 def generar_respuesta_formateada(user_name, course_name, nro_consulta, restantes, texto_respuesta, fuentes):
     fuentes_html = "".join([f"<li>{fuente}</li>" for fuente in fuentes])
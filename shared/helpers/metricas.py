@@ -0,0 +1,212 @@
+# shared/helpers/metricas.py
+# Métricas estilo Prometheus para web y worker. prometheus_client es opcional:
+# sin él todas las métricas son no-ops. Con gunicorn (varios procesos) se usa
+# el modo multiproceso si PROMETHEUS_MULTIPROC_DIR está definido.
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MULTIPROCESO = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+try:
+    import prometheus_client as _prom
+except ImportError:
+    _prom = None
+
+BUCKETS_HTTP = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+BUCKETS_RUN = (1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+class _Nula:
+    """Métrica que no hace nada (prometheus_client no instalado)."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def dec(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+    def observe(self, *args, **kwargs):
+        pass
+
+
+def _contador(nombre, descripcion, etiquetas=()):
+    return _prom.Counter(nombre, descripcion, etiquetas) if _prom else _Nula()
+
+
+def _histograma(nombre, descripcion, etiquetas=(), buckets=BUCKETS_HTTP):
+    return _prom.Histogram(nombre, descripcion, etiquetas, buckets=buckets) if _prom else _Nula()
+
+
+def _gauge(nombre, descripcion, etiquetas=()):
+    if not _prom:
+        return _Nula()
+    # livesum: suma de los procesos vivos (pool de cada worker de gunicorn)
+    return _prom.Gauge(nombre, descripcion, etiquetas, multiprocess_mode="livesum")
+
+
+# === Definiciones ===
+CONSULTAS_PROCESADAS = _contador(
+    "asistente_consultas_procesadas_total",
+    "Consultas terminadas por el worker", ["origen"]  # openai, cache, similar, error
+)
+RUN_DURACION = _histograma(
+    "asistente_run_duracion_segundos",
+    "Duración de los runs de OpenAI (stream completo)", buckets=BUCKETS_RUN
+)
+SOLICITUDES_EXTERNAS = _histograma(
+    "asistente_solicitudes_externas_segundos",
+    "Latencia de solicitudes a servicios externos", ["servicio", "resultado"]
+)
+ERRORES_EXTERNOS = _contador(
+    "asistente_solicitudes_externas_errores_total",
+    "Solicitudes externas fallidas (excepción o HTTP >= 400)", ["servicio"]
+)
+ARCHIVOS_SINCRONIZADOS = _contador(
+    "asistente_archivos_sincronizados_total",
+    "Archivos procesados en la sincronización con Canvas", ["resultado"]
+)
+BYTES_TRANSFERIDOS = _contador(
+    "asistente_bytes_transferidos_total",
+    "Bytes descargados/subidos a servicios externos", ["servicio", "direccion"]
+)
+POOL_DB_EN_USO = _gauge(
+    "asistente_db_pool_en_uso",
+    "Conexiones del pool de la DB prestadas en este momento"
+)
+POOL_DB_TAMANO = _gauge(
+    "asistente_db_pool_tamano",
+    "Tamaño configurado del pool de la DB"
+)
+
+# Funciones que se evalúan en cada scrape: nombre -> (descripción, etiqueta, función → {valor_etiqueta: n})
+_gauges_calculados = {}
+
+
+# === Registro de observaciones ===
+def _resultado(status):
+    if status is None:
+        return "error"
+    return f"{status // 100}xx"
+
+
+def observar_solicitud(servicio, segundos, status=None, bytes_recibidos=None):
+    """Registra una solicitud externa (status None = excepción)."""
+    SOLICITUDES_EXTERNAS.labels(servicio, _resultado(status)).observe(segundos)
+    if status is None or status >= 400:
+        ERRORES_EXTERNOS.labels(servicio).inc()
+    if bytes_recibidos:
+        BYTES_TRANSFERIDOS.labels(servicio, "entrada").inc(bytes_recibidos)
+
+
+@contextmanager
+def medir_solicitud(servicio):
+    """
+    Mide un bloque que hace una solicitud HTTP con requests:
+        with medir_solicitud("canvas") as m:
+            m["respuesta"] = requests.get(...)
+    """
+    medicion = {"respuesta": None}
+    inicio = time.monotonic()
+    try:
+        yield medicion
+    except Exception:
+        observar_solicitud(servicio, time.monotonic() - inicio)
+        raise
+    respuesta = medicion["respuesta"]
+    status = getattr(respuesta, "status_code", None)
+    tamano = len(respuesta.content) if respuesta is not None else None  # sin stream=True
+    observar_solicitud(servicio, time.monotonic() - inicio, status, tamano)
+
+
+def hooks_httpx(servicio):
+    """event_hooks para httpx.Client: latencia hasta los encabezados y errores HTTP."""
+    def al_enviar(request):
+        request.extensions["metricas_inicio"] = time.monotonic()
+
+    def al_responder(response):
+        inicio = response.request.extensions.get("metricas_inicio")
+        if inicio is not None:
+            observar_solicitud(servicio, time.monotonic() - inicio, response.status_code)
+
+    return {"request": [al_enviar], "response": [al_responder]}
+
+
+def instrumentar_pool(engine):
+    """Sigue las conexiones prestadas del pool de SQLAlchemy con eventos checkout/checkin."""
+    if not _prom:
+        return
+    from sqlalchemy import event
+
+    tamano = getattr(engine.pool, "size", None)
+    if callable(tamano):
+        POOL_DB_TAMANO.set(tamano())
+
+    @event.listens_for(engine, "checkout")
+    def _prestada(*args):
+        POOL_DB_EN_USO.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _devuelta(*args):
+        POOL_DB_EN_USO.dec()
+
+
+def registrar_gauge_calculado(nombre, descripcion, etiqueta, funcion):
+    """Gauge cuyo valor se calcula al momento del scrape (p. ej. profundidad de la cola)."""
+    _gauges_calculados[nombre] = (descripcion, etiqueta, funcion)
+
+
+class _ColectorCalculado:
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+        for nombre, (descripcion, etiqueta, funcion) in _gauges_calculados.items():
+            familia = GaugeMetricFamily(nombre, descripcion, labels=[etiqueta])
+            try:
+                for valor_etiqueta, valor in funcion().items():
+                    familia.add_metric([str(valor_etiqueta)], valor)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo calcular {nombre}: {e}")
+                continue
+            yield familia
+
+
+_colector_global = None
+
+
+def generar_metricas():
+    """(cuerpo, content_type) en formato de texto de Prometheus."""
+    global _colector_global
+    if not _prom:
+        return b"# prometheus_client no instalado\n", "text/plain; version=0.0.4"
+
+    if MULTIPROCESO:
+        from prometheus_client import multiprocess
+        registro = _prom.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        registro.register(_ColectorCalculado())
+    else:
+        registro = _prom.REGISTRY
+        if _colector_global is None:
+            _colector_global = _ColectorCalculado()
+            registro.register(_colector_global)
+    return _prom.generate_latest(registro), _prom.CONTENT_TYPE_LATEST
+
+
+def iniciar_servidor_metricas(puerto):
+    """Servidor HTTP aparte (sidecar) con /metrics, para procesos sin Flask expuesto."""
+    if not _prom:
+        logger.warning("⚠️ prometheus_client no está instalado: sin endpoint de métricas")
+        return
+    if _colector_global is None:
+        generar_metricas()  # registra el colector de gauges calculados
+    _prom.start_http_server(puerto)
+    logger.info(f"📈 Métricas en :{puerto}/metrics")
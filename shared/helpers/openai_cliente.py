@@ -0,0 +1,117 @@
+# shared/helpers/openai_cliente.py
+import logging
+import threading
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from shared.config import (
+    OPENAI_API_KEY,
+    OPENAI_MAX_CONEXIONES,
+    OPENAI_CONEXIONES_KEEPALIVE,
+    OPENAI_KEEPALIVE_SEGUNDOS,
+    OPENAI_TIMEOUT_CONEXION,
+    OPENAI_TIMEOUT_LECTURA,
+    OPENAI_MAX_REINTENTOS,
+    OPENAI_HTTP2,
+    OPENAI_GOBERNADOR_HABILITADO
+)
+from shared.helpers.gobernador_openai import GobernadorTransport, GobernadorTransportAsync
+from shared.helpers.metricas import hooks_httpx
+from shared.helpers.trazas import TransporteTrazado, TransporteTrazadoAsync
+
+logger = logging.getLogger(__name__)
+
+_cliente = None
+_cliente_async = None
+_lock = threading.Lock()
+
+
+def _http2_disponible():
+    if not OPENAI_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _limites():
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONEXIONES,
+        max_keepalive_connections=OPENAI_CONEXIONES_KEEPALIVE,
+        keepalive_expiry=OPENAI_KEEPALIVE_SEGUNDOS
+    )
+
+
+def _timeout():
+    return httpx.Timeout(
+        OPENAI_TIMEOUT_LECTURA,
+        connect=OPENAI_TIMEOUT_CONEXION,
+        # Esperar un lugar en el pool cuenta como conexión: nada queda colgado
+        pool=OPENAI_TIMEOUT_CONEXION
+    )
+
+
+def _reintentos_sdk():
+    # Con el gobernador los reintentos (429/5xx) los hace el transporte
+    return 0 if OPENAI_GOBERNADOR_HABILITADO else OPENAI_MAX_REINTENTOS
+
+
+def _http_client():
+    """httpx.Client con pool, keep-alive, timeouts y HTTP/2; pasa por el gobernador."""
+    transporte = httpx.HTTPTransport(limits=_limites(), http2=_http2_disponible())
+    if OPENAI_GOBERNADOR_HABILITADO:
+        transporte = GobernadorTransport(transporte)
+    transporte = TransporteTrazado(transporte, "openai")
+    return httpx.Client(transport=transporte, timeout=_timeout(), event_hooks=hooks_httpx("openai"))
+
+
+def _http_client_async():
+    transporte = httpx.AsyncHTTPTransport(limits=_limites(), http2=_http2_disponible())
+    if OPENAI_GOBERNADOR_HABILITADO:
+        transporte = GobernadorTransportAsync(transporte)
+    transporte = TransporteTrazadoAsync(transporte, "openai")
+    return httpx.AsyncClient(transport=transporte, timeout=_timeout())
+
+
+def obtener_openai():
+    """
+    Cliente OpenAI compartido por todo el proceso (un solo pool HTTP).
+    httpx.Client es seguro entre hilos, así que el despachador de consultas
+    y la sincronización reutilizan las mismas conexiones.
+    """
+    global _cliente
+    if _cliente is not None:
+        return _cliente
+
+    with _lock:
+        if _cliente is None:
+            _cliente = OpenAI(
+                api_key=OPENAI_API_KEY,
+                max_retries=_reintentos_sdk(),
+                timeout=_timeout(),
+                http_client=_http_client()
+            )
+            logger.info(
+                f"✅ Cliente OpenAI: {OPENAI_MAX_CONEXIONES} conexiones, "
+                f"HTTP/2 {'sí' if _http2_disponible() else 'no'}, "
+                f"gobernador {'sí' if OPENAI_GOBERNADOR_HABILITADO else 'no'}"
+            )
+    return _cliente
+
+
+def obtener_openai_async():
+    """Variante asyncio con la misma configuración (un pool por proceso)."""
+    global _cliente_async
+    if _cliente_async is not None:
+        return _cliente_async
+
+    with _lock:
+        if _cliente_async is None:
+            _cliente_async = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                max_retries=_reintentos_sdk(),
+                timeout=_timeout(),
+                http_client=_http_client_async()
+            )
+    return _cliente_async
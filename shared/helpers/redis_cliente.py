@@ -0,0 +1,46 @@
+# shared/helpers/redis_cliente.py
+import logging
+import threading
+from shared.config import REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+_cliente = None
+_inicializado = False
+_lock = threading.Lock()
+
+
+def obtener_redis():
+    """
+    Devuelve un cliente Redis compartido por el proceso.
+    Retorna None si no hay REDIS_URL, si la librería no está instalada
+    o si el servidor no responde: quien lo use debe caer al modo local.
+    """
+    global _cliente, _inicializado
+    if _inicializado:
+        return _cliente
+
+    with _lock:
+        if _inicializado:
+            return _cliente
+        _inicializado = True
+
+        if not REDIS_URL:
+            return None
+
+        try:
+            import redis
+            cliente = redis.Redis.from_url(
+                REDIS_URL,
+                socket_timeout=2,
+                socket_connect_timeout=1,
+                decode_responses=True
+            )
+            cliente.ping()
+            _cliente = cliente
+            logger.info("✅ Conectado a Redis")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis no disponible, se usa solo memoria local: {e}")
+            _cliente = None
+
+    return _cliente
@@ -0,0 +1,123 @@
+# shared/helpers/registro.py
+# Logging estructurado para web y worker: una línea JSON por registro, niveles
+# por módulo y DEBUG muestreado/limitado para que no domine la CPU ni el costo de
+# ingesta. Los mensajes se formatean solo si se emiten: usar
+# logger.debug("... %s", valor) en vez de f-strings en rutas calientes.
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from shared.config import (
+    LOG_LEVEL,
+    LOG_FORMATO,
+    LOG_NIVELES,
+    LOG_DEBUG_POR_MINUTO,
+    LOG_DEBUG_MUESTREO
+)
+from shared.helpers.trazas import ids_traza
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Atributos propios de LogRecord: todo lo demás vino en extra={...}
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_configurado = False
+
+
+class FormateadorJSON(logging.Formatter):
+    """Un objeto JSON por línea: ts, nivel, logger, mensaje, servicio, extras y traza."""
+
+    converter = time.gmtime
+
+    def __init__(self, servicio):
+        super().__init__()
+        self.servicio = servicio
+
+    def format(self, record):
+        datos = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "servicio": self.servicio
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith("_"):
+                datos[clave] = valor
+        trace_id, span_id = ids_traza()
+        if trace_id:
+            datos["trace_id"] = trace_id
+            datos["span_id"] = span_id
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar los DEBUG por muestreo (LOG_DEBUG_MUESTREO) y como máximo
+    LOG_DEBUG_POR_MINUTO por sitio de llamada (archivo y línea).
+    El siguiente registro que pasa informa cuántos se descartaron.
+    """
+
+    def __init__(self, por_minuto=LOG_DEBUG_POR_MINUTO, muestreo=LOG_DEBUG_MUESTREO):
+        super().__init__()
+        self.por_minuto = por_minuto
+        self.muestreo = muestreo
+        self._ventanas = {}  # (archivo, línea) -> [inicio_ventana, emitidos, descartados]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        clave = (record.pathname, record.lineno)
+        ahora = time.monotonic()
+        with self._lock:
+            ventana = self._ventanas.get(clave)
+            if ventana is None or ahora - ventana[0] >= 60:
+                descartados = ventana[2] if ventana else 0
+                ventana = self._ventanas[clave] = [ahora, 0, descartados]
+            if ventana[1] >= self.por_minuto or random.random() >= self.muestreo:
+                ventana[2] += 1
+                return False
+            ventana[1] += 1
+            if ventana[2]:
+                record.descartados = ventana[2]
+                ventana[2] = 0
+        return True
+
+
+def _niveles_por_modulo(texto):
+    """'worker.services=DEBUG,httpx=WARNING' → {'worker.services': 'DEBUG', 'httpx': 'WARNING'}"""
+    niveles = {}
+    for par in texto.split(","):
+        if "=" in par:
+            modulo, nivel = par.split("=", 1)
+            niveles[modulo.strip()] = nivel.strip().upper()
+    return niveles
+
+
+def configurar_logging(servicio):
+    """Reemplaza los handlers del root logger por el formato del proyecto. Idempotente."""
+    global _configurado
+    if _configurado:
+        return
+    _configurado = True
+
+    handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMATO == "json":
+        handler.setFormatter(FormateadorJSON(servicio))
+    else:
+        handler.setFormatter(logging.Formatter(FORMATO_TEXTO))
+    handler.addFilter(FiltroMuestreo())
+
+    raiz = logging.getLogger()
+    for anterior in list(raiz.handlers):
+        raiz.removeHandler(anterior)
+    raiz.addHandler(handler)
+    raiz.setLevel(LOG_LEVEL.upper())
+
+    for modulo, nivel in _niveles_por_modulo(LOG_NIVELES).items():
+        logging.getLogger(modulo).setLevel(nivel)
@@ -0,0 +1,206 @@
+# shared/helpers/trazas.py
+# Trazas distribuidas (OpenTelemetry) de punta a punta: el formulario abre la
+# traza, su traceparent (W3C) se guarda en la consulta y el worker la continúa.
+# opentelemetry es opcional: sin él, o con TRAZAS_EXPORTADOR vacío, todo es no-op.
+import logging
+import re
+from contextlib import contextmanager
+import httpx
+from shared.config import TRAZAS_EXPORTADOR, TRAZAS_ARCHIVO, TRAZAS_MUESTREO
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as _trace
+    from opentelemetry.trace import Status, StatusCode
+    from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+except ImportError:
+    _trace = None
+
+_tracer = None  # None = trazas desactivadas en este proceso
+_propagador = TraceContextTextMapPropagator() if _trace else None
+
+LARGO_MAX_SQL = 500
+# /v1/threads/thread_abc/runs/run_123 → /v1/threads/{thread}/runs/{run} (nombres de span acotados)
+_PATRON_IDS = re.compile(r'/(thread|run|msg|step|file|vs|asst)_[A-Za-z0-9]+')
+
+
+def _exportador():
+    if TRAZAS_EXPORTADOR == "otlp":
+        # Destino en OTEL_EXPORTER_OTLP_ENDPOINT (por defecto el colector local, puerto 4318)
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if TRAZAS_EXPORTADOR == "archivo":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        archivo = open(TRAZAS_ARCHIVO, "a", encoding="utf-8")
+        # Un span por línea (JSON), fácil de filtrar por trace_id
+        return ConsoleSpanExporter(out=archivo, formatter=lambda span: span.to_json(indent=None) + "\n")
+    raise ValueError(f"TRAZAS_EXPORTADOR desconocido: {TRAZAS_EXPORTADOR}")
+
+
+def configurar_trazas(servicio):
+    """Crea el proveedor de trazas del proceso (web o worker). Idempotente."""
+    global _tracer
+    if _tracer is not None or not TRAZAS_EXPORTADOR:
+        return
+    if _trace is None:
+        logger.warning("⚠️ opentelemetry no está instalado: sin trazas")
+        return
+
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        exportador = _exportador()
+    except (ImportError, ValueError) as e:
+        logger.warning(f"⚠️ Trazas desactivadas: {e}")
+        return
+
+    proveedor = TracerProvider(
+        resource=Resource.create({"service.name": servicio}),
+        # El worker respeta la decisión de muestreo tomada en el formulario
+        sampler=ParentBased(TraceIdRatioBased(TRAZAS_MUESTREO))
+    )
+    proveedor.add_span_processor(BatchSpanProcessor(exportador))
+    _trace.set_tracer_provider(proveedor)
+    _tracer = _trace.get_tracer("asistente")
+    logger.info(f"🔭 Trazas de {servicio} → {TRAZAS_EXPORTADOR}")
+
+
+def _atributos(atributos):
+    return {clave: valor for clave, valor in atributos.items() if valor is not None}
+
+
+@contextmanager
+def tramo(nombre, padre=None, **atributos):
+    """
+    Span alrededor de un bloque; cuelga del span activo o, si se pasa `padre`
+    (un traceparent guardado), continúa esa traza. Retorna el span o None.
+    """
+    if _tracer is None:
+        yield None
+        return
+    contexto = _propagador.extract({"traceparent": padre}) if padre else None
+    with _tracer.start_as_current_span(nombre, context=contexto, attributes=_atributos(atributos)) as span:
+        yield span
+
+
+def evento(nombre, **atributos):
+    """Marca un instante dentro del span activo (p. ej. el run pasó a in_progress)."""
+    if _tracer is not None:
+        _trace.get_current_span().add_event(nombre, _atributos(atributos))
+
+
+def traceparent_actual():
+    """traceparent del span activo, para continuar la traza en otro proceso."""
+    if _tracer is None:
+        return None
+    portador = {}
+    _propagador.inject(portador)
+    return portador.get("traceparent")
+
+
+def ids_traza():
+    """(trace_id, span_id) en hex del span activo, para correlacionar logs; (None, None) sin traza."""
+    if _tracer is None:
+        return None, None
+    contexto = _trace.get_current_span().get_span_context()
+    if not contexto.is_valid:
+        return None, None
+    return format(contexto.trace_id, "032x"), format(contexto.span_id, "016x")
+
+
+# === Base de datos ===
+def instrumentar_db(engine):
+    """
+    Un span por sentencia SQL, solo dentro de una traza activa: el polling
+    del worker y demás tareas sueltas no generan trazas propias.
+    """
+    if _tracer is None:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, sentencia, parametros, contexto, executemany):
+        if not _trace.get_current_span().is_recording():
+            return
+        span = _tracer.start_span(
+            f"db {sentencia.split(None, 1)[0].upper()}",
+            attributes={"db.system": engine.dialect.name, "db.statement": sentencia[:LARGO_MAX_SQL]}
+        )
+        conn.info.setdefault("trazas", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, *args):
+        pila = conn.info.get("trazas")
+        if pila:
+            pila.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto):
+        conn = contexto.connection
+        pila = conn.info.get("trazas") if conn is not None else None
+        if pila:
+            span = pila.pop()
+            span.set_status(Status(StatusCode.ERROR, str(contexto.original_exception)))
+            span.end()
+
+
+# === HTTP (httpx: cliente de OpenAI) ===
+def _atributos_http(request, servicio):
+    return {
+        "peer.service": servicio,
+        "http.method": request.method,
+        "url.path": request.url.path
+    }
+
+
+def _nombre_http(request, servicio):
+    ruta = _PATRON_IDS.sub(r"/{\1}", request.url.path)
+    return f"{servicio} {request.method} {ruta}"
+
+
+def _cerrar_http(span, respuesta):
+    if span is None:
+        return
+    span.set_attribute("http.status_code", respuesta.status_code)
+    if respuesta.status_code >= 400:
+        span.set_status(Status(StatusCode.ERROR, f"HTTP {respuesta.status_code}"))
+
+
+class TransporteTrazado(httpx.BaseTransport):
+    """
+    Span por petición, hasta recibir los encabezados (incluye esperas y
+    reintentos del gobernador). El cuerpo en streaming lo mide quien lo consume.
+    """
+
+    def __init__(self, transporte, servicio):
+        self._transporte = transporte
+        self._servicio = servicio
+
+    def handle_request(self, request):
+        with tramo(_nombre_http(request, self._servicio), **_atributos_http(request, self._servicio)) as span:
+            respuesta = self._transporte.handle_request(request)
+            _cerrar_http(span, respuesta)
+            return respuesta
+
+    def close(self):
+        self._transporte.close()
+
+
+class TransporteTrazadoAsync(httpx.AsyncBaseTransport):
+    """Variante asyncio de TransporteTrazado."""
+
+    def __init__(self, transporte, servicio):
+        self._transporte = transporte
+        self._servicio = servicio
+
+    async def handle_async_request(self, request):
+        with tramo(_nombre_http(request, self._servicio), **_atributos_http(request, self._servicio)) as span:
+            respuesta = await self._transporte.handle_async_request(request)
+            _cerrar_http(span, respuesta)
+            return respuesta
+
+    async def aclose(self):
+        await self._transporte.aclose()
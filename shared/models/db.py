@@ -55,6 +55,33 @@ class HistorialConsulta(db.Model):
     timestamp = db.Column(db.DateTime, default=db.func.now())
     pregunta = db.Column(db.Text, nullable=False)
     respuesta = db.Column(db.Text)
+    respuesta_html = db.Column(db.Text)  # HTML sanitizado, generado por el worker
+    render_version = db.Column(db.Integer)  # RENDER_VERSION con que se generó respuesta_html
+    completado_en = db.Column(db.DateTime)  # cuando llegó a completado/error (latencia)
+    traceparent = db.Column(db.String)  # contexto de traza W3C generado al enviar la pregunta
+    reclamada_en = db.Column(db.DateTime)  # cuando un worker la pasó a "procesando" (UTC)
+    intentos = db.Column(db.Integer, nullable=False, default=0)  # veces que fue reclamada
+
+class TiempoConsulta(db.Model):
+    """Desglose de latencia (ms) y tokens de cada consulta; lo escribe el worker."""
+    __tablename__ = 'tiempos_consulta'
+    consulta_id = db.Column(db.String, primary_key=True)
+    course_id = db.Column(db.String)
+    asistente_id = db.Column(db.String)
+    creado_en = db.Column(db.DateTime, default=db.func.now())
+    origen = db.Column(db.String)  # openai, cache, similar, error
+    espera_cola_ms = db.Column(db.Integer)
+    crear_hilo_ms = db.Column(db.Integer)
+    crear_mensaje_ms = db.Column(db.Integer)
+    run_en_cola_ms = db.Column(db.Integer)
+    run_en_progreso_ms = db.Column(db.Integer)
+    obtener_mensaje_ms = db.Column(db.Integer)
+    postproceso_ms = db.Column(db.Integer)
+    commit_ms = db.Column(db.Integer)
+    total_ms = db.Column(db.Integer)  # desde que el worker la toma
+    tokens_prompt = db.Column(db.Integer)
+    tokens_completion = db.Column(db.Integer)
+    tokens_file_search = db.Column(db.Integer)
 
 class UsoMensual(db.Model):
     __tablename__ = 'uso_mensual'
@@ -63,6 +90,19 @@ class UsoMensual(db.Model):
     mes = db.Column(db.Date, primary_key=True)
     total = db.Column(db.Integer, default=0)
 
+class ResumenUsoDiario(db.Model):
+    """Agregado por día, curso, asistente y hora (UTC); lo mantiene el worker."""
+    __tablename__ = 'resumen_uso_diario'
+    fecha = db.Column(db.Date, primary_key=True)
+    course_id = db.Column(db.String, primary_key=True)
+    asistente_id = db.Column(db.String, primary_key=True)  # '' = sin asistente
+    hora = db.Column(db.Integer, primary_key=True)  # 0-23
+    consultas = db.Column(db.Integer, nullable=False, default=0)
+    completadas = db.Column(db.Integer, nullable=False, default=0)
+    errores = db.Column(db.Integer, nullable=False, default=0)
+    latencia_total_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    latencia_n = db.Column(db.Integer, nullable=False, default=0)  # consultas con latencia medida
+
 class Hilo(db.Model):
     __tablename__ = 'hilos'
     thread_id = db.Column(db.String, primary_key=True)
@@ -70,6 +110,9 @@ class Hilo(db.Model):
     course_id = db.Column(db.String, db.ForeignKey('cursos.course_id'))
     asistente_id = db.Column(db.String)
     creado_en = db.Column(db.DateTime, default=db.func.now())
+    activo = db.Column(db.Boolean, nullable=False, default=True)  # False = rotado
+    mensajes_total = db.Column(db.Integer, nullable=False, default=0)
+    tokens_contexto = db.Column(db.Integer, nullable=False, default=0)  # prompt_tokens del último run
 
 class Mensaje(db.Model):
     __tablename__ = 'mensajes'
@@ -77,7 +120,7 @@ class Mensaje(db.Model):
     thread_id = db.Column(db.String, db.ForeignKey('hilos.thread_id'), nullable=False)
     pregunta = db.Column(db.Text, nullable=False)
     respuesta = db.Column(db.Text)
-    fuentes = db.Column(db.JSON)  # Ej: ["archivo1.pdf", "datos.csv"]
+    fuentes = db.Column(db.JSON)  # Ej: [{"nombre": "a.pdf", "file_id": "file-...", "canvas_file_id": "123", "url": "https://..."}]
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 curso_asistente = Table(
@@ -1,6 +1,10 @@
 # shared/models/db_services.py
+import logging
+import time
 from .db import db
-from shared.helpers.helpers import normalizar_fecha
+from shared.helpers.helpers import normalizar_fecha, generar_ulid
+
+logger = logging.getLogger(__name__)
 
 def registrar_archivo(canvas_file_id, filename, updated_at, file_id_openai, course_id):
     """Registra o actualiza un archivo procesado"""
@@ -21,9 +25,9 @@ def registrar_archivo(canvas_file_id, filename, updated_at, file_id_openai, cour
             registro.updated_at = updated_at
             registro.file_id_openai = file_id_openai
             db.session.commit()
-            print(f"🔄 Archivo actualizado: {canvas_file_id}")
+            logger.debug("🔄 Archivo actualizado: %s", canvas_file_id)
         else:
-            print(f"🔁 Sin cambios: {canvas_file_id}")
+            logger.debug("🔁 Sin cambios: %s", canvas_file_id)
     else:
         # ✅ Crear nuevo
         registro = ArchivoProcesado(
@@ -35,7 +39,7 @@ def registrar_archivo(canvas_file_id, filename, updated_at, file_id_openai, cour
         )
         db.session.add(registro)
         db.session.commit()
-        print(f"✅ Nuevo archivo registrado: {canvas_file_id}")
+        logger.debug("✅ Nuevo archivo registrado: %s", canvas_file_id)
 
     return registro
 
@@ -55,11 +59,10 @@ def obtener_asistente_interno_por_subtipo(subtipo):
         if not asistente:
             raise Exception(f"Asistente interno no encontrado: {subtipo}")
 
-        print(f"✅ Asistente encontrado: {asistente.asistente_id} ({asistente.subtipo})")
         return asistente
 
     except Exception as e:
-        print(f"❌ Error al obtener asistente interno {subtipo}: {e}")
+        logger.error(f"❌ Error al obtener asistente interno {subtipo}: {e}")
         raise
 
 
@@ -77,39 +80,187 @@ def registrar_usuario(user_id, nombre, email=None, rol="estudiante"):
         db.session.rollback()
         raise
 
+def _insert_upsert():
+    """`insert` del dialecto activo (Postgres o SQLite), con ON CONFLICT."""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def incrementar_uso_db(user_id, course_id, mes, cantidad=1, limite=None):
+    """
+    Suma `cantidad` al uso mensual en una sola sentencia atómica:
+    INSERT ... ON CONFLICT DO UPDATE ... WHERE total < limite RETURNING total.
+    Retorna el nuevo total, o None si ya se alcanzó el límite.
+    """
+    from .db import UsoMensual
+
+    tabla = UsoMensual.__table__
+    insert = _insert_upsert()
+    stmt = insert(tabla).values(user_id=user_id, course_id=course_id, mes=mes, total=cantidad)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.user_id, tabla.c.course_id, tabla.c.mes],
+        set_={"total": tabla.c.total + cantidad},
+        where=(tabla.c.total < limite) if limite is not None else None
+    ).returning(tabla.c.total)
+
+    try:
+        fila = db.session.execute(stmt).first()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return fila[0] if fila else None
+
+
+# Lua: verifica el límite e incrementa en un solo paso; anota el delta pendiente
+_LUA_USO = """
+local actual = redis.call('GET', KEYS[1])
+if not actual then return -2 end
+if tonumber(actual) >= tonumber(ARGV[1]) then return -1 end
+local total = redis.call('INCR', KEYS[1])
+redis.call('HINCRBY', KEYS[2], KEYS[1], 1)
+return total
+"""
+# Renombra los pendientes a un lote y lo anota (con su hora) en el registro de lotes
+_LUA_TOMAR_LOTE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('ZADD', KEYS[3], ARGV[1], KEYS[2])
+return 1
+"""
+_CLAVE_USO_PENDIENTE = "uso:pendientes"
+_CLAVE_USO_LOTES = "uso:lotes"  # zset lote -> hora en que se tomó
+_TTL_USO = 40 * 24 * 3600  # algo más de un mes
+_EDAD_LOTE_HUERFANO = 600  # segundos: un lote más viejo quedó de un worker que murió
+_lotes_recuperados = False
+
+
+def _clave_uso(user_id, course_id, mes):
+    # user_id va al final: puede contener ':'
+    return f"uso:{mes.isoformat()}:{course_id}:{user_id}"
+
+
+def _uso_pendiente(r, clave):
+    """Incrementos de `clave` que están en Redis y todavía no llegaron a la DB."""
+    pipe = r.pipeline(transaction=False)
+    pipe.hget(_CLAVE_USO_PENDIENTE, clave)
+    for lote in r.zrange(_CLAVE_USO_LOTES, 0, -1):
+        pipe.hget(lote, clave)
+    return sum(int(delta) for delta in pipe.execute() if delta)
+
+
+def _registrar_consulta_redis(r, user_id, course_id, mes, limite):
+    """True/False según el límite, o None si Redis falla (se usa la DB)."""
+    from .db import UsoMensual
+
+    clave = _clave_uso(user_id, course_id, mes)
+    try:
+        resultado = r.eval(_LUA_USO, 2, clave, _CLAVE_USO_PENDIENTE, limite)
+        if resultado == -2:
+            # Primera vez en el mes (o la clave expiró/se desalojó): sembrar desde la DB
+            # más lo que aún no se volcó. Los pendientes se leen antes que la DB: si un
+            # lote se aplica entre medio se cuenta dos veces (de más, nunca de menos).
+            pendiente = _uso_pendiente(r, clave)
+            uso = UsoMensual.query.filter_by(user_id=user_id, course_id=course_id, mes=mes).first()
+            r.set(clave, (uso.total if uso else 0) + pendiente, nx=True, ex=_TTL_USO)
+            resultado = r.eval(_LUA_USO, 2, clave, _CLAVE_USO_PENDIENTE, limite)
+        return resultado >= 0
+    except Exception as e:
+        logger.warning(f"⚠️ Contador de uso en Redis no disponible, usando DB: {e}")
+        return None
+
+
 def registrar_consulta(user_id, course_id):
     """
-    Verifica y registra el uso mensual de consultas.
+    Verifica y registra el uso mensual de consultas en un solo paso atómico.
     Retorna True si el usuario puede consultar, False si superó el límite.
     """
-    from .db import db, UsoMensual
     from datetime import date
+    from shared.config import LIMITE_CONSULTAS_MENSUAL, USO_REDIS_HABILITADO
 
     mes_actual = date.today().replace(day=1)
 
-    uso = UsoMensual.query.filter_by(
-        user_id=user_id,
-        course_id=course_id,
-        mes=mes_actual
-    ).first()
+    if USO_REDIS_HABILITADO:
+        from shared.helpers.redis_cliente import obtener_redis
+        r = obtener_redis()
+        if r is not None:
+            permitido = _registrar_consulta_redis(r, user_id, course_id, mes_actual, LIMITE_CONSULTAS_MENSUAL)
+            if permitido is not None:
+                return permitido
 
-    LIMITE_CONSULTAS = 25  # Ajustable
+    total = incrementar_uso_db(user_id, course_id, mes_actual, limite=LIMITE_CONSULTAS_MENSUAL)
+    return total is not None
 
-    if uso and uso.total >= LIMITE_CONSULTAS:
-        return False
 
-    if not uso:
-        uso = UsoMensual(
-            user_id=user_id,
-            course_id=course_id,
-            mes=mes_actual,
-            total=0
-        )
-        db.session.add(uso)
+def sincronizar_uso_redis():
+    """
+    Write-behind: vuelca a la DB los incrementos acumulados en Redis.
+    Lo llama el worker en cada ciclo. Retorna cuántos contadores actualizó.
+    """
+    from shared.helpers.redis_cliente import obtener_redis
+
+    global _lotes_recuperados
+    r = obtener_redis()
+    if r is None:
+        return 0
+
+    aplicados = 0
+    try:
+        if not _lotes_recuperados:
+            aplicados += _recuperar_lotes_huerfanos(r)
+            _lotes_recuperados = True
+
+        # Renombrar primero: los incrementos nuevos van a un hash limpio
+        lote = f"{_CLAVE_USO_PENDIENTE}:{generar_ulid()}"
+        if r.eval(_LUA_TOMAR_LOTE, 3, _CLAVE_USO_PENDIENTE, lote, _CLAVE_USO_LOTES, time.time()):
+            aplicados += _aplicar_lote(r, lote)
+    except Exception as e:
+        logger.warning("⚠️ Redis no disponible para volcar el uso mensual: %s", e)
+    return aplicados
+
+
+def _recuperar_lotes_huerfanos(r):
+    """
+    Al arrancar: aplica los lotes que dejó un worker que murió entre el renombre
+    y el borrado. Los recientes pueden ser de otro worker vivo y no se tocan.
+    """
+    aplicados = 0
+    limite = time.time() - _EDAD_LOTE_HUERFANO
+    for lote in r.scan_iter(match=f"{_CLAVE_USO_PENDIENTE}:*"):
+        tomado = r.zscore(_CLAVE_USO_LOTES, lote)
+        if tomado is not None and tomado > limite:
+            continue
+        logger.warning("♻️ Aplicando lote de uso huérfano %s", lote)
+        aplicados += _aplicar_lote(r, lote)
+    return aplicados
+
+
+def _aplicar_lote(r, lote):
+    """Suma a la DB los deltas del lote; lo que falle vuelve a los pendientes."""
+    from datetime import date
+
+    deltas = list(r.hgetall(lote).items())
+    aplicados = 0
+    try:
+        for clave, delta in deltas:
+            _, mes, course_id, user_id = clave.split(":", 3)
+            incrementar_uso_db(user_id, course_id, date.fromisoformat(mes), cantidad=int(delta))
+            aplicados += 1
+    except Exception as e:
+        # Devolver lo no aplicado para el próximo ciclo
+        for clave, delta in deltas[aplicados:]:
+            r.hincrby(_CLAVE_USO_PENDIENTE, clave, int(delta))
+        logger.error(f"❌ Error volcando uso mensual a la DB: {e}")
+    finally:
+        pipe = r.pipeline()
+        pipe.delete(lote)
+        pipe.zrem(_CLAVE_USO_LOTES, lote)
+        pipe.execute()
+    return aplicados
 
-    uso.total += 1
-    db.session.commit()
-    return True
 
 def registrar_consulta_completa(user_id, course_id, user_full_name, course_name, pregunta, respuesta):
     """
@@ -128,9 +279,20 @@ def registrar_consulta_completa(user_id, course_id, user_full_name, course_name,
         )
         db.session.add(consulta)
         db.session.commit()
-        print(f"✅ Consulta registrada para usuario {user_id}")
+        logger.debug("✅ Consulta registrada para usuario %s", user_id)
         return consulta
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Error al registrar consulta: {e}")
-        raise
\ No newline at end of file
+        logger.error(f"❌ Error al registrar consulta: {e}")
+        raise
+
+def contar_consultas_en_curso():
+    """{estado: n} de las consultas que aún no terminan (usa el índice por estado)."""
+    from .db import HistorialConsulta
+    filas = db.session.query(HistorialConsulta.estado, db.func.count(HistorialConsulta.consulta_id)) \
+        .filter(HistorialConsulta.estado.in_(("pendiente", "procesando"))) \
+        .group_by(HistorialConsulta.estado) \
+        .all()
+    conteos = {"pendiente": 0, "procesando": 0}
+    conteos.update({estado: total for estado, total in filas})
+    return conteos
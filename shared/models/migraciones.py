@@ -0,0 +1,264 @@
+# shared/models/migraciones.py
+import datetime
+import logging
+from sqlalchemy import inspect, text
+from shared.models.db import db
+from shared.models.particiones import (
+    COLUMNA_FECHA,
+    TABLAS_PARTICIONADAS,
+    es_particionada,
+    crear_particion_mes,
+    inicio_mes,
+    sumar_meses
+)
+from shared.config import PARTICIONES_MESES_ADELANTE
+
+logger = logging.getLogger(__name__)
+
+TABLA_VERSIONES = "schema_migraciones"
+ID_BLOQUEO_MIGRACIONES = 4815162342  # pg_advisory_xact_lock: una sola migración a la vez
+
+
+# === Pasos reutilizables ===
+def _crear_tablas(conn):
+    """Crea las tablas de los modelos que aún no existan (no altera las existentes)."""
+    db.Model.metadata.create_all(bind=conn)
+
+
+def _agregar_columna(conn, tabla, columna, definicion):
+    """ALTER TABLE ... ADD COLUMN, solo si la columna no existe (SQLite no tiene IF NOT EXISTS)."""
+    columnas = {c["name"] for c in inspect(conn).get_columns(tabla)}
+    if columna not in columnas:
+        conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}"))
+        logger.info(f"➕ Columna {tabla}.{columna}")
+
+
+def _crear_indice(conn, nombre, tabla, columnas, where=None):
+    sql = f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({columnas})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute(text(sql))
+    logger.info(f"🗂️ Índice {nombre}")
+
+
+# === Migraciones (en orden; nunca editar una ya publicada, agregar una nueva) ===
+def _m001_esquema_base(conn):
+    _crear_tablas(conn)
+
+
+def _m002_columnas_hilos_y_render(conn):
+    # Rotación de hilos
+    _agregar_columna(conn, "hilos", "activo", "BOOLEAN NOT NULL DEFAULT TRUE")
+    _agregar_columna(conn, "hilos", "mensajes_total", "INTEGER NOT NULL DEFAULT 0")
+    _agregar_columna(conn, "hilos", "tokens_contexto", "INTEGER NOT NULL DEFAULT 0")
+    # HTML pre-renderizado por el worker
+    _agregar_columna(conn, "historial_consultas", "respuesta_html", "TEXT")
+    _agregar_columna(conn, "historial_consultas", "render_version", "INTEGER")
+
+
+def _m003_indices_consultas_frecuentes(conn):
+    # Polling del worker: solo las pendientes, ya ordenadas y con lo que necesita el despacho
+    _crear_indice(conn, "ix_historial_consultas_pendientes", "historial_consultas",
+                  "timestamp, consulta_id, user_id, course_id", where="estado = 'pendiente'")
+    _crear_indice(conn, "ix_historial_consultas_estado", "historial_consultas", "estado")
+    # Hilo vigente del estudiante y listados del panel
+    _crear_indice(conn, "ix_hilos_usuario_curso", "hilos", "user_id, course_id, activo, creado_en")
+    _crear_indice(conn, "ix_hilos_creado_en", "hilos", "creado_en, thread_id")
+    _crear_indice(conn, "ix_mensajes_thread_timestamp", "mensajes", "thread_id, timestamp")
+    _crear_indice(conn, "ix_mensajes_timestamp", "mensajes", "timestamp, mensaje_id")
+    # Sincronización con Canvas e índice de fuentes
+    _crear_indice(conn, "ix_archivos_procesados_curso", "archivos_procesados", "course_id")
+    _crear_indice(conn, "ix_archivos_procesados_nombre_curso", "archivos_procesados", "filename, course_id")
+    # Launch LTI y selección de asistentes
+    _crear_indice(conn, "ix_cursos_lti_deployment", "cursos", "lti_deployment_id")
+    _crear_indice(conn, "ix_asistentes_categoria_subtipo", "asistentes", "categoria, subtipo")
+
+
+# Claves foráneas que LIKE no copia a la tabla particionada
+_FKS_PARTICIONADAS = {
+    "historial_consultas": [("user_id", "usuarios(user_id)"), ("course_id", "cursos(course_id)")],
+    "mensajes": [("thread_id", "hilos(thread_id)")],
+}
+
+
+def _particionar_tabla(conn, tabla, columna_id):
+    """
+    Reemplaza `tabla` por una tabla particionada por mes (RANGE sobre timestamp)
+    con los mismos datos. La PK pasa a ser (id, timestamp): Postgres exige que
+    incluya la clave de partición.
+    """
+    if es_particionada(conn, tabla):
+        return
+    vieja = f"{tabla}_sin_particionar"
+    fecha = f'"{COLUMNA_FECHA}"'
+
+    conn.execute(text(f"UPDATE {tabla} SET {fecha} = now() WHERE {fecha} IS NULL"))
+    conn.execute(text(f"ALTER TABLE {tabla} RENAME TO {vieja}"))
+    conn.execute(text(
+        f"CREATE TABLE {tabla} (LIKE {vieja} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({fecha})"
+    ))
+    conn.execute(text(f"ALTER TABLE {tabla} ALTER COLUMN {fecha} SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {tabla} ADD CONSTRAINT pk_{tabla} PRIMARY KEY ({columna_id}, {fecha})"))
+    for columna, referencia in _FKS_PARTICIONADAS.get(tabla, []):
+        conn.execute(text(f"ALTER TABLE {tabla} ADD FOREIGN KEY ({columna}) REFERENCES {referencia}"))
+    conn.execute(text(f"CREATE TABLE {tabla}_default PARTITION OF {tabla} DEFAULT"))
+
+    # Un mes por partición, desde el dato más antiguo hasta unos meses adelante
+    mas_antiguo = conn.execute(text(f"SELECT MIN({fecha}) FROM {vieja}")).scalar()
+    mes = inicio_mes(mas_antiguo or datetime.date.today())
+    ultimo = sumar_meses(inicio_mes(datetime.date.today()), PARTICIONES_MESES_ADELANTE)
+    while mes <= ultimo:
+        crear_particion_mes(conn, tabla, mes)
+        mes = sumar_meses(mes, 1)
+
+    copiadas = conn.execute(text(f"INSERT INTO {tabla} SELECT * FROM {vieja}")).rowcount
+    conn.execute(text(f"DROP TABLE {vieja}"))
+    logger.info(f"🧩 {tabla} particionada por mes ({copiadas} filas)")
+
+
+def _m004_particionar_por_mes(conn):
+    # Solo Postgres; en SQLite la retención archiva y borra por rango de fechas
+    if conn.dialect.name != "postgresql":
+        return
+    for tabla, columna_id in TABLAS_PARTICIONADAS.items():
+        _particionar_tabla(conn, tabla, columna_id)
+    # Los índices de la 003 se fueron con las tablas viejas: se crean en las
+    # tablas particionadas (Postgres los propaga a cada partición)
+    _m003_indices_consultas_frecuentes(conn)
+
+
+def _m005_analitica(conn):
+    _agregar_columna(conn, "historial_consultas", "completado_en", "TIMESTAMP")
+    _crear_tablas(conn)  # resumen_uso_diario
+    _crear_indice(conn, "ix_resumen_uso_diario_curso_fecha", "resumen_uso_diario", "course_id, fecha")
+
+
+def _m006_tiempos_consulta(conn):
+    _crear_tablas(conn)  # tiempos_consulta
+    _crear_indice(conn, "ix_tiempos_consulta_curso_asistente", "tiempos_consulta",
+                  "course_id, asistente_id, creado_en")
+
+
+def _m007_traceparent_consultas(conn):
+    # En Postgres se propaga a todas las particiones
+    _agregar_columna(conn, "historial_consultas", "traceparent", "VARCHAR")
+
+
+def _m008_reclamo_consultas(conn):
+    # Permite devolver a la cola las consultas de un worker que murió
+    _agregar_columna(conn, "historial_consultas", "reclamada_en", "TIMESTAMP")
+    _agregar_columna(conn, "historial_consultas", "intentos", "INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRACIONES = [
+    (1, "esquema_base", _m001_esquema_base),
+    (2, "columnas_hilos_y_render", _m002_columnas_hilos_y_render),
+    (3, "indices_consultas_frecuentes", _m003_indices_consultas_frecuentes),
+    (4, "particionar_por_mes", _m004_particionar_por_mes),
+    (5, "analitica", _m005_analitica),
+    (6, "tiempos_consulta", _m006_tiempos_consulta),
+    (7, "traceparent_consultas", _m007_traceparent_consultas),
+    (8, "reclamo_consultas", _m008_reclamo_consultas),
+]
+
+
+def _versiones_aplicadas(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {TABLA_VERSIONES} ("
+        "version INTEGER PRIMARY KEY, "
+        "nombre VARCHAR NOT NULL, "
+        "aplicada_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    return {fila[0] for fila in conn.execute(text(f"SELECT version FROM {TABLA_VERSIONES}"))}
+
+
+def migrar(engine=None):
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción.
+    En Postgres un advisory lock evita que web y worker migren a la vez.
+    Retorna la lista de versiones aplicadas en esta llamada.
+    """
+    engine = engine or db.engine
+    aplicadas = []
+    for version, nombre, paso in MIGRACIONES:
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ID_BLOQUEO_MIGRACIONES})
+            if version in _versiones_aplicadas(conn):
+                continue
+            logger.info(f"🛠️ Migración {version:03d} {nombre}")
+            paso(conn)
+            conn.execute(
+                text(f"INSERT INTO {TABLA_VERSIONES} (version, nombre) VALUES (:version, :nombre)"),
+                {"version": version, "nombre": nombre}
+            )
+            aplicadas.append(version)
+
+    if aplicadas:
+        logger.info(f"✅ Migraciones aplicadas: {aplicadas}")
+    else:
+        logger.info("✅ Esquema al día")
+    return aplicadas
+
+
+# === Verificación con EXPLAIN ===
+# (nombre, tabla, SQL, parámetros de ejemplo) de las consultas más frecuentes
+CONSULTAS_FRECUENTES = [
+    ("polling del worker", "historial_consultas",
+     "SELECT consulta_id, user_id, course_id FROM historial_consultas "
+     "WHERE estado = 'pendiente' ORDER BY timestamp", {}),
+    ("hilo vigente", "hilos",
+     "SELECT thread_id FROM hilos WHERE user_id = :u AND course_id = :c AND activo = :a "
+     "ORDER BY creado_en DESC LIMIT 1", {"u": "u", "c": "c", "a": True}),
+    ("mensajes del hilo", "mensajes",
+     "SELECT pregunta, respuesta FROM mensajes WHERE thread_id = :t "
+     "ORDER BY timestamp DESC LIMIT 3", {"t": "t"}),
+    ("índice de fuentes", "archivos_procesados",
+     "SELECT canvas_file_id, file_id_openai FROM archivos_procesados WHERE course_id = :c", {"c": "c"}),
+    ("archivo por nombre", "archivos_procesados",
+     "SELECT canvas_file_id FROM archivos_procesados WHERE filename = :f AND course_id = :c", {"f": "f", "c": "c"}),
+    ("launch LTI", "cursos",
+     "SELECT course_id FROM cursos WHERE lti_deployment_id = :d", {"d": "d"}),
+    ("asistentes por tipo", "asistentes",
+     "SELECT asistente_id FROM asistentes WHERE categoria = :c AND subtipo = :s", {"c": "c", "s": "s"}),
+]
+
+
+def _plan(conn, sql, parametros):
+    if conn.dialect.name == "postgresql":
+        # Con tablas chicas el planner prefiere Seq Scan; se desactiva para ver si HAY índice utilizable
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        filas = conn.execute(text(f"EXPLAIN {sql}"), parametros)
+        return "\n".join(f[0] for f in filas)
+    filas = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), parametros)
+    return "\n".join(str(f[-1]) for f in filas)
+
+
+def _usa_indice(plan, tabla):
+    if "Seq Scan on " + tabla in plan:
+        return False
+    # SQLite: "SCAN tabla" sin índice = recorrido completo
+    for linea in plan.splitlines():
+        if linea.strip().startswith(("SCAN " + tabla, "SCAN TABLE " + tabla)) and "INDEX" not in linea:
+            return False
+    return True
+
+
+def verificar_indices(engine=None):
+    """
+    Corre EXPLAIN sobre cada consulta frecuente y reporta las que no usan índice.
+    Retorna la lista de (nombre, plan) que fallan (vacía si todo está bien).
+    """
+    engine = engine or db.engine
+    fallas = []
+    with engine.connect() as conn:
+        for nombre, tabla, sql, parametros in CONSULTAS_FRECUENTES:
+            with conn.begin():
+                plan = _plan(conn, sql, parametros)
+            if _usa_indice(plan, tabla):
+                logger.info(f"✅ {nombre}: usa índice")
+            else:
+                logger.warning(f"⚠️ {nombre}: recorrido completo de {tabla}\n{plan}")
+                fallas.append((nombre, plan))
+    return fallas
@@ -0,0 +1,59 @@
+# shared/models/particiones.py
+import datetime
+from sqlalchemy import text
+
+# Tablas particionadas por mes (Postgres) -> columna de ID
+TABLAS_PARTICIONADAS = {
+    "historial_consultas": "consulta_id",
+    "mensajes": "mensaje_id",
+}
+COLUMNA_FECHA = "timestamp"
+
+
+def inicio_mes(fecha):
+    return datetime.date(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(mes, n):
+    indice = mes.year * 12 + (mes.month - 1) + n
+    return datetime.date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(tabla, mes):
+    return f"{tabla}_{mes:%Y_%m}"
+
+
+def es_particionada(conn, tabla):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :tabla"
+    ), {"tabla": tabla}).first() is not None
+
+
+def crear_particion_mes(conn, tabla, mes):
+    """Crea (si no existe) la partición de `tabla` para el mes que empieza en `mes`."""
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {nombre_particion(tabla, mes)} PARTITION OF {tabla} "
+        f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{sumar_meses(mes, 1).isoformat()}')"
+    ))
+
+
+def listar_particiones_mensuales(conn, tabla):
+    """[(nombre, mes)] de las particiones mensuales de `tabla`, de la más antigua a la más nueva."""
+    filas = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :tabla"
+    ), {"tabla": tabla})
+    particiones = []
+    for (nombre,) in filas:
+        sufijo = nombre[len(tabla) + 1:]
+        try:
+            mes = datetime.datetime.strptime(sufijo, "%Y_%m").date()
+        except ValueError:
+            continue  # partición DEFAULT
+        particiones.append((nombre, mes))
+    return sorted(particiones, key=lambda p: p[1])
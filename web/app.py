@@ -1,13 +1,25 @@
 # web/app.py
-from flask import Flask
+from flask import Flask, Response
 from shared.models.db import db
 from shared.config import SECRET_KEY
 from web.routes.main_routes import main_bp
 from web.routes.lti_routes import lti_bp
 from web.routes.admin_routes import admin_bp
+from web.services.jwks_cache import precargar_claves
+from shared.helpers.metricas import generar_metricas, instrumentar_pool, registrar_gauge_calculado
+from shared.helpers.trazas import configurar_trazas, instrumentar_db
+from shared.helpers.registro import configurar_logging
+from shared.models.db_services import contar_consultas_en_curso
+from shared.models.migraciones import migrar
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 def create_app():
+    # ✅ 0. Logging estructurado (JSON, niveles por módulo)
+    configurar_logging("asistente-web")
+
     app = Flask(__name__)
     app.secret_key = SECRET_KEY
     app.config['SESSION_COOKIE_SECURE'] = True  # HTTPS
@@ -21,11 +33,42 @@ def create_app():
     # ✅ 2. Vincular db con la app
     db.init_app(app)  
 
+    # ✅ 2b. Migraciones pendientes: la web lee columnas nuevas (hilos, respuesta_html)
+    # y puede desplegarse antes que el worker
+    with app.app_context():
+        try:
+            migrar()
+        except Exception as e:
+            logger.error("❌ Error aplicando migraciones: %s", e)
+
     # ✅ 3. Registrar blueprints
     app.register_blueprint(main_bp)
     app.register_blueprint(lti_bp)
     app.register_blueprint(admin_bp)
 
+    # ✅ 4. Precargar claves de Canvas (JWKS) para el launch LTI
+    precargar_claves()
+
+    # ✅ 5. Métricas (Prometheus): pool de la DB, profundidad de la cola y /metrics
+    with app.app_context():
+        instrumentar_pool(db.engine)
+    registrar_gauge_calculado(
+        "asistente_consultas_en_curso",
+        "Consultas pendientes o procesando",
+        "estado",
+        contar_consultas_en_curso
+    )
+
+    @app.route("/metrics")
+    def metrics():
+        cuerpo, content_type = generar_metricas()
+        return Response(cuerpo, content_type=content_type)
+
+    # ✅ 6. Trazas (OpenTelemetry), si TRAZAS_EXPORTADOR está definido
+    configurar_trazas("asistente-web")
+    with app.app_context():
+        instrumentar_db(db.engine)
+
     return app
 
 app = create_app()
@@ -0,0 +1,42 @@
+# web/gunicorn.conf.py
+# Hooks de gunicorn para el modo multiproceso de prometheus_client:
+# sin ellos, los gauges "livesum" siguen sumando workers muertos.
+#
+# Hilos (gthread): cada stream SSE (/stream_consulta) ocupa un hilo hasta 3 min.
+# Con --threads 32 y SSE_MAX_STREAMS=24 quedan 8 hilos por worker para el
+# formulario, el polling y el launch LTI; el stream 25 recibe 503 y el navegador
+# pasa a polling. Si cambia --threads, ajustar SSE_MAX_STREAMS (por worker).
+import os
+import shutil
+
+
+def on_starting(server):
+    """Antes de crear los workers: vaciar los archivos de métricas de corridas anteriores."""
+    _revisar_hilos(server)
+    directorio = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not directorio:
+        return
+    if os.path.isdir(directorio):
+        shutil.rmtree(directorio)
+    os.makedirs(directorio, exist_ok=True)
+
+
+def _revisar_hilos(server):
+    """Avisa si los streams SSE pueden ocupar todos los hilos del worker."""
+    from shared.config import SSE_MAX_STREAMS
+    if server.cfg.worker_class_str == "gthread" and SSE_MAX_STREAMS >= server.cfg.threads:
+        server.log.warning(
+            "SSE_MAX_STREAMS=%s con --threads %s: los streams pueden bloquear el resto de las peticiones",
+            SSE_MAX_STREAMS, server.cfg.threads
+        )
+
+
+def child_exit(server, worker):
+    """Un worker terminó (reinicio, timeout): sus gauges dejan de contar."""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,11 +1,16 @@
 # web/routes/admin_routes.py
 from flask import Blueprint, render_template, request, jsonify, session
-from shared.models.db import db, Curso, Asistente, curso_asistente
+from shared.models.db import db, Curso, Asistente, Hilo, curso_asistente
 from shared.models.db_services import registrar_usuario
 import openai
 import logging
-from openai import OpenAI
-from shared.config import OPENAI_API_KEY
+from shared.helpers.openai_cliente import obtener_openai
+from web.services.metadatos_cache import invalidar_metadatos
+from web.services.dashboard_service import listar_hilos, listar_mensajes, obtener_mensaje, resumen_por_curso, resumen_tiempos
+from shared.helpers.archivo_historico import leer_archivo
+from web.services.reportes_service import reporte_curso
+from datetime import datetime, timezone
+from functools import wraps
 
 admin_bp = Blueprint('admin', __name__, url_prefix="/admin")
 
@@ -19,7 +24,7 @@ def config():
     asistentes = Asistente.query.all()
     return render_template("admin_config.html", cursos=cursos, asistentes=asistentes)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = obtener_openai()
 
 # === Crear Curso ===
 @admin_bp.route("/crear_curso", methods=["POST"])
@@ -45,6 +50,7 @@ def crear_curso():
     )
     db.session.add(nuevo)
     db.session.commit()
+    invalidar_metadatos()
     return jsonify({"status": "ok", "mensaje": "Curso creado"})
 
 # === Crear Asistente (tipo predefinido) ===
@@ -113,6 +119,7 @@ def crear_asistente():
     )
     db.session.execute(stmt)
     db.session.commit()
+    invalidar_metadatos()
 
     return jsonify({"status": "ok", "id": asistente.id})
 
@@ -125,6 +132,7 @@ def actualizar_curso():
         return jsonify({"error": "Curso no encontrado"}), 400
     curso.vector_store_id = data["vector_store_id"]
     db.session.commit()
+    invalidar_metadatos()
     return jsonify({"status": "ok"})
 
 # === Actualizar Asistente ===
@@ -146,4 +154,142 @@ def actualizar_asistente():
         return jsonify({"error": f"Error en OpenAI: {str(e)}"}), 500
 
     db.session.commit()
-    return jsonify({"status": "ok"})
\ No newline at end of file
+    invalidar_metadatos()
+    return jsonify({"status": "ok"})
+
+# === Panel: acceso ===
+ROLES_PANEL = ("instructor", "administrador")
+
+def solo_docentes(vista):
+    """
+    El panel (/admin/api/*) es solo para instructores y administradores del
+    curso del launch LTI (rol en la sesión); cada uno ve solo su curso.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        if not session.get("user_id") or not session.get("course_id") or session.get("rol") not in ROLES_PANEL:
+            return "Acceso denegado", 403
+        return vista(*args, **kwargs)
+    return envoltura
+
+# === Panel: consultas paginadas (keyset) ===
+def _filtros():
+    """
+    Filtros comunes de los listados: user_id, desde/hasta (ISO 8601).
+    course_id es siempre el de la sesión.
+    """
+    filtros = {
+        "course_id": session["course_id"],
+        "user_id": request.args.get("user_id"),
+        "cursor": request.args.get("cursor"),
+        "limite": request.args.get("limite")
+    }
+    for campo in ("desde", "hasta"):
+        valor = datetime.fromisoformat(request.args[campo]) if request.args.get(campo) else None
+        if valor and valor.tzinfo:
+            # La DB y el archivo guardan UTC sin zona: "2025-03-01T00:00:00-03:00" se compara en UTC
+            valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+        filtros[campo] = valor
+    return filtros
+
+@admin_bp.route("/api/resumen")
+@solo_docentes
+def api_resumen():
+    try:
+        filtros = _filtros()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"cursos": resumen_por_curso(filtros["desde"], filtros["hasta"], filtros["course_id"])})
+
+@admin_bp.route("/api/tiempos")
+@solo_docentes
+def api_tiempos():
+    try:
+        filtros = _filtros()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"tiempos": resumen_tiempos(
+        course_id=filtros["course_id"],
+        asistente_id=request.args.get("asistente_id"),
+        desde=filtros["desde"],
+        hasta=filtros["hasta"]
+    )})
+
+@admin_bp.route("/api/hilos")
+@solo_docentes
+def api_hilos():
+    try:
+        return jsonify(listar_hilos(**_filtros()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@admin_bp.route("/api/mensajes")
+@solo_docentes
+def api_mensajes():
+    try:
+        return jsonify(listar_mensajes(thread_id=request.args.get("thread_id"), **_filtros()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@admin_bp.route("/api/mensajes/<mensaje_id>")
+@solo_docentes
+def api_mensaje(mensaje_id):
+    mensaje = obtener_mensaje(mensaje_id, course_id=session["course_id"])
+    if not mensaje:
+        return jsonify({"error": "Mensaje no encontrado"}), 404
+    return jsonify(mensaje)
+
+# === Panel: lectura del archivo histórico (Parquet) ===
+_COLUMNAS_ARCHIVO = {
+    "historial_consultas": ["consulta_id", "user_id", "course_id", "thread_id", "asistente_id",
+                            "tipo", "estado", "timestamp", "pregunta", "respuesta"],
+    "mensajes": ["mensaje_id", "thread_id", "pregunta", "respuesta", "fuentes", "timestamp"],
+}
+
+@admin_bp.route("/api/archivo/<tabla>")
+@solo_docentes
+def api_archivo(tabla):
+    columnas = _COLUMNAS_ARCHIVO.get(tabla)
+    if not columnas:
+        return jsonify({"error": "Tabla no archivada"}), 404
+    try:
+        filtros = _filtros()
+        limite = min(int(filtros["limite"] or 200), 1000)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Igualdad sobre columnas de la tabla (p. ej. user_id, thread_id)
+    igualdad = {
+        c: request.args[c] for c in ("user_id", "thread_id")
+        if c in columnas and request.args.get(c)
+    }
+    if "course_id" in columnas:
+        igualdad["course_id"] = filtros["course_id"]
+    else:
+        # Sin course_id en el archivo (mensajes): solo por hilo, y el hilo debe ser del curso
+        hilo = db.session.get(Hilo, igualdad.get("thread_id") or "")
+        if hilo is None or hilo.course_id != filtros["course_id"]:
+            return jsonify({"error": "Indica un thread_id de tu curso"}), 400
+    filas = leer_archivo(
+        tabla,
+        desde=filtros["desde"],
+        hasta=filtros["hasta"],
+        filtros=igualdad,
+        columnas=columnas,
+        limite=limite
+    )
+    return jsonify({tabla: filas})
+
+# === Panel: reporte de uso por curso (desde los agregados diarios) ===
+@admin_bp.route("/api/reporte/<course_id>")
+@solo_docentes
+def api_reporte(course_id):
+    if course_id != session["course_id"]:
+        return "Acceso denegado", 403
+    try:
+        filtros = _filtros()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    desde = filtros["desde"].date() if filtros["desde"] else None
+    hasta = filtros["hasta"].date() if filtros["hasta"] else None
+    return jsonify(reporte_curso(course_id, desde, hasta))
@@ -1,7 +1,6 @@
 # web/routes/lti_routes.py
 from flask import Blueprint, request, session, redirect, current_app, jsonify
 import jwt
-import requests
 import json
 import logging
 import secrets
@@ -11,16 +10,15 @@ from datetime import datetime
 from urllib.parse import urlencode
 from shared.config import (
     CANVAS_ISSUER,
-    CANVAS_JWKS_URL,
     CANVAS_CLIENT_ID,
     CANVAS_LOGIN_URL,
     SECRET_KEY
 )
 from shared.models.db import db, Usuario, Curso
+from web.services.jwks_cache import obtener_clave
+from web.services.metadatos_cache import obtener_curso_por_deployment, usuario_conocido, marcar_usuario_conocido
 import os
 
-# === Configurar logging ===
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # === Blueprint ===
@@ -29,6 +27,33 @@ lti_bp = Blueprint('lti', __name__, url_prefix="/lti")
 # === Claim URLs ===
 CLAIM_CONTEXT = "https://purl.imsglobal.org/spec/lti/claim/context"
 CLAIM_DEPLOYMENT_ID = "https://purl.imsglobal.org/spec/lti/claim/deployment_id"
+CLAIM_ROLES = "https://purl.imsglobal.org/spec/lti/claim/roles"
+
+# === Roles LIS v2 (solo los del curso y los de administración) ===
+ROL_LIS = "http://purl.imsglobal.org/vocab/lis/v2/"
+ROLES_ADMINISTRADOR = {
+    ROL_LIS + "membership#Administrator",
+    ROL_LIS + "institution/person#Administrator",
+    ROL_LIS + "system/person#Administrator",
+}
+ROLES_INSTRUCTOR = {
+    ROL_LIS + "membership#Instructor",
+    ROL_LIS + "membership#ContentDeveloper",
+}
+
+
+def rol_desde_lti(roles):
+    """
+    Rol de la app según el claim de roles del launch: 'administrador', 'instructor'
+    (incluye ayudantes, membership/Instructor#...) o 'estudiante'. Los roles
+    institucionales de instructor no cuentan: no dicen nada de este curso.
+    """
+    roles = set(roles or [])
+    if roles & ROLES_ADMINISTRADOR:
+        return "administrador"
+    if roles & ROLES_INSTRUCTOR or any(r.startswith(ROL_LIS + "membership/Instructor#") for r in roles):
+        return "instructor"
+    return "estudiante"
 
 
 # === JWKS Endpoint (para Canvas) ===
@@ -126,27 +151,13 @@ def launch():
         # Decodificar header para obtener kid
         unverified_header = jwt.get_unverified_header(id_token)
 
-        # Obtener JWKS de Canvas
-        jwks_response = requests.get(CANVAS_JWKS_URL)
-        jwks_response.raise_for_status()
-        jwks = jwks_response.json()
-
-        #logger.info(f"🔍 [JWKS] Claves disponibles: {[key['kid'] for key in jwks['keys']]}")
-        #logger.info(f"🔍 [JWKS] kid del token: {unverified_header['kid']}")
-
-        # Buscar la clave con el kid
-        jwk = None
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                jwk = key
-                break
-
+        # Clave pública de Canvas (caché JWKS; solo va a la red si el kid es nuevo)
+        jwk = obtener_clave(unverified_header.get("kid"))
         if not jwk:
-            logger.warning(f"❌ Clave no encontrada para kid: {unverified_header['kid']}")
+            logger.warning(f"❌ Clave no encontrada para kid: {unverified_header.get('kid')}")
             return "Clave no encontrada", 400
 
-        # Crear la clave pública
-        public_key = jwt.PyJWK(jwk).key
+        public_key = jwk.key
 
         #unverified = jwt.decode(id_token, options={"verify_signature": False})
         #logger.info(f"🔍 Issuer real en token: '{unverified.get('iss')}'")
@@ -185,8 +196,8 @@ def launch():
             logger.warning("❌ No se encontró deployment_id")
             return "No se encontró deployment_id", 400
 
-        # Buscar curso por deployment_id
-        curso = Curso.query.filter_by(lti_deployment_id=deployment_id).first()
+        # Buscar curso por deployment_id (caché de metadatos)
+        curso = obtener_curso_por_deployment(deployment_id)
         if not curso:
             logger.warning(f"❌ deployment_id no registrado: {deployment_id}")
             return "⚠️ Este curso no está configurado aún.", 400
@@ -201,17 +212,20 @@ def launch():
         context = decoded.get(CLAIM_CONTEXT, {})
         course_name = context.get("title", "Curso desconocido")
 
+        # Rol en este curso (define el acceso al panel /admin/api)
+        rol = rol_desde_lti(decoded.get(CLAIM_ROLES))
+
         # ✅ Registrar usuario si no existe
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
+        if not usuario_conocido(user_id):
             usuario = Usuario(
                 user_id=user_id,
                 nombre=user_full_name,
                 email=decoded.get('email'),
-                rol="estudiante"
+                rol=rol
             )
             db.session.add(usuario)
             db.session.commit()
+            marcar_usuario_conocido(user_id)
             logger.info(f"✅ Usuario registrado: {user_id}")
 
         # Guardar en sesión
@@ -219,6 +233,7 @@ def launch():
         session['course_id'] = curso.course_id
         session['course_name'] = course_name
         session['user_full_name'] = user_full_name
+        session['rol'] = rol
 
         logger.info(f"✅ Autenticación exitosa: {user_full_name} → {course_name}")
 
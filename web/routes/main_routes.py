@@ -1,13 +1,33 @@
 # web/routes/main_routes.py
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 from shared.models.db import db, HistorialConsulta, Hilo, Mensaje, Curso, Asistente, ArchivoProcesado
 from shared.models.db_services import registrar_usuario, registrar_consulta
 from markdown import markdown as md
-from shared.helpers.helpers import extraer_fuentes, generar_respuesta_formateada
+from shared.helpers.helpers import extraer_fuentes, generar_respuesta_formateada, generar_id, RENDER_VERSION
+from shared.helpers.eventos_consulta import suscribir, leer_evento
+from shared.helpers.cache import CacheLRU
+from shared.helpers.trazas import tramo, traceparent_actual
+from web.services.metadatos_cache import obtener_asistentes_curso, usuario_conocido, marcar_usuario_conocido
+from web.services.dashboard_service import resumen_por_curso, listar_hilos
+from shared.config import SSE_MAX_STREAMS
+import json
+import logging
+import threading
 import time
 
+logger = logging.getLogger(__name__)
+
 main_bp = Blueprint('main', __name__)
 
+SSE_DURACION_MAX = 180         # segundos, igual que el timeout del polling
+SSE_INTERVALO_REVISION = 5     # segundos entre revisiones de la DB
+# Streams abiertos a la vez: deben quedar hilos libres para el resto de las peticiones
+_cupos_sse = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+ESTADOS_TERMINALES = ("completado", "error")
+# consulta_id -> (etag, payload) de consultas terminadas (no cambian más)
+_cache_terminales = CacheLRU(max_items=2000)
+
 @main_bp.route("/", methods=["GET", "POST"])
 def index():
     respuesta_formateada = None
@@ -18,19 +38,11 @@ def index():
         respuesta_formateada = "⚠️ Esta aplicación debe usarse desde Canvas."
         return render_template("index.html", respuesta_index=md(respuesta_formateada))
 
-    # Obtener curso y asistentes
+    # Obtener asistentes del curso (caché de metadatos, sin DB en el caso común)
     try:
-        curso = Curso.query.get(course_id)
-        asistentes = []
-        if curso:
-            # Obtener asistentes asociados al curso
-            from shared.models.db import curso_asistente
-            asistentes = db.session.query(Asistente) \
-                .join(curso_asistente) \
-                .filter(curso_asistente.c.course_id == course_id) \
-                .all()
+        asistentes = obtener_asistentes_curso(course_id)
     except Exception as e:
-        print(f"❌ Error cargando asistentes: {e}")
+        logger.error(f"❌ Error cargando asistentes: {e}")
         asistentes = []
 
     consulta_id = None  # Inicializar
@@ -39,34 +51,39 @@ def index():
         if not user_id or not course_id:
             respuesta_formateada = "⚠️ No se pudo identificar al usuario o curso."
         else:
-            # Registrar usuario
-            registrar_usuario(user_id, session.get("user_full_name", "Estudiante"))
+            pregunta = request.form.get("pregunta", "").strip()
+            asistente_id_seleccionado = request.form.get("asistente_id")
 
-            # Verificar límite mensual
-            if not registrar_consulta(user_id, course_id):
-                respuesta_formateada = "🚫 Has alcanzado el límite mensual de consultas."
+            if not pregunta:
+                respuesta_formateada = "⚠️ La pregunta no puede estar vacía."
+            elif not asistente_id_seleccionado:
+                respuesta_formateada = "⚠️ Debes seleccionar un asistente."
             else:
-                pregunta = request.form.get("pregunta", "").strip()
-                asistente_id_seleccionado = request.form.get("asistente_id")
+                # Registrar usuario (solo si no lo conocemos)
+                if not usuario_conocido(user_id):
+                    registrar_usuario(user_id, session.get("user_full_name", "Estudiante"))
+                    marcar_usuario_conocido(user_id)
 
-                if not pregunta:
-                    respuesta_formateada = "⚠️ La pregunta no puede estar vacía."
-                elif not asistente_id_seleccionado:
-                    respuesta_formateada = "⚠️ Debes seleccionar un asistente."
+                # Verificar y contar el límite mensual (una sola operación atómica)
+                if not registrar_consulta(user_id, course_id):
+                    respuesta_formateada = "🚫 Has alcanzado el límite mensual de consultas."
                 else:
                     # Generar ID único
-                    consulta_id = f"consulta_{int(time.time())}"
-                    nueva_consulta = HistorialConsulta(
-                        consulta_id=consulta_id,
-                        user_id=user_id,
-                        course_id=course_id,
-                        pregunta=pregunta,
-                        asistente_id=asistente_id_seleccionado,
-                        tipo="general",
-                        estado="pendiente"
-                    )
-                    db.session.add(nueva_consulta)
-                    db.session.commit()
+                    consulta_id = generar_id("consulta")
+                    # La traza nace aquí; el worker la continúa con el traceparent guardado
+                    with tramo("consulta.enviar", consulta_id=consulta_id, course_id=course_id):
+                        nueva_consulta = HistorialConsulta(
+                            consulta_id=consulta_id,
+                            user_id=user_id,
+                            course_id=course_id,
+                            pregunta=pregunta,
+                            asistente_id=asistente_id_seleccionado,
+                            tipo="general",
+                            estado="pendiente",
+                            traceparent=traceparent_actual()
+                        )
+                        db.session.add(nueva_consulta)
+                        db.session.commit()
                     user_name = session.get('user_full_name', 'Estudiante')
                     respuesta_formateada = f"""
                         <p><strong>🔍 Analizando tu pregunta, {user_name}</strong> <span class="loader"></span></p>
@@ -79,11 +96,8 @@ def index():
                         <p>Este proceso puede tardar un poco. ¡Gracias por tu paciencia!</p>
                         """
 
-    print(f"📤 [DEBUG] Renderizando index.html con:")
-    print(f"   - respuesta_index: {respuesta_formateada}")
-    print(f"   - consulta_id: {consulta_id}")
-    print(f"   - user_id: {user_id}")
-    print(f"   - course_id: {course_id}")
+    logger.debug("📤 Renderizando index.html: consulta_id=%s user_id=%s course_id=%s",
+                 consulta_id, user_id, course_id)
 
     return render_template(
         "index.html",
@@ -100,25 +114,165 @@ def index():
 def estado_consulta(consulta_id):
     """
     Endpoint para que el frontend verifique si ya hay respuesta.
-    Usado por el polling en index.html.
+    Usado por el polling en index.html (respaldo del streaming SSE).
+    Un estado terminal no cambia más: se responde con ETag, caché larga
+    y 304 sin tocar la DB; mientras está pendiente solo se envía el estado.
     """
-    print(f"🔍 [DEBUG] Consultando estado de: {consulta_id}")
+    # ✅ El cliente ya tiene la respuesta final: es inmutable
+    # (is_strong compara ETags concretos; contains() acepta "*" para cualquier estado)
+    for estado in ESTADOS_TERMINALES:
+        if request.if_none_match.is_strong(_etag_consulta(consulta_id, estado)):
+            return _respuesta_estado(None, _etag_consulta(consulta_id, estado), terminal=True)
+
+    cacheado = _cache_terminales.get(consulta_id)
+    if cacheado is not None:
+        etag, payload = cacheado
+        return _respuesta_estado(payload, etag, terminal=True)
+
     consulta = HistorialConsulta.query.get(consulta_id)
     if not consulta:
         return jsonify({"error": "Consulta no encontrada"}), 404
 
-    print(f"✅ [DEBUG] Estado: {consulta.estado}, respuesta_len={len(consulta.respuesta) if consulta.respuesta else 0}")
-    return jsonify({
+    etag = _etag_consulta(consulta_id, consulta.estado)
+    if consulta.estado not in ESTADOS_TERMINALES:
+        return _respuesta_estado({"estado": consulta.estado}, etag, terminal=False)
+
+    payload = {
         "estado": consulta.estado,
         "respuesta": consulta.respuesta,
+        "respuesta_html": _html_vigente(consulta),
         "thread_id": consulta.thread_id
-    })
+    }
+    _cache_terminales.set(consulta_id, (etag, payload))
+    return _respuesta_estado(payload, etag, terminal=True)
+
+
+def _etag_consulta(consulta_id, estado):
+    """ETag de la consulta: id + estado + versión del HTML pre-renderizado."""
+    return f"{consulta_id}-{estado}-r{RENDER_VERSION}"
+
+
+def _respuesta_estado(payload, etag, terminal):
+    """Respuesta JSON con ETag; devuelve 304 si el cliente ya la tiene."""
+    if payload is None:
+        resp = Response(status=304)
+    else:
+        resp = jsonify(payload)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = (
+        "private, max-age=31536000, immutable" if terminal else "private, no-cache"
+    )
+    if request.if_none_match.star_tag:
+        return resp  # "*" no identifica ningún estado: siempre la respuesta completa
+    return resp.make_conditional(request)
+
+
+def _html_vigente(consulta):
+    """HTML pre-renderizado por el worker, si corresponde al formato actual."""
+    if consulta.respuesta_html and consulta.render_version == RENDER_VERSION:
+        return consulta.respuesta_html
+    return None
+
+
+def _payload_final(consulta):
+    """Datos del evento `final` si la consulta ya terminó; si no, None."""
+    if consulta and consulta.estado in ESTADOS_TERMINALES:
+        return {
+            "estado": consulta.estado,
+            "respuesta": consulta.respuesta,
+            "respuesta_html": _html_vigente(consulta)
+        }
+    return None
+
+
+def _evento_sse(evento, datos):
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(datos)}\n\n"
+
+
+@main_bp.route("/stream_consulta/<consulta_id>")
+def stream_consulta(consulta_id):
+    """
+    Envía la respuesta al navegador como Server-Sent Events:
+    un evento `parcial` con lo generado hasta ahora, `delta` por cada
+    fragmento nuevo y `final` con el estado terminal.
+    Sin Redis, revisa la DB cada pocos segundos y solo envía el `final`.
+    Con SSE_MAX_STREAMS abiertos responde 503 y el navegador pasa a polling.
+    """
+    consulta = HistorialConsulta.query.get(consulta_id)
+    if not consulta:
+        return jsonify({"error": "Consulta no encontrada"}), 404
+
+    final_inicial = _payload_final(consulta)
+    # ✅ Liberar la conexión: el stream puede durar minutos
+    db.session.remove()
+
+    # Una consulta ya terminada se responde de inmediato: no ocupa cupo
+    if not final_inicial and not _cupos_sse.acquire(blocking=False):
+        logger.warning("📡 %s streams abiertos, %s usará polling", SSE_MAX_STREAMS, consulta_id)
+        return jsonify({"error": "Demasiados streams abiertos, usa /estado_consulta"}), 503
+
+    def estado_terminal():
+        final = _payload_final(HistorialConsulta.query.get(consulta_id))
+        db.session.remove()
+        return final
+
+    def generar():
+        if final_inicial:
+            yield _evento_sse("final", final_inicial)
+            return
+
+        pubsub, parcial = suscribir(consulta_id)
+        try:
+            if parcial:
+                yield _evento_sse("parcial", {"texto": parcial})
+
+            inicio = time.monotonic()
+            ultima_revision = inicio
+            while time.monotonic() - inicio < SSE_DURACION_MAX:
+                evento = leer_evento(pubsub) if pubsub else None
+                if pubsub is None:
+                    time.sleep(1)
+
+                if evento and evento.get("tipo") == "delta":
+                    yield _evento_sse("delta", {"texto": evento["texto"], "offset": evento["offset"]})
+                    continue
+                if evento and evento.get("tipo") == "final":
+                    yield _evento_sse("final", {
+                        "estado": evento["estado"],
+                        "respuesta": evento["respuesta"],
+                        "respuesta_html": evento.get("respuesta_html")
+                    })
+                    return
+
+                # Respaldo por si el final se publicó antes de suscribirse
+                if time.monotonic() - ultima_revision >= SSE_INTERVALO_REVISION:
+                    ultima_revision = time.monotonic()
+                    final = estado_terminal()
+                    if final:
+                        yield _evento_sse("final", final)
+                        return
+                    yield ": keepalive\n\n"
+
+            yield _evento_sse("timeout", {})
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+    resp = Response(
+        stream_with_context(generar()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    if not final_inicial:
+        # Al cerrar la respuesta (fin, timeout o desconexión), aunque el generador no haya empezado
+        resp.call_on_close(_cupos_sse.release)
+    return resp
 
 
 @main_bp.route("/debug/consulta/<consulta_id>")
 def debug_consulta(consulta_id):
     """Endpoint de depuración para ver el estado completo de una consulta."""
-    print(f"🔍 [DEBUG] Consultando estado de: {consulta_id}")  # 🔥 Añadir este print
     consulta = HistorialConsulta.query.get(consulta_id)
     if not consulta:
         return jsonify({"error": "No encontrada"}), 404
@@ -126,7 +280,7 @@ def debug_consulta(consulta_id):
     hilo = Hilo.query.get(consulta.thread_id) if consulta.thread_id else None
     mensajes = Mensaje.query.filter_by(thread_id=consulta.thread_id).all() if consulta.thread_id else []
 
-    print(f"✅ [DEBUG] Estado actual: {consulta.estado}, respuesta_len={len(consulta.respuesta) if consulta.respuesta else 0}")
+    logger.debug("🔍 Depuración de %s: estado=%s", consulta_id, consulta.estado)
     return jsonify({
         "consulta": {
             "id": consulta.consulta_id,
@@ -151,40 +305,24 @@ def debug_consulta(consulta_id):
 def admin():
     """Panel de administración para ver historial y archivos."""
     try:
-        # Obtener todos los cursos
-        cursos_completos = Curso.query.all()
-        if not cursos_completos:
+        # Verificar que haya cursos
+        if not db.session.query(Curso.course_id).first():
             return render_template("admin.html", error="⚠️ No hay cursos registrados.", cursos=[], registros=[], historial=[], consultas=[], archivos_por_curso={})
 
-        # Obtener registros de archivos procesados
-        registros_db = ArchivoProcesado.query.all()
-
         # Obtener historial de consultas
         historial = HistorialConsulta.query \
             .order_by(HistorialConsulta.timestamp.desc()) \
             .limit(50).all()
 
-        # Agrupar mensajes por hilo
-        hilos_data = {}
-        for h in Hilo.query.all():
-            hilos_data[h.thread_id] = {
-                "user_id": h.user_id,
-                "course_id": h.course_id,
-                "mensajes": []
-            }
-
-        for msg in Mensaje.query.order_by(Mensaje.timestamp).all():
-            if msg.thread_id in hilos_data:
-                hilos_data[msg.thread_id]["mensajes"].append({
-                    "pregunta": msg.pregunta,
-                    "respuesta": msg.respuesta,
-                    "timestamp": msg.timestamp
-                })
-
-        return render_template("admin.html", historial=historial, hilos=hilos_data)
+        # Conteos por curso (agregados en SQL) y primera página de hilos;
+        # los mensajes se piden por página desde /admin/api/mensajes
+        resumen = resumen_por_curso()
+        hilos = listar_hilos()
+
+        return render_template("admin.html", historial=historial, resumen=resumen, hilos=hilos["hilos"], siguiente=hilos["siguiente"])
 
     except Exception as e:
-        print(f"❌ Error en /admin: {e}")
+        logger.error(f"❌ Error en /admin: {e}")
         return render_template("admin.html", error="❌ Error al cargar el panel de administración.", cursos=[], registros=[], historial=[], consultas=[], archivos_por_curso={})
 
 @main_bp.route("/reportar_feedback", methods=["POST"])
@@ -207,5 +345,5 @@ def test_local():
     session["course_id"] = "91340000000002198"
     session["user_full_name"] = "Usuario de Prueba"
     session["course_name"] = "Introduccion a Negocios y Ciencia de Datos"
-    print("🔑 Sesión iniciada localmente con usuario de prueba.")
+    logger.info("🔑 Sesión iniciada localmente con usuario de prueba.")
     return redirect("/")
\ No newline at end of file
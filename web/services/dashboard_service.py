@@ -0,0 +1,281 @@
+# web/services/dashboard_service.py
+import base64
+import datetime
+import json
+from sqlalchemy import func, and_, or_
+from shared.models.db import db, Curso, Hilo, Mensaje, HistorialConsulta, TiempoConsulta
+
+TAMANO_PAGINA = 50
+TAMANO_PAGINA_MAX = 200
+LARGO_VISTA_PREVIA = 160  # caracteres de pregunta/respuesta en los listados
+
+
+# === Cursores (keyset) ===
+def codificar_cursor(fecha, id_):
+    """Cursor opaco a partir de la última fila de una página: (fecha, id)."""
+    crudo = json.dumps([fecha.isoformat() if fecha else None, id_])
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor):
+    """Inverso de codificar_cursor; lanza ValueError si el cursor no es válido."""
+    try:
+        fecha, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.datetime.fromisoformat(fecha) if fecha else None), id_
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def _limite(limite):
+    try:
+        limite = int(limite or TAMANO_PAGINA)
+    except (TypeError, ValueError):
+        limite = TAMANO_PAGINA
+    return max(1, min(limite, TAMANO_PAGINA_MAX))
+
+
+def _despues_de(columna_fecha, columna_id, cursor):
+    """Filas estrictamente posteriores al cursor en orden (fecha DESC, id DESC)."""
+    fecha, id_ = decodificar_cursor(cursor)
+    return or_(
+        columna_fecha < fecha,
+        and_(columna_fecha == fecha, columna_id < id_)
+    )
+
+
+def _paginar(consulta, columna_fecha, columna_id, cursor, limite):
+    """
+    Aplica orden y cursor, y pide una fila extra para saber si hay más.
+    Retorna (filas, siguiente_cursor).
+    """
+    limite = _limite(limite)
+    if cursor:
+        consulta = consulta.filter(_despues_de(columna_fecha, columna_id, cursor))
+    filas = consulta.order_by(columna_fecha.desc(), columna_id.desc()).limit(limite + 1).all()
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(getattr(ultima, columna_fecha.key), getattr(ultima, columna_id.key))
+    return filas, siguiente
+
+
+def _vista_previa(columna):
+    return func.substr(columna, 1, LARGO_VISTA_PREVIA)
+
+
+# === Listados ===
+def listar_hilos(course_id=None, user_id=None, desde=None, hasta=None, cursor=None, limite=None):
+    """Página de hilos, del más reciente al más antiguo."""
+    consulta = db.session.query(
+        Hilo.thread_id,
+        Hilo.user_id,
+        Hilo.course_id,
+        Hilo.asistente_id,
+        Hilo.creado_en,
+        Hilo.activo,
+        Hilo.mensajes_total
+    )
+    if course_id:
+        consulta = consulta.filter(Hilo.course_id == course_id)
+    if user_id:
+        consulta = consulta.filter(Hilo.user_id == user_id)
+    if desde:
+        consulta = consulta.filter(Hilo.creado_en >= desde)
+    if hasta:
+        consulta = consulta.filter(Hilo.creado_en < hasta)
+
+    filas, siguiente = _paginar(consulta, Hilo.creado_en, Hilo.thread_id, cursor, limite)
+    return {
+        "hilos": [
+            {
+                "thread_id": h.thread_id,
+                "user_id": h.user_id,
+                "course_id": h.course_id,
+                "asistente_id": h.asistente_id,
+                "creado_en": h.creado_en,
+                "activo": h.activo,
+                "mensajes_total": h.mensajes_total
+            }
+            for h in filas
+        ],
+        "siguiente": siguiente
+    }
+
+
+def listar_mensajes(thread_id=None, course_id=None, user_id=None, desde=None, hasta=None, cursor=None, limite=None):
+    """
+    Página de mensajes, del más reciente al más antiguo.
+    Solo trae una vista previa del texto; el cuerpo completo se pide con obtener_mensaje.
+    """
+    consulta = db.session.query(
+        Mensaje.mensaje_id,
+        Mensaje.thread_id,
+        Mensaje.timestamp,
+        _vista_previa(Mensaje.pregunta).label("pregunta"),
+        _vista_previa(Mensaje.respuesta).label("respuesta")
+    )
+    if course_id or user_id:
+        consulta = consulta.join(Hilo, Hilo.thread_id == Mensaje.thread_id)
+        if course_id:
+            consulta = consulta.filter(Hilo.course_id == course_id)
+        if user_id:
+            consulta = consulta.filter(Hilo.user_id == user_id)
+    if thread_id:
+        consulta = consulta.filter(Mensaje.thread_id == thread_id)
+    if desde:
+        consulta = consulta.filter(Mensaje.timestamp >= desde)
+    if hasta:
+        consulta = consulta.filter(Mensaje.timestamp < hasta)
+
+    filas, siguiente = _paginar(consulta, Mensaje.timestamp, Mensaje.mensaje_id, cursor, limite)
+    return {
+        "mensajes": [
+            {
+                "mensaje_id": m.mensaje_id,
+                "thread_id": m.thread_id,
+                "timestamp": m.timestamp,
+                "pregunta": m.pregunta,
+                "respuesta": m.respuesta
+            }
+            for m in filas
+        ],
+        "siguiente": siguiente
+    }
+
+
+def obtener_mensaje(mensaje_id, course_id=None):
+    """Mensaje completo (pregunta, respuesta y fuentes) o None (también si es de otro curso)."""
+    m = Mensaje.query.get(mensaje_id)
+    if not m:
+        return None
+    if course_id:
+        hilo = db.session.get(Hilo, m.thread_id)
+        if hilo is None or hilo.course_id != course_id:
+            return None
+    return {
+        "mensaje_id": m.mensaje_id,
+        "thread_id": m.thread_id,
+        "timestamp": m.timestamp,
+        "pregunta": m.pregunta,
+        "respuesta": m.respuesta,
+        "fuentes": m.fuentes or []
+    }
+
+
+# === Agregados ===
+def resumen_por_curso(desde=None, hasta=None, course_id=None):
+    """
+    Conteos por curso calculados en SQL (GROUP BY): hilos, estudiantes,
+    mensajes, última actividad y consultas por estado.
+    Con `course_id`, solo ese curso.
+    """
+    hilos = db.session.query(
+        Hilo.course_id,
+        func.count(Hilo.thread_id).label("hilos"),
+        func.count(func.distinct(Hilo.user_id)).label("estudiantes")
+    )
+    mensajes = db.session.query(
+        Hilo.course_id,
+        func.count(Mensaje.mensaje_id).label("mensajes"),
+        func.max(Mensaje.timestamp).label("ultima_actividad")
+    ).join(Hilo, Hilo.thread_id == Mensaje.thread_id)
+    consultas = db.session.query(
+        HistorialConsulta.course_id,
+        HistorialConsulta.estado,
+        func.count(HistorialConsulta.consulta_id).label("total")
+    )
+    cursos = db.session.query(Curso.course_id, Curso.nombre)
+    if course_id:
+        hilos = hilos.filter(Hilo.course_id == course_id)
+        mensajes = mensajes.filter(Hilo.course_id == course_id)
+        consultas = consultas.filter(HistorialConsulta.course_id == course_id)
+        cursos = cursos.filter(Curso.course_id == course_id)
+    if desde:
+        hilos = hilos.filter(Hilo.creado_en >= desde)
+        mensajes = mensajes.filter(Mensaje.timestamp >= desde)
+        consultas = consultas.filter(HistorialConsulta.timestamp >= desde)
+    if hasta:
+        hilos = hilos.filter(Hilo.creado_en < hasta)
+        mensajes = mensajes.filter(Mensaje.timestamp < hasta)
+        consultas = consultas.filter(HistorialConsulta.timestamp < hasta)
+
+    resumen = {
+        c.course_id: {
+            "course_id": c.course_id,
+            "nombre": c.nombre,
+            "hilos": 0,
+            "estudiantes": 0,
+            "mensajes": 0,
+            "ultima_actividad": None,
+            "consultas": {}
+        }
+        for c in cursos.all()
+    }
+
+    def entrada(course_id):
+        return resumen.setdefault(course_id, {
+            "course_id": course_id, "nombre": None, "hilos": 0, "estudiantes": 0,
+            "mensajes": 0, "ultima_actividad": None, "consultas": {}
+        })
+
+    for fila in hilos.group_by(Hilo.course_id).all():
+        datos = entrada(fila.course_id)
+        datos["hilos"] = fila.hilos
+        datos["estudiantes"] = fila.estudiantes
+    for fila in mensajes.group_by(Hilo.course_id).all():
+        datos = entrada(fila.course_id)
+        datos["mensajes"] = fila.mensajes
+        datos["ultima_actividad"] = fila.ultima_actividad
+    for fila in consultas.group_by(HistorialConsulta.course_id, HistorialConsulta.estado).all():
+        entrada(fila.course_id)["consultas"][fila.estado] = fila.total
+
+    return sorted(resumen.values(), key=lambda d: d["mensajes"], reverse=True)
+
+
+_ETAPAS_TIEMPO = (
+    "espera_cola_ms", "crear_hilo_ms", "crear_mensaje_ms", "run_en_cola_ms",
+    "run_en_progreso_ms", "obtener_mensaje_ms", "postproceso_ms", "commit_ms", "total_ms"
+)
+_TOKENS = ("tokens_prompt", "tokens_completion", "tokens_file_search")
+
+
+def resumen_tiempos(course_id=None, asistente_id=None, desde=None, hasta=None):
+    """
+    Latencia promedio por etapa y tokens totales, agrupados por curso,
+    asistente y origen (openai, cache, similar, error).
+    """
+    t = TiempoConsulta
+    consulta = db.session.query(
+        t.course_id,
+        t.asistente_id,
+        t.origen,
+        func.count(t.consulta_id).label("consultas"),
+        *[func.avg(getattr(t, c)).label(c) for c in _ETAPAS_TIEMPO],
+        *[func.sum(getattr(t, c)).label(c) for c in _TOKENS]
+    )
+    if course_id:
+        consulta = consulta.filter(t.course_id == course_id)
+    if asistente_id:
+        consulta = consulta.filter(t.asistente_id == asistente_id)
+    if desde:
+        consulta = consulta.filter(t.creado_en >= desde)
+    if hasta:
+        consulta = consulta.filter(t.creado_en < hasta)
+
+    filas = consulta.group_by(t.course_id, t.asistente_id, t.origen).all()
+    return [
+        {
+            "course_id": f.course_id,
+            "asistente_id": f.asistente_id,
+            "origen": f.origen,
+            "consultas": f.consultas,
+            "promedio_ms": {
+                c[:-3]: round(float(getattr(f, c)), 1) if getattr(f, c) is not None else None
+                for c in _ETAPAS_TIEMPO
+            },
+            "tokens": {c[len("tokens_"):]: int(getattr(f, c) or 0) for c in _TOKENS}
+        }
+        for f in filas
+    ]
@@ -0,0 +1,112 @@
+# web/services/jwks_cache.py
+import logging
+import re
+import threading
+import time
+import jwt
+import requests
+from shared.config import CANVAS_JWKS_URL
+from shared.helpers.metricas import medir_solicitud
+from shared.helpers.trazas import tramo
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_JWKS = (3, 5)            # (conexión, lectura) en segundos
+TTL_POR_DEFECTO = 3600           # si Canvas no envía Cache-Control
+TTL_MINIMO = 60
+TTL_MAXIMO = 24 * 3600
+INTERVALO_MINIMO_REFRESCO = 30   # un kid desconocido no puede forzar más de un fetch cada 30 s
+
+_PATRON_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+# kid -> PyJWK ya parseado (se crea una sola vez por clave)
+_claves = {}
+_expira_en = 0.0
+_ultimo_refresco = 0.0
+_lock = threading.Lock()
+
+
+def _ttl_desde_cabeceras(cabeceras):
+    """TTL en segundos según Cache-Control (max-age), acotado a límites razonables."""
+    cache_control = cabeceras.get("Cache-Control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return TTL_MINIMO
+    coincidencia = _PATRON_MAX_AGE.search(cache_control)
+    if not coincidencia:
+        return TTL_POR_DEFECTO
+    return max(TTL_MINIMO, min(int(coincidencia.group(1)), TTL_MAXIMO))
+
+
+def _descargar_claves():
+    with tramo("canvas GET jwks"), medir_solicitud("canvas_jwks") as medicion:
+        respuesta = medicion["respuesta"] = requests.get(CANVAS_JWKS_URL, timeout=TIMEOUT_JWKS)
+    respuesta.raise_for_status()
+
+    claves = {}
+    for key in respuesta.json().get("keys", []):
+        kid = key.get("kid")
+        if not kid:
+            continue
+        try:
+            claves[kid] = jwt.PyJWK(key)
+        except jwt.PyJWTError as e:
+            logger.warning(f"⚠️ Clave JWKS ignorada ({kid}): {e}")
+    return claves, _ttl_desde_cabeceras(respuesta.headers)
+
+
+def _refrescar(solicitado_en):
+    """
+    Descarga el JWKS de Canvas. Solo un hilo descarga a la vez: los demás esperan
+    el lock y, si alguien refrescó mientras esperaban, usan ese resultado.
+    """
+    global _claves, _expira_en, _ultimo_refresco
+    with _lock:
+        if _ultimo_refresco > solicitado_en:
+            return
+        try:
+            claves, ttl = _descargar_claves()
+        except Exception as e:
+            # Se siguen usando las claves anteriores (si las hay) hasta el próximo intento
+            logger.error(f"❌ Error al obtener JWKS de Canvas: {e}")
+            _ultimo_refresco = time.monotonic()
+            _expira_en = _ultimo_refresco + TTL_MINIMO
+            return
+
+        _claves = claves
+        _ultimo_refresco = time.monotonic()
+        _expira_en = _ultimo_refresco + ttl
+        logger.info(f"🔑 JWKS de Canvas actualizado: {len(claves)} claves (TTL {ttl}s)")
+
+
+def _refrescar_en_segundo_plano():
+    global _expira_en
+    # Evita lanzar un hilo por cada request mientras el refresco está en curso
+    _expira_en = time.monotonic() + TTL_MINIMO
+    threading.Thread(target=_refrescar, args=(time.monotonic(),), name="jwks-refresco", daemon=True).start()
+
+
+def precargar_claves():
+    """Descarga el JWKS al arrancar, para que el primer launch no espere a Canvas."""
+    _refrescar_en_segundo_plano()
+
+
+def obtener_clave(kid):
+    """
+    Devuelve el PyJWK de Canvas para `kid` (o None si no existe).
+    Con el caché expirado se siguen usando las claves conocidas mientras se
+    refresca en segundo plano; solo se espera a la red si aún no hay claves
+    o si el kid es desconocido (rotación), como máximo una vez cada
+    INTERVALO_MINIMO_REFRESCO.
+    """
+    ahora = time.monotonic()
+    if ahora >= _expira_en:
+        if _claves:
+            _refrescar_en_segundo_plano()
+        else:
+            _refrescar(ahora)
+
+    clave = _claves.get(kid)
+    if clave is None and time.monotonic() - _ultimo_refresco >= INTERVALO_MINIMO_REFRESCO:
+        _refrescar(time.monotonic())
+        clave = _claves.get(kid)
+    return clave
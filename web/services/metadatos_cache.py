@@ -0,0 +1,137 @@
+# web/services/metadatos_cache.py
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from shared.models.db import db, Curso, Asistente, Usuario, curso_asistente
+from shared.config import METADATOS_TTL
+from shared.helpers.cache import CacheLRU
+from shared.helpers.redis_cliente import obtener_redis
+
+logger = logging.getLogger(__name__)
+
+CANAL_INVALIDACION = "metadatos:invalidar"
+TTL_NEGATIVO = 30  # segundos para "no existe" (un curso recién creado aparece pronto)
+
+# Solo datos planos (no objetos de SQLAlchemy): se comparten entre requests
+_cache = CacheLRU(max_items=5000, ttl=METADATOS_TTL)
+_NO_EXISTE = object()
+
+_escucha_iniciada = False
+_escucha_lock = threading.Lock()
+
+
+def _escuchar_invalidaciones():
+    """Hilo de fondo: vacía la caché local cuando otro proceso avisa por Redis."""
+    while True:
+        r = obtener_redis()
+        if r is None:
+            return
+        try:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CANAL_INVALIDACION)
+            # Pudimos perder avisos mientras no estábamos suscritos
+            _cache.clear()
+            while True:
+                mensaje = pubsub.get_message(timeout=30)
+                if mensaje and mensaje.get("type") == "message":
+                    _cache.clear()
+                    logger.info("🔄 Caché de metadatos invalidada")
+        except Exception as e:
+            logger.warning(f"⚠️ Escucha de invalidaciones interrumpida: {e}")
+            time.sleep(5)
+
+
+def _asegurar_escucha():
+    global _escucha_iniciada
+    if _escucha_iniciada:
+        return
+    with _escucha_lock:
+        if _escucha_iniciada:
+            return
+        _escucha_iniciada = True
+        if obtener_redis() is not None:
+            threading.Thread(target=_escuchar_invalidaciones, name="metadatos-invalidacion", daemon=True).start()
+
+
+def _obtener(clave, cargar):
+    _asegurar_escucha()
+    valor = _cache.get(clave)
+    if valor is None:
+        valor = cargar()
+        if valor is None:
+            _cache.set(clave, _NO_EXISTE, ttl=TTL_NEGATIVO)
+        else:
+            _cache.set(clave, valor)
+        return valor
+    return None if valor is _NO_EXISTE else valor
+
+
+def _curso_plano(curso):
+    return SimpleNamespace(
+        course_id=curso.course_id,
+        nombre=curso.nombre,
+        lti_deployment_id=curso.lti_deployment_id,
+        vector_store_id=curso.vector_store_id,
+        asistente_principal_id=curso.asistente_principal_id
+    )
+
+
+def obtener_curso_por_deployment(deployment_id):
+    """Curso asociado a un deployment LTI (o None)."""
+    def cargar():
+        curso = Curso.query.filter_by(lti_deployment_id=deployment_id).first()
+        return _curso_plano(curso) if curso else None
+    return _obtener(f"deployment:{deployment_id}", cargar)
+
+
+def obtener_curso(course_id):
+    """Curso por ID (o None)."""
+    def cargar():
+        curso = Curso.query.get(course_id)
+        return _curso_plano(curso) if curso else None
+    return _obtener(f"curso:{course_id}", cargar)
+
+
+def obtener_asistentes_curso(course_id):
+    """Asistentes vinculados al curso (lista vacía si no hay curso)."""
+    def cargar():
+        asistentes = db.session.query(Asistente) \
+            .join(curso_asistente) \
+            .filter(curso_asistente.c.course_id == course_id) \
+            .all()
+        return [
+            SimpleNamespace(
+                asistente_id=a.asistente_id,
+                nombre=a.nombre,
+                categoria=a.categoria,
+                subtipo=a.subtipo
+            )
+            for a in asistentes
+        ]
+    return _obtener(f"asistentes:{course_id}", cargar) or []
+
+
+def usuario_conocido(user_id):
+    """True si el usuario ya está registrado (consulta la DB solo la primera vez)."""
+    def cargar():
+        return True if Usuario.query.get(user_id) else None
+    return bool(_obtener(f"usuario:{user_id}", cargar))
+
+
+def marcar_usuario_conocido(user_id):
+    _cache.set(f"usuario:{user_id}", True)
+
+
+def invalidar_metadatos():
+    """
+    Vacía la caché de este proceso y avisa al resto por Redis.
+    Llamar después de crear o editar cursos y asistentes.
+    """
+    _cache.clear()
+    r = obtener_redis()
+    if r is not None:
+        try:
+            r.publish(CANAL_INVALIDACION, "1")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo publicar la invalidación de metadatos: {e}")
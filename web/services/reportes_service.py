@@ -0,0 +1,91 @@
+# web/services/reportes_service.py
+import datetime
+from sqlalchemy import func
+from shared.models.db import db, Asistente, ResumenUsoDiario
+from shared.helpers.cache import CacheLRU
+
+TOP_ASISTENTES = 5
+_cache_reportes = CacheLRU(max_items=500, ttl=300)  # los agregados se recalculan cada 15 min
+
+
+def _a_fecha(valor):
+    if isinstance(valor, str):
+        return datetime.date.fromisoformat(valor[:10])
+    return valor
+
+
+def _promedio(total, n):
+    return round(total / n, 1) if n else None
+
+
+def reporte_curso(course_id, desde=None, hasta=None):
+    """
+    Reporte de uso del curso a partir de resumen_uso_diario (nunca de las
+    tablas crudas): consultas por semana, horas más activas, asistentes más
+    usados y latencia promedio. `desde`/`hasta` son fechas (hasta exclusivo).
+    """
+    clave = (course_id, desde, hasta)
+    reporte = _cache_reportes.get(clave)
+    if reporte is not None:
+        return reporte
+
+    r = ResumenUsoDiario
+    filtros = [r.course_id == course_id]
+    if desde:
+        filtros.append(r.fecha >= desde)
+    if hasta:
+        filtros.append(r.fecha < hasta)
+
+    def agregado(*columnas):
+        return db.session.query(
+            *columnas,
+            func.sum(r.consultas).label("consultas"),
+            func.sum(r.latencia_total_ms).label("latencia_total_ms"),
+            func.sum(r.latencia_n).label("latencia_n")
+        ).filter(*filtros).group_by(*columnas)
+
+    # Por día (a lo sumo un año de filas) y se agrupa por semana aquí
+    semanas = {}
+    for fila in agregado(r.fecha).all():
+        fecha = _a_fecha(fila.fecha)
+        lunes = fecha - datetime.timedelta(days=fecha.weekday())
+        semana = semanas.setdefault(lunes, {"semana": lunes.isoformat(), "consultas": 0})
+        semana["consultas"] += fila.consultas or 0
+
+    horas = [
+        {"hora": fila.hora, "consultas": fila.consultas or 0}
+        for fila in agregado(r.hora).order_by(func.sum(r.consultas).desc()).all()
+    ]
+
+    nombres = dict(db.session.query(Asistente.asistente_id, Asistente.nombre).all())
+    asistentes = [
+        {
+            "asistente_id": fila.asistente_id,
+            "nombre": nombres.get(fila.asistente_id),
+            "consultas": fila.consultas or 0,
+            "latencia_promedio_ms": _promedio(fila.latencia_total_ms or 0, fila.latencia_n or 0)
+        }
+        for fila in agregado(r.asistente_id).order_by(func.sum(r.consultas).desc()).limit(TOP_ASISTENTES).all()
+    ]
+
+    totales = db.session.query(
+        func.sum(r.consultas),
+        func.sum(r.completadas),
+        func.sum(r.errores),
+        func.sum(r.latencia_total_ms),
+        func.sum(r.latencia_n)
+    ).filter(*filtros).one()
+    consultas, completadas, errores, latencia_total, latencia_n = [v or 0 for v in totales]
+
+    reporte = {
+        "course_id": course_id,
+        "consultas": consultas,
+        "completadas": completadas,
+        "errores": errores,
+        "latencia_promedio_ms": _promedio(latencia_total, latencia_n),
+        "por_semana": [semanas[k] for k in sorted(semanas)],
+        "horas_mas_activas": horas,
+        "asistentes_mas_usados": asistentes
+    }
+    _cache_reportes.set(clave, reporte)
+    return reporte
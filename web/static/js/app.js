@@ -156,9 +156,9 @@ function actualizarEstadoConsulta(consultaId, data) {
     if (data.estado === "completado") {
         statusDiv.innerHTML = '<span class="status-completed">✅ Respuesta completada</span>';
         
-        // Mostrar respuesta con formato Markdown y animación
+        // Mostrar respuesta (HTML del servidor o Markdown local) con animación
         try {
-            const respuestaHtml = marked.parse(data.respuesta || 'Sin respuesta disponible.');
+            const respuestaHtml = data.respuesta_html || marked.parse(data.respuesta || 'Sin respuesta disponible.');
             contenidoDiv.innerHTML = respuestaHtml;
             contenidoDiv.style.display = 'block';
             
@@ -261,6 +261,109 @@ function iniciarPolling(consultaId) {
     }, 3000); // Polling cada 3 segundos
 }
 
+/**
+ * Mostrar el texto parcial de una respuesta mientras se genera
+ * @param {string} consultaId - ID de la consulta
+ * @param {string} texto - Texto acumulado hasta ahora
+ */
+function mostrarRespuestaParcial(consultaId, texto) {
+    const qaItem = document.getElementById(`qa-${consultaId}`);
+    if (!qaItem) {
+        return;
+    }
+    
+    const statusDiv = qaItem.querySelector('.respuesta-status');
+    const contenidoDiv = qaItem.querySelector('.respuesta-contenido');
+    
+    if (!statusDiv.dataset.streaming) {
+        statusDiv.dataset.streaming = '1';
+        statusDiv.innerHTML = '<span class="status-loading"><span class="loader">🔄 Generando respuesta</span></span>';
+        contenidoDiv.style.display = 'block';
+        contenidoDiv.classList.add('revealed');
+    }
+    
+    // Ocultar marcadores de cita 【..†..】 hasta la respuesta final
+    contenidoDiv.innerHTML = marked.parse(texto.replace(/【[^】]*】?/g, ''));
+}
+
+/**
+ * Recibir la respuesta en streaming (Server-Sent Events).
+ * Si el navegador no lo soporta o la conexión falla (también el 503 que
+ * envía el servidor cuando tiene SSE_MAX_STREAMS abiertos), usa polling.
+ * @param {string} consultaId - ID de la consulta a monitorear
+ */
+function iniciarStreaming(consultaId) {
+    if (!window.EventSource) {
+        iniciarPolling(consultaId);
+        return;
+    }
+    
+    console.log(`📡 Iniciando streaming para consulta: ${consultaId}`);
+    
+    const fuente = new EventSource(`/stream_consulta/${consultaId}`);
+    let texto = '';
+    let pendienteRender = false;
+    let terminado = false;
+    
+    const renderizar = () => {
+        if (pendienteRender) {
+            return;
+        }
+        pendienteRender = true;
+        requestAnimationFrame(() => {
+            pendienteRender = false;
+            if (!terminado) {
+                mostrarRespuestaParcial(consultaId, texto);
+            }
+        });
+    };
+    
+    fuente.addEventListener('parcial', (e) => {
+        const data = JSON.parse(e.data);
+        if (data.texto.length > texto.length) {
+            texto = data.texto;
+            renderizar();
+        }
+    });
+    
+    fuente.addEventListener('delta', (e) => {
+        const data = JSON.parse(e.data);
+        // Descartar deltas ya incluidos en el parcial
+        if (data.offset + data.texto.length <= texto.length) {
+            return;
+        }
+        texto = texto.slice(0, data.offset) + data.texto;
+        renderizar();
+    });
+    
+    fuente.addEventListener('final', (e) => {
+        terminado = true;
+        fuente.close();
+        actualizarEstadoConsulta(consultaId, JSON.parse(e.data));
+        console.log(`✅ Streaming completado para ${consultaId}`);
+    });
+    
+    fuente.addEventListener('timeout', () => {
+        terminado = true;
+        fuente.close();
+        const qaItem = document.getElementById(`qa-${consultaId}`);
+        if (qaItem) {
+            const statusDiv = qaItem.querySelector('.respuesta-status');
+            statusDiv.innerHTML = '<span class="status-error">⏰ Tiempo de espera agotado</span>';
+        }
+    });
+    
+    fuente.onerror = () => {
+        if (terminado) {
+            return;
+        }
+        terminado = true;
+        fuente.close();
+        console.warn(`📡 Streaming interrumpido para ${consultaId}, usando polling`);
+        iniciarPolling(consultaId);
+    };
+}
+
 /**
  * Obtener el ID del asistente seleccionado
  * @returns {string} - ID del asistente
@@ -341,8 +444,8 @@ function configurarFormulario() {
                 // Crear nuevo contenedor QA
                 crearNuevoQA(preguntaTexto, consultaId);
                 
-                // Iniciar polling para esta consulta
-                iniciarPolling(consultaId);
+                // Recibir la respuesta en streaming
+                iniciarStreaming(consultaId);
                 
                 // Limpiar formulario
                 textArea.value = '';
@@ -397,8 +500,8 @@ function manejarConsultaInicial() {
         // Crear contenedor para la pregunta inicial
         crearNuevoQA(preguntaActual, consultaId);
         
-        // Iniciar polling
-        iniciarPolling(consultaId);
+        // Recibir la respuesta en streaming
+        iniciarStreaming(consultaId);
         
         // Limpiar los campos ocultos para evitar duplicación
         document.getElementById("consulta_id")?.remove();
@@ -2,6 +2,8 @@
 import os
 import requests
 from shared.config import CANVAS_TOKEN, CANVAS_BASE_URL, TEMP_DIR
+from shared.helpers.metricas import medir_solicitud
+from shared.helpers.trazas import tramo
 
 def get_all_course_files(course_id):
     """Obtiene todos los archivos de un curso de Canvas (con paginación)"""
@@ -15,7 +17,9 @@ def get_all_course_files(course_id):
 
     while url:
         try:
-            response = requests.get(url, headers=headers, params=params)
+            with tramo("canvas GET /courses/{course}/files", course_id=course_id), \
+                    medir_solicitud("canvas") as medicion:
+                response = medicion["respuesta"] = requests.get(url, headers=headers, params=params)
             response.raise_for_status()
             archivos = response.json()
             todos_los_archivos.extend(archivos)
@@ -42,11 +46,12 @@ def download_file(file_info):
     download_url = file_info['url']
 
     try:
-        response = requests.get(
-            download_url,
-            headers={"Authorization": f"Bearer {CANVAS_TOKEN}"},
-            timeout=30
-        )
+        with tramo("canvas GET archivo", archivo=file_name), medir_solicitud("canvas") as medicion:
+            response = medicion["respuesta"] = requests.get(
+                download_url,
+                headers={"Authorization": f"Bearer {CANVAS_TOKEN}"},
+                timeout=30
+            )
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         raise Exception(f"Error al descargar {file_name}: {e}")
@@ -4,4 +4,7 @@ from shared.config import *
 # === Configuración específica del worker ===
 POLLING_INTERVAL = int(os.getenv("POLLING_INTERVAL", 5))  # segundos
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", 3))
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
+MAX_CONSULTAS_CONCURRENTES = int(os.getenv("MAX_CONSULTAS_CONCURRENTES", 4))
+# Una consulta "procesando" por más de esto quedó huérfana (worker caído o redeploy)
+CONSULTA_TIMEOUT_PROCESANDO = int(os.getenv("CONSULTA_TIMEOUT_PROCESANDO", 600))  # segundos
+CONSULTA_MAX_INTENTOS = int(os.getenv("CONSULTA_MAX_INTENTOS", 3))  # reclamos antes de marcarla error
\ No newline at end of file
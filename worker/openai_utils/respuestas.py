@@ -0,0 +1,57 @@
+# worker/openai_utils/respuestas.py
+import re
+
+# Marcador de cita que OpenAI inserta en el texto: 【4:0†archivo.pdf】
+_PATRON_NOMBRE_CITA = re.compile(r'†([^】]+)】')
+
+
+def obtener_mensaje_run(client, thread_id, run_id):
+    """
+    Devuelve el mensaje del asistente generado por `run_id` (o None).
+    Pide solo ese mensaje en lugar de listar el hilo completo.
+    """
+    mensajes = client.beta.threads.messages.list(
+        thread_id=thread_id,
+        run_id=run_id,
+        order="desc",
+        limit=1
+    )
+    for msg in mensajes.data:
+        if msg.role == "assistant":
+            return msg
+    return None
+
+
+def extraer_texto_y_citas(mensaje):
+    """
+    Une los bloques de texto del mensaje y convierte sus anotaciones
+    `file_citation` en citas estructuradas, en orden de aparición:
+    [{"file_id", "nombre", "marcador"}] (un mismo archivo puede repetirse).
+    """
+    partes = []
+    citas = []
+
+    for bloque in mensaje.content:
+        if getattr(bloque, "type", None) != "text":
+            continue
+        partes.append(bloque.text.value)
+
+        for anotacion in bloque.text.annotations or []:
+            if anotacion.type != "file_citation":
+                continue
+            nombre = _PATRON_NOMBRE_CITA.search(anotacion.text or "")
+            citas.append({
+                "file_id": anotacion.file_citation.file_id,
+                "nombre": nombre.group(1) if nombre else None,
+                "marcador": anotacion.text
+            })
+
+    return "\n\n".join(partes), citas
+
+
+def obtener_respuesta_run(client, thread_id, run_id):
+    """Texto y citas de la respuesta de un run; lanza excepción si no hay."""
+    mensaje = obtener_mensaje_run(client, thread_id, run_id)
+    if not mensaje:
+        raise Exception("No se recibió respuesta del asistente")
+    return extraer_texto_y_citas(mensaje)
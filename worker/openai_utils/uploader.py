@@ -1,16 +1,20 @@
 # worker/openai_utils/uploader.py
 
-from shared.config import TEMP_DIR, OPENAI_API_KEY
+from shared.config import TEMP_DIR
 from shared.models.db import Asistente, ArchivoProcesado
 from shared.models.db_services import registrar_archivo
-from openai import OpenAI
+from openai_utils.respuestas import obtener_respuesta_run
+from shared.helpers.openai_cliente import obtener_openai
+from shared.helpers.metricas import BYTES_TRANSFERIDOS
 import os
 import pandas as pd
 import re
 import time
+import logging
 
 # === CONFIGURACIÓN Y CLIENTE OPENAI ===
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = obtener_openai()
+logger = logging.getLogger(__name__)
 
 # Asegurar que el directorio temporal exista
 os.makedirs(TEMP_DIR, exist_ok=True)
@@ -81,10 +85,11 @@ def convertir_a_txt(path):
             # Escribir encabezados
             f.write("\t".join(df.columns.astype(str)) + "\n")
             # Escribir filas
+            # map(str): con pandas 3, astype(str) deja las celdas vacías como NaN (float)
             for _, row in df.iterrows():
-                f.write("\t".join(row.astype(str)) + "\n")
+                f.write("\t".join(map(str, row)) + "\n")
 
-        print(f"✅ {ext.upper()} convertido a TXT: {nuevo_path}")
+        logger.debug("✅ %s convertido a TXT: %s", ext.upper(), nuevo_path)
         return nuevo_path
 
     except Exception as e:
@@ -102,11 +107,10 @@ def analizar_codigo_con_asistente(path, asistente_id):
         if len(contenido) > 100_000:
             contenido = contenido[:100_000] + "\n\n... (contenido truncado)"
 
-        print(f"🧠 Enviando código a {asistente_id} para análisis...")
+        logger.info("🧠 Enviando código a %s para análisis...", asistente_id)
 
         # Crear un thread
         thread = client.beta.threads.create()
-        print(f"🧵 Thread creado: {thread.id}")
 
         # Enviar el contenido del código al asistente
         client.beta.threads.messages.create(
@@ -114,14 +118,13 @@ def analizar_codigo_con_asistente(path, asistente_id):
             role="user",
             content=f"Por favor, analiza el siguiente código y genera un informe detallado:\n\n{contenido}"
         )
-        print(f"💬 Mensaje enviado al thread {thread.id}")
 
         # Ejecutar el asistente
         run = client.beta.threads.runs.create(
             thread_id=thread.id,
             assistant_id=asistente_id
         )
-        print(f"🚀 Run iniciado: {run.id}")
+        logger.debug("🚀 Run %s iniciado en el thread %s", run.id, thread.id)
 
         # Esperar a que el run termine
         while run.status in ["queued", "in_progress"]:
@@ -130,26 +133,18 @@ def analizar_codigo_con_asistente(path, asistente_id):
                 thread_id=thread.id,
                 run_id=run.id
             )
-            print(f"⏳ Run status: {run.status}")
+            logger.debug("⏳ Run %s: %s", run.id, run.status)
 
-        if run.status == "completed":
-            print("✅ Run completado.")
-        else:
+        if run.status != "completed":
             raise Exception(f"❌ Run falló: {run.status} - {run.last_error}")
 
-        # Obtener la respuesta del asistente
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        for msg in messages:
-            if msg.role == "assistant":
-                informe = msg.content[0].text.value
-                print("📋 Informe generado por el asistente:")
-                print(f"   {informe[:200]}...")
-                return informe
-
-        raise Exception("❌ No se recibió respuesta del asistente")
+        # Obtener la respuesta del asistente (solo el mensaje de este run)
+        informe, _ = obtener_respuesta_run(client, thread.id, run.id)
+        logger.debug("📋 Informe generado: %d caracteres", len(informe))
+        return informe
 
     except Exception as e:
-        print(f"❌ Error al analizar código: {e}")
+        logger.error("❌ Error al analizar código: %s", e)
         raise
 
 # === GENERAR NOMBRE DEL INFORME ===
@@ -167,11 +162,8 @@ def subir_y_asociar_archivo(path, vector_store_id, canvas_file_id, course_id, up
     Sube un archivo al vector store de OpenAI. Si es código, lo analiza primero.
     Registra el archivo en la base de datos.
     """
-    print(f"\n📤 INICIANDO SUBIDA: {os.path.basename(path)}")
-    print(f"   Vector Store ID: {vector_store_id}")
-    print(f"   Ruta: {path}")
-    print(f"   Canvas File ID: {canvas_file_id}")
-    print(f"   Course ID: {course_id}")
+    logger.debug("📤 Subiendo %s (canvas %s, curso %s) al vector store %s",
+                 path, canvas_file_id, course_id, vector_store_id)
 
     # Validar existencia del archivo
     if not os.path.exists(path):
@@ -202,10 +194,9 @@ def subir_y_asociar_archivo(path, vector_store_id, canvas_file_id, course_id, up
                 # ✅ Ya existe el informe, usarlo
                 path_a_subir = ruta_informe
                 nombre_final = nombre_informe
-                print(f"📄 Usando informe existente: {ruta_informe}")
+                logger.debug("📄 Usando informe existente: %s", ruta_informe)
             else:
                 # ✅ Generar nuevo informe
-                print("🐍 ARCHIVO DE CÓDIGO → usando asistente interno")
                 asistente = obtener_asistente_interno_por_subtipo("analizador_codigo")
                 informe = analizar_codigo_con_asistente(path, asistente.asistente_id)
 
@@ -228,34 +219,29 @@ def subir_y_asociar_archivo(path, vector_store_id, canvas_file_id, course_id, up
             if registro_txt and os.path.exists(ruta_txt):
                 path_a_subir = ruta_txt
                 nombre_final = nombre_txt
-                print(f"📄 Usando TXT existente: {ruta_txt}")
+                logger.debug("📄 Usando TXT existente: %s", ruta_txt)
             else:
                 temp_path = convertir_a_txt(path)
                 path_a_subir = temp_path
                 nombre_final = nombre_txt
 
         else:
-            print("📄 ARCHIVO DOCUMENTO → subiendo directamente")
             path_a_subir = path
             nombre_final = os.path.basename(path)
 
         # === 2. SUBIR A OPENAI ===
-        print(f"⬆️ Subiendo a OpenAI: {nombre_final}")
         with open(path_a_subir, "rb") as f:
             file_response = client.files.create(file=f, purpose="assistants")
         file_id = file_response.id
-        print(f"✅ Archivo subido a OpenAI. ID: {file_id}")
+        BYTES_TRANSFERIDOS.labels("openai", "salida").inc(os.path.getsize(path_a_subir))
 
         # === 3. ASOCIAR AL VECTOR STORE ===
-        print(f"🔗 Asociando al vector store {vector_store_id}...")
-        vs_file = client.vector_stores.files.create(
+        client.vector_stores.files.create(
             vector_store_id=vector_store_id,
             file_id=file_id
         )
-        print(f"✅ Asociado al vector store. VS File ID: {vs_file.id}")
 
         # === 4. REGISTRAR EN BASE DE DATOS ===
-        print(f"💾 Registrando en base de datos...")
         registrar_archivo(
             canvas_file_id=canvas_file_id,
             filename=nombre_final,
@@ -263,27 +249,27 @@ def subir_y_asociar_archivo(path, vector_store_id, canvas_file_id, course_id, up
             file_id_openai=file_id,
             course_id=course_id
         )
-        print(f"✅ Registro completado en DB.")
+        logger.info("⬆️ %s subido a OpenAI (%s) y asociado al vector store", nombre_final, file_id)
 
         return file_id
 
     except Exception as e:
-        print(f"❌ ERROR FATAL al subir {os.path.basename(path)}: {str(e)}")
+        logger.error("❌ Error al subir %s: %s", os.path.basename(path), e)
         if file_id:
             try:
                 client.files.delete(file_id)
-                print(f"🧹 Archivo {file_id} eliminado de OpenAI por fallo.")
+                logger.info("🧹 Archivo %s eliminado de OpenAI por fallo.", file_id)
             except Exception as del_e:
-                print(f"⚠️ No se pudo eliminar {file_id} de OpenAI: {del_e}")
+                logger.warning("⚠️ No se pudo eliminar %s de OpenAI: %s", file_id, del_e)
         raise
 
     finally:
         if temp_path and os.path.exists(temp_path):
             try:
                 os.remove(temp_path)
-                print(f"🗑️ Temporal eliminado: {temp_path}")
+                logger.debug("🗑️ Temporal eliminado: %s", temp_path)
             except Exception as e:
-                print(f"❌ No se pudo eliminar temporal {temp_path}: {e}")
+                logger.warning("⚠️ No se pudo eliminar temporal %s: %s", temp_path, e)
 
 
 # +++++++++++++++++++++++++++++++++++++++++++++++++++
@@ -302,8 +288,8 @@ def listar_archivos_vector_store(vector_store_id):
                 "name": file_info.filename,
                 "created_at": file_info.created_at
             })
-        print(f"🔍 {len(archivos)} archivos encontrados en vector store {vector_store_id}")
+        logger.debug("🔍 %d archivos en el vector store %s", len(archivos), vector_store_id)
         return archivos
     except Exception as e:
-        print(f"❌ Error al listar archivos del vector store {vector_store_id}: {e}")
+        logger.error("❌ Error al listar archivos del vector store %s: %s", vector_store_id, e)
         return []
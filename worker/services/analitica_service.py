@@ -0,0 +1,146 @@
+# worker/services/analitica_service.py
+import datetime
+import logging
+import os
+import time
+from sqlalchemy import func, case, extract, insert, select, delete
+from shared.models.db import db, HistorialConsulta, ResumenUsoDiario
+from shared.helpers.archivo_historico import archivo_disponible
+from shared.config import DIRECTORIO_ARCHIVO
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_RESUMEN = 15 * 60       # segundos entre actualizaciones de los agregados
+INTERVALO_EXPORTACION = 24 * 3600
+DIRECTORIO_ANALITICA = os.path.join(DIRECTORIO_ARCHIVO, "analitica")
+
+ultima_actualizacion = 0
+ultima_exportacion = 0
+
+
+def _latencia_ms(dialecto):
+    """Milisegundos entre la creación de la consulta y su estado terminal."""
+    hc = HistorialConsulta
+    if dialecto == "postgresql":
+        return extract("epoch", hc.completado_en - hc.timestamp) * 1000
+    return (func.julianday(hc.completado_en) - func.julianday(hc.timestamp)) * 86400000
+
+
+def _desde_recalculo(conn):
+    """
+    Primer día a recalcular: el último ya agregado menos uno (las consultas de
+    ayer pueden haber terminado después de la última pasada). Sin agregados,
+    desde la consulta más antigua.
+    """
+    ultima = conn.execute(select(func.max(ResumenUsoDiario.fecha))).scalar()
+    if ultima is None:
+        ultima = conn.execute(select(func.min(HistorialConsulta.timestamp))).scalar()
+        if ultima is None:
+            return None
+    if isinstance(ultima, str):
+        ultima = datetime.date.fromisoformat(ultima[:10])
+    if isinstance(ultima, datetime.datetime):
+        ultima = ultima.date()
+    return ultima - datetime.timedelta(days=1)
+
+
+def actualizar_resumenes():
+    """
+    Mantiene resumen_uso_diario de forma incremental: borra y vuelve a
+    agregar (GROUP BY en la DB) solo los días recientes. Los reportes
+    leen de esta tabla en vez de recorrer historial_consultas.
+    """
+    global ultima_actualizacion
+    ahora = time.time()
+    if ahora - ultima_actualizacion < INTERVALO_RESUMEN:
+        return
+    ultima_actualizacion = ahora
+
+    hc = HistorialConsulta
+    try:
+        with db.engine.begin() as conn:
+            desde = _desde_recalculo(conn)
+            if desde is None:
+                return
+            inicio = datetime.datetime.combine(desde, datetime.time())
+
+            latencia = _latencia_ms(conn.dialect.name)
+            medida = hc.completado_en.isnot(None)
+            agregados = select(
+                func.date(hc.timestamp),
+                hc.course_id,
+                func.coalesce(hc.asistente_id, ""),
+                extract("hour", hc.timestamp),
+                func.count(),
+                func.sum(case((hc.estado == "completado", 1), else_=0)),
+                func.sum(case((hc.estado == "error", 1), else_=0)),
+                func.coalesce(func.sum(case((medida, latencia), else_=0)), 0),
+                func.sum(case((medida, 1), else_=0))
+            ).where(
+                hc.timestamp >= inicio,
+                hc.course_id.isnot(None)
+            ).group_by(
+                func.date(hc.timestamp),
+                hc.course_id,
+                func.coalesce(hc.asistente_id, ""),
+                extract("hour", hc.timestamp)
+            )
+
+            conn.execute(delete(ResumenUsoDiario).where(ResumenUsoDiario.fecha >= desde))
+            filas = conn.execute(insert(ResumenUsoDiario).from_select([
+                ResumenUsoDiario.fecha,
+                ResumenUsoDiario.course_id,
+                ResumenUsoDiario.asistente_id,
+                ResumenUsoDiario.hora,
+                ResumenUsoDiario.consultas,
+                ResumenUsoDiario.completadas,
+                ResumenUsoDiario.errores,
+                ResumenUsoDiario.latencia_total_ms,
+                ResumenUsoDiario.latencia_n
+            ], agregados)).rowcount
+        logger.info(f"📊 Resumen de uso actualizado desde {desde}: {filas} filas")
+    except Exception as e:
+        logger.error(f"❌ Error actualizando resumen de uso: {e}")
+
+
+def exportar_analitica():
+    """
+    Exporta los agregados a Parquet (zstd) para análisis externo:
+    uso_diario.parquet (tal cual) y uso_semanal.parquet (agregado con pandas).
+    """
+    global ultima_exportacion
+    ahora = time.time()
+    if ahora - ultima_exportacion < INTERVALO_EXPORTACION:
+        return
+    ultima_exportacion = ahora
+
+    if not archivo_disponible():
+        logger.warning("⚠️ pyarrow no está instalado: se omite la exportación de analítica")
+        return
+
+    import pandas as pd
+
+    try:
+        with db.engine.connect() as conn:
+            diario = pd.read_sql(select(ResumenUsoDiario.__table__), conn)
+        if diario.empty:
+            return
+        diario["fecha"] = pd.to_datetime(diario["fecha"])
+
+        # Semana ISO (lunes) por curso y asistente, todo vectorizado
+        diario["semana"] = diario["fecha"] - pd.to_timedelta(diario["fecha"].dt.weekday, unit="D")
+        semanal = diario.groupby(["course_id", "asistente_id", "semana"], as_index=False)[[
+            "consultas", "completadas", "errores", "latencia_total_ms", "latencia_n"
+        ]].sum()
+        semanal["latencia_promedio_ms"] = (
+            semanal["latencia_total_ms"] / semanal["latencia_n"].where(semanal["latencia_n"] > 0)
+        ).round(1)
+
+        os.makedirs(DIRECTORIO_ANALITICA, exist_ok=True)
+        for nombre, df in (("uso_diario", diario.drop(columns="semana")), ("uso_semanal", semanal)):
+            ruta = os.path.join(DIRECTORIO_ANALITICA, f"{nombre}.parquet")
+            df.to_parquet(ruta + ".tmp", engine="pyarrow", compression="zstd", index=False)
+            os.replace(ruta + ".tmp", ruta)
+        logger.info(f"📤 Analítica exportada: {len(diario)} filas diarias, {len(semanal)} semanales")
+    except Exception as e:
+        logger.error(f"❌ Error exportando analítica: {e}")
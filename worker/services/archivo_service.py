@@ -4,6 +4,10 @@ from shared.models.db import db
 from canvas.downloader import get_all_course_files, download_file
 from openai_utils.uploader import subir_y_asociar_archivo
 from shared.models.db import Curso, ArchivoProcesado
+from shared.helpers.cache import incrementar_version_corpus
+from services.fuentes_service import refrescar_indice_curso
+from shared.helpers.metricas import ARCHIVOS_SINCRONIZADOS, BYTES_TRANSFERIDOS
+from shared.helpers.trazas import tramo
 import logging
 import time
 
@@ -44,10 +48,10 @@ def sincronizar_archivos_canvas():
         ultima_ejecucion[course_id] = ahora
 
         try:
-            logger.info(f"🔄 Procesando curso: {curso.course_id}")
+            logger.info("🔄 Procesando curso: %s", curso.course_id)
             archivos_canvas = get_all_course_files(curso.course_id)
             if not archivos_canvas:
-                logger.info(f"📭 No hay archivos en Canvas para el curso {curso.course_id}")
+                logger.info("📭 No hay archivos en Canvas para el curso %s", curso.course_id)
                 continue
 
             # ✅ 2. Crear mapa de archivos en Canvas: {canvas_file_id: archivo}
@@ -65,44 +69,48 @@ def sincronizar_archivos_canvas():
                 registro = registros_db.get(canvas_id)
                 updated_at_canvas = archivo.get("updated_at")
 
-                # ⭐ Mostrar comparación
-                print(f"\n📄 Archivo: {archivo['filename']}")
-                print(f"   Canvas ID: {canvas_id}")
-                print(f"   updated_at (Canvas): '{updated_at_canvas}' (tipo: {type(updated_at_canvas).__name__})")
-
                 # ✅ Usar normalización consistente
                 updated_at_canvas_norm = normalizar_fecha(updated_at_canvas)
                 updated_at_db_norm = normalizar_fecha(registro.updated_at) if registro else None
 
-                if registro:
-                    print(f"   updated_at (DB):     '{updated_at_db_norm}'")
-                    print(f"   ¿Iguales?            {updated_at_canvas_norm == updated_at_db_norm}")
-
-                if not registro or updated_at_canvas_norm != updated_at_db_norm:
+                cambio = not registro or updated_at_canvas_norm != updated_at_db_norm
+                if cambio:
                     nuevos_o_actualizados.append(archivo)
-                    print(f" 🔴 Será procesado (cambio detectado)")
-                else:
-                    print(f" ✅ No requiere actualización")
+                logger.debug("📄 %s (%s): Canvas %s, DB %s → %s", archivo["filename"], canvas_id,
+                             updated_at_canvas_norm, updated_at_db_norm, "procesar" if cambio else "sin cambios")
 
-            logger.info(f"📦 {len(nuevos_o_actualizados)} archivos nuevos/actualizados")
+            logger.info("📦 %s archivos nuevos/actualizados", len(nuevos_o_actualizados))
+            ARCHIVOS_SINCRONIZADOS.labels("sin_cambios").inc(len(ids_en_canvas) - len(nuevos_o_actualizados))
 
             # ✅ 5. Procesar solo los que necesitan actualización
+            procesados = []
             for archivo in nuevos_o_actualizados:
                 try:
-                    path = download_file(archivo)
-                    file_id = subir_y_asociar_archivo(
-                        path=path,
-                        vector_store_id=curso.vector_store_id,
-                        canvas_file_id=str(archivo["id"]),
-                        course_id=curso.course_id,
-                        updated_at=archivo.get("updated_at")
-                    )
+                    # Una traza por archivo: descarga de Canvas, subida a OpenAI y escrituras en la DB
+                    with tramo("archivo.sincronizar", course_id=curso.course_id, archivo=archivo["filename"]):
+                        path = download_file(archivo)
+                        BYTES_TRANSFERIDOS.labels("canvas", "entrada").inc(os.path.getsize(path))
+                        file_id = subir_y_asociar_archivo(
+                            path=path,
+                            vector_store_id=curso.vector_store_id,
+                            canvas_file_id=str(archivo["id"]),
+                            course_id=curso.course_id,
+                            updated_at=archivo.get("updated_at")
+                        )
                     os.remove(path)
-                    logger.info(f"✅ Procesado: {archivo['filename']}")
+                    procesados.append(str(archivo["id"]))
+                    ARCHIVOS_SINCRONIZADOS.labels("subido").inc()
+                    logger.info("✅ Procesado: %s", archivo["filename"])
 
                 except Exception as e:
-                    logger.error(f"❌ Error con {archivo['filename']}: {str(e)}")
+                    ARCHIVOS_SINCRONIZADOS.labels("error").inc()
+                    logger.error("❌ Error con %s: %s", archivo["filename"], e)
+
+            # ✅ 6. Invalidar respuestas cacheadas y actualizar el índice de citas
+            if procesados:
+                incrementar_version_corpus(curso.course_id)
+                refrescar_indice_curso(curso.course_id, procesados)
 
         except Exception as e:
-            logger.error(f"❌ Error procesando curso {curso.course_id}: {e}")
+            logger.error("❌ Error procesando curso %s: %s", curso.course_id, e)
 
@@ -1,185 +1,351 @@
 # services/consulta_service.py
-from shared.models.db import db, HistorialConsulta, Curso, Hilo, Mensaje, UsoMensual
+from shared.models.db import db, HistorialConsulta, Curso, Mensaje
 from shared.models.db_services import registrar_usuario
-from openai import OpenAI
-from shared.config import OPENAI_API_KEY
-from shared.helpers.helpers import extraer_fuentes, procesar_respuesta_con_fuentes
+from shared.helpers.openai_cliente import obtener_openai
+from shared.helpers.helpers import extraer_fuentes, procesar_respuesta_con_fuentes, renderizar_respuesta_html, generar_id, RENDER_VERSION
+from shared.helpers.cache import buscar_respuesta_cacheada, guardar_respuesta_cacheada
+from shared.helpers.eventos_consulta import AcumuladorDeltas, publicar_final
+from services.similitud_service import buscar_respuesta_similar, registrar_pregunta_respondida
+from openai_utils.respuestas import obtener_respuesta_run
+from services.fuentes_service import resolver_citas
+from services.hilo_service import obtener_hilo_vigente, parametros_run, registrar_uso_hilo
+from services.tiempos_service import TiemposConsulta
+from shared.helpers.metricas import RUN_DURACION
+from shared.helpers.trazas import tramo, evento as evento_traza
+from config import CONSULTA_TIMEOUT_PROCESANDO, CONSULTA_MAX_INTENTOS
+from sqlalchemy import or_
 import logging
 import time
 import datetime
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = obtener_openai()
 logger = logging.getLogger(__name__)
 
 # ✅ No uses ThreadPoolExecutor global aquí → el worker lo maneja
 # El worker ya corre en paralelo consultas y archivos
 
-def procesar_consulta_individual(consulta_id):
-    """Procesa una consulta individual dentro de un app_context"""
-    session = db.session()
-    try:
-        consulta = session.query(HistorialConsulta).get(consulta_id)
-        print(f"🔍 Consulta encontrada: {consulta_id}")
-        print(f"   Estado actual: {consulta.estado}")
-        print(f"   Pregunta: {consulta.pregunta}")
-        if not consulta or consulta.estado != "pendiente":
-            return
+def _notificar_final(consulta):
+    """Avisa al endpoint SSE que la consulta llegó a un estado terminal."""
+    publicar_final(consulta.consulta_id, consulta.estado, consulta.respuesta, consulta.respuesta_html)
 
-        if consulta not in session:
-            consulta = session.merge(consulta)
-        logger.info(f"🧵 Procesando consulta {consulta_id} para usuario {consulta.user_id}")
-
-        curso = session.query(Curso).get(consulta.course_id)
-        print(f"   🎓 Curso: {curso.nombre if curso else 'No encontrado'}")
-        if not curso:
-            raise Exception("Curso no encontrado")
-
-        asistente_id = consulta.asistente_id
-        print(f"   🤖 Asistente ID: {asistente_id}")
-        if not asistente_id:
-            raise Exception("Asistente no configurado para el curso")
-
-        # === 1. OBTENER O CREAR HILO ===
-        hilo = session.query(Hilo).filter_by(
-            user_id=consulta.user_id,
-            course_id=consulta.course_id
-        ).first()
-
-        if not hilo:
-            try:
-                print("   🧵 No existe hilo, creando nuevo...")
-                thread = client.beta.threads.create()
-                hilo = Hilo(
-                    thread_id=thread.id,
-                    user_id=consulta.user_id,
-                    course_id=consulta.course_id,
-                    asistente_id=asistente_id
-                )
-                session.add(hilo)
-                session.commit()
-                logger.info(f"🧵 Hilo creado: {thread.id}")
-            except Exception as e:
-                logger.error(f"❌ Error creando hilo: {e}")
-                consulta.estado = "error"
-                consulta.respuesta = f"Error al crear conversación: {str(e)}"
-                session.commit()
-                return
-        else:
-            print(f"   🧵 Hilo existente: {hilo.thread_id}")
 
-        # === 2. ENVIAR A OPENAI ===
-        try:
+def _asignar_respuesta(consulta, respuesta, respuesta_html=None, render_version=None):
+    """Guarda la respuesta y su HTML; lo renderiza si no viene uno vigente."""
+    if not respuesta_html or render_version != RENDER_VERSION:
+        respuesta_html = renderizar_respuesta_html(respuesta)
+    consulta.respuesta = respuesta
+    consulta.respuesta_html = respuesta_html
+    consulta.render_version = RENDER_VERSION if respuesta_html else None
+    consulta.estado = "completado"
+    consulta.completado_en = db.func.now()
+
+def _consumir_stream(stream, acumulador, tiempos):
+    """
+    Recorre los eventos del run: reenvía los deltas de texto, mide cuánto
+    estuvo en cola y en progreso, y suma los tokens de file_search.
+    """
+    inicio = time.monotonic()
+    en_progreso = None
+    for evento in stream:
+        tipo = evento.event
+        if tipo == "thread.message.delta":
+            for bloque in evento.data.delta.content or []:
+                if bloque.type == "text" and bloque.text and bloque.text.value:
+                    acumulador.agregar(bloque.text.value)
+        elif tipo == "thread.run.in_progress" and en_progreso is None:
+            en_progreso = time.monotonic()
+            tiempos.sumar("run_en_cola", en_progreso - inicio)
+            evento_traza("run.en_progreso")
+        elif tipo == "thread.run.step.completed":
+            tiempos.registrar_paso(evento.data)
+    acumulador.vaciar()
+    tiempos.sumar("run_en_progreso", time.monotonic() - (en_progreso or inicio))
+    RUN_DURACION.observe(time.monotonic() - inicio)
+
+def _procesar_consulta(session, consulta):
+    """Cuerpo de procesar_consulta_individual: caché, similar o run de OpenAI."""
+    consulta_id = consulta.consulta_id
+    if consulta not in session:
+        consulta = session.merge(consulta)
+    tiempos = TiemposConsulta(consulta)
+    logger.info("🧵 Procesando consulta %s para usuario %s", consulta_id, consulta.user_id)
+
+    curso = session.query(Curso).get(consulta.course_id)
+    if not curso:
+        raise Exception("Curso no encontrado")
+
+    asistente_id = consulta.asistente_id
+    logger.debug("🤖 Consulta %s: curso %s, asistente %s", consulta_id, curso.course_id, asistente_id)
+    if not asistente_id:
+        raise Exception("Asistente no configurado para el curso")
+
+    # === 0. CACHÉ DE RESPUESTAS (pregunta idéntica, mismo corpus) ===
+    with tramo("consulta.cache"):
+        cacheada = buscar_respuesta_cacheada(consulta.course_id, asistente_id, consulta.pregunta)
+    if cacheada:
+        _asignar_respuesta(
+            consulta,
+            cacheada["respuesta"],
+            cacheada.get("respuesta_html"),
+            cacheada.get("render_version")
+        )
+        session.commit()
+        _notificar_final(consulta)
+        tiempos.guardar("cache")
+        logger.info("⚡ Consulta %s respondida desde caché", consulta_id)
+        return
+
+    # === 0b. PREGUNTA CASI IDÉNTICA YA RESPONDIDA (MinHash/LSH) ===
+    with tramo("consulta.similar"):
+        similar = buscar_respuesta_similar(consulta.course_id, asistente_id, consulta.pregunta)
+    if similar:
+        _asignar_respuesta(
+            consulta,
+            similar["respuesta"],
+            similar.get("respuesta_html"),
+            similar.get("render_version")
+        )
+        session.commit()
+        _notificar_final(consulta)
+        tiempos.guardar("similar")
+        logger.info(
+            "⚡ Consulta %s respondida con %s (similitud %.2f)",
+            consulta_id, similar["consulta_id"], similar["similitud"]
+        )
+        return
+
+    # === 1. OBTENER HILO VIGENTE (o rotarlo según la política) ===
+    try:
+        with tiempos.etapa("crear_hilo"):
+            hilo = obtener_hilo_vigente(
+                session, client, consulta.user_id, consulta.course_id, asistente_id
+            )
+    except Exception as e:
+        session.rollback()
+        logger.error("❌ Error creando hilo: %s", e)
+        consulta.estado = "error"
+        consulta.respuesta = f"Error al crear conversación: {str(e)}"
+        consulta.completado_en = db.func.now()
+        session.commit()
+        _notificar_final(consulta)
+        tiempos.guardar("error")
+        return
+    logger.debug("🧵 Consulta %s en el hilo %s", consulta_id, hilo.thread_id)
+
+    # === 2. ENVIAR A OPENAI ===
+    try:
+        with tiempos.etapa("crear_mensaje"):
             client.beta.threads.messages.create(
                 thread_id=hilo.thread_id,
                 role="user",
                 content=consulta.pregunta
             )
 
-            run = client.beta.threads.runs.create(
-                thread_id=hilo.thread_id,
-                assistant_id=asistente_id
-            )
-
-            while run.status in ["queued", "in_progress"]:
-                time.sleep(1)
-                run = client.beta.threads.runs.retrieve(
+        # Run en streaming: los deltas se reenvían al navegador vía SSE
+        acumulador = AcumuladorDeltas(consulta_id)
+        with tramo("openai.run", asistente_id=asistente_id, thread_id=hilo.thread_id), \
+                client.beta.threads.runs.stream(
                     thread_id=hilo.thread_id,
-                    run_id=run.id
-                )
-
-            if run.status != "completed":
-                raise Exception(f"Run falló: {run.last_error}")
-
-            messages = client.beta.threads.messages.list(thread_id=hilo.thread_id)
-            respuesta_recibida = None
-            for msg in messages:
-                if msg.role == "assistant":
-                    respuesta_recibida = msg.content[0].text.value
-                    break
-
-            if not respuesta_recibida:
-                raise Exception("No se recibió respuesta")
-
-            texto_limpio, fuentes = procesar_respuesta_con_fuentes(respuesta_recibida)
-
-            print(f"   🤖 Respuesta recibida: {respuesta_recibida[:100]}...")  # Muestra solo los primeros 100 caracteres
-            # === 3. ACTUALIZAR CONSULTA ===
-            try:
-                consulta.respuesta = texto_limpio
-                consulta.estado = "completado"
-                consulta.thread_id = hilo.thread_id
-                #print(f"   📦 Antes del commit: respuesta='{consulta.respuesta}'")
-                #session.flush() 
-                #session.commit()  # ✅ ¡Commit inmediato!
-                logger.info(f"✅ Respuesta guardada en DB")
-            except Exception as e:
-                session.rollback()
-                logger.error(f"❌ Error al guardar respuesta: {e}")
-
-            # === 4. GUARDAR MENSAJE ===
-            mensaje = Mensaje(
-                mensaje_id=f"msg_{int(time.time())}",
-                thread_id=hilo.thread_id,
-                pregunta=consulta.pregunta,
-                respuesta=texto_limpio,
-                fuentes=fuentes
-            )
-            session.add(mensaje)
-
-            # print consulta object
-            print(f" Consulta despues de guardar mensaje: {consulta.consulta_id}, estado: {consulta.estado}, respuesta: {consulta.respuesta}")
-            # === 5. ACTUALIZAR USO MENSUAL ===
-            mes = datetime.date.today().replace(day=1)
-            uso = session.query(UsoMensual).filter_by(
-                user_id=consulta.user_id,
-                course_id=consulta.course_id,
-                mes=mes
-            ).first()
-
-            if uso:
-                uso.total += 1
-            else:
-                nuevo_uso = UsoMensual(
-                    user_id=consulta.user_id,
-                    course_id=consulta.course_id,
-                    mes=mes,
-                    total=1
-                )
-                session.add(nuevo_uso)
-
-            # Imprimir el objeto consulta
-            print(f" Consulta despues de uso mensual: {consulta.consulta_id}, estado: {consulta.estado}, respuesta: {consulta.respuesta}")
-            session.commit()
-            logger.info(f"✅ Consulta {consulta_id} completada")
+                    assistant_id=asistente_id,
+                    **parametros_run()
+                ) as stream:
+            _consumir_stream(stream, acumulador, tiempos)
+            run = stream.get_final_run()
 
+        if run.status != "completed":
+            raise Exception(f"Run falló: {run.last_error}")
+
+        registrar_uso_hilo(hilo, run)
+        tiempos.registrar_uso(run)
+
+        # Solo el mensaje de este run (no el hilo completo)
+        with tiempos.etapa("obtener_mensaje"):
+            respuesta_recibida, citas = obtener_respuesta_run(client, hilo.thread_id, run.id)
+        if not respuesta_recibida:
+            raise Exception("No se recibió respuesta")
+
+        with tiempos.etapa("postproceso"):
+            citas = resolver_citas(consulta.course_id, citas)  # file_id → archivo de Canvas
+            texto_limpio, fuentes = procesar_respuesta_con_fuentes(respuesta_recibida, citas)
+
+        logger.debug("🤖 Respuesta recibida para %s: %d caracteres, %d citas",
+                     consulta_id, len(respuesta_recibida), len(citas))
+        # === 3. ACTUALIZAR CONSULTA ===
+        try:
+            with tiempos.etapa("postproceso"):  # incluye el render a HTML
+                _asignar_respuesta(consulta, texto_limpio)
+            consulta.thread_id = hilo.thread_id
+            #session.flush() 
+            #session.commit()  # ✅ ¡Commit inmediato!
+            logger.info("✅ Respuesta guardada en DB")
         except Exception as e:
             session.rollback()
-            logger.error(f"❌ Error con OpenAI: {e}")
-            if consulta.estado != "error":
-                consulta.estado = "error"   
-                consulta.respuesta = str(e)
-                session.commit()
+            logger.error("❌ Error al guardar respuesta: %s", e)
+
+        # === 4. GUARDAR MENSAJE ===
+        mensaje = Mensaje(
+            mensaje_id=generar_id("msg"),
+            thread_id=hilo.thread_id,
+            pregunta=consulta.pregunta,
+            respuesta=texto_limpio,
+            fuentes=fuentes
+        )
+        session.add(mensaje)
+
+        # El uso mensual ya se contó al enviar la pregunta (registrar_consulta)
+        with tiempos.etapa("commit"):
+            session.commit()
+        _notificar_final(consulta)
+        tiempos.guardar("openai")
+        logger.info("✅ Consulta %s completada", consulta_id)
+
+        guardar_respuesta_cacheada(
+            consulta.course_id, asistente_id, consulta.pregunta, texto_limpio, fuentes,
+            consulta.respuesta_html, consulta.render_version
+        )
+        registrar_pregunta_respondida(
+            consulta.course_id, asistente_id, consulta.consulta_id, consulta.pregunta
+        )
 
     except Exception as e:
-        logger.error(f"❌ Error procesando {consulta_id}: {e}")
+        session.rollback()
+        logger.error("❌ Error con OpenAI: %s", e)
+        if consulta.estado != "error":
+            consulta.estado = "error"   
+            consulta.respuesta = str(e)
+            consulta.completado_en = db.func.now()
+            session.commit()
+            _notificar_final(consulta)
+            tiempos.guardar("error")
+
+def procesar_consulta_individual(consulta_id):
+    """Procesa una consulta individual dentro de un app_context"""
+    session = db.session()
+    try:
+        consulta = session.query(HistorialConsulta).get(consulta_id)
+        # "procesando" = reclamada por este worker en procesar_nuevas_consultas
+        if not consulta or consulta.estado not in ("pendiente", "procesando"):
+            return
+        # El plazo de recuperar_consultas_colgadas corre desde que empieza a ejecutarse
+        consulta.reclamada_en = datetime.datetime.utcnow()
+        session.commit()
+
+        # Continúa la traza abierta en el formulario (si la hay)
+        with tramo("consulta.procesar", padre=consulta.traceparent,
+                   consulta_id=consulta_id, course_id=consulta.course_id):
+            _procesar_consulta(session, consulta)
+
+    except Exception as e:
+        logger.error("❌ Error procesando %s: %s", consulta_id, e)
         session.rollback()
     finally:
         session.close()  # ✅ Cierra la sesión
 
-def procesar_nuevas_consultas():
-    """Busca y procesa consultas pendientes (una por una, seguro)"""
+def reclamar_consulta(consulta_id):
+    """
+    Marca la consulta como 'procesando' solo si sigue pendiente.
+    El UPDATE condicional evita que dos workers tomen la misma consulta.
+    """
+    reclamadas = HistorialConsulta.query \
+        .filter_by(consulta_id=consulta_id, estado="pendiente") \
+        .update({
+            "estado": "procesando",
+            "reclamada_en": datetime.datetime.utcnow(),
+            "intentos": HistorialConsulta.intentos + 1
+        }, synchronize_session=False)
+    db.session.commit()
+    return reclamadas == 1
+
+_ultima_recuperacion = 0
+
+def recuperar_consultas_colgadas():
+    """
+    Devuelve a 'pendiente' las consultas que llevan más de CONSULTA_TIMEOUT_PROCESANDO
+    en 'procesando' (el worker que las reclamó murió o se redeployó). Las que ya
+    se reclamaron CONSULTA_MAX_INTENTOS veces se marcan 'error'.
+    Se ejecuta como mucho una vez por minuto.
+    """
+    global _ultima_recuperacion
+    ahora = time.time()
+    if ahora - _ultima_recuperacion < 60:
+        return
+    _ultima_recuperacion = ahora
+
+    limite = datetime.datetime.utcnow() - datetime.timedelta(seconds=CONSULTA_TIMEOUT_PROCESANDO)
+    colgadas = HistorialConsulta.query \
+        .with_entities(HistorialConsulta.consulta_id, HistorialConsulta.reclamada_en, HistorialConsulta.intentos) \
+        .filter(
+            HistorialConsulta.estado == "procesando",
+            or_(HistorialConsulta.reclamada_en.is_(None), HistorialConsulta.reclamada_en < limite)
+        ) \
+        .all()
+
+    for colgada in colgadas:
+        agotada = (colgada.intentos or 0) >= CONSULTA_MAX_INTENTOS
+        cambios = {"estado": "pendiente", "reclamada_en": None}
+        if agotada:
+            cambios = {
+                "estado": "error",
+                "respuesta": "La consulta no pudo procesarse, intenta nuevamente.",
+                "completado_en": db.func.now()
+            }
+        # Condicional: si otro worker ya la recuperó o la terminó, no se toca
+        actualizadas = HistorialConsulta.query \
+            .filter_by(consulta_id=colgada.consulta_id, estado="procesando", reclamada_en=colgada.reclamada_en) \
+            .update(cambios, synchronize_session=False)
+        db.session.commit()
+        if not actualizadas:
+            continue
+        if agotada:
+            logger.warning("⚠️ Consulta %s marcada error tras %s intentos", colgada.consulta_id, colgada.intentos)
+            publicar_final(colgada.consulta_id, "error", cambios["respuesta"], None)
+        else:
+            logger.warning("♻️ Consulta %s colgada en 'procesando', vuelve a la cola", colgada.consulta_id)
+
+def procesar_nuevas_consultas(despachador=None):
+    """
+    Busca consultas pendientes y las reclama.
+    Con `despachador` se procesan en paralelo (serializadas por hilo) y solo se
+    reclaman las que pueden empezar ya: tantas como lugares libres tenga y ninguna
+    de un hilo ocupado. Así ninguna consulta reclamada espera en un buzón (y otro
+    worker las puede tomar). Sin despachador, una por una en el hilo actual.
+    """
     # Esta función será llamada por el worker con app_context
-    pendientes = HistorialConsulta.query.filter_by(estado="pendiente").all()
+    consultas = HistorialConsulta.query \
+        .with_entities(HistorialConsulta.consulta_id, HistorialConsulta.user_id, HistorialConsulta.course_id) \
+        .filter_by(estado="pendiente") \
+        .order_by(HistorialConsulta.timestamp)
+    if despachador is not None:
+        libres = despachador.libres()
+        if not libres:
+            return
+        for clave in despachador.claves_en_curso():
+            user_id, course_id = clave.rsplit(":", 1)
+            consultas = consultas.filter(or_(
+                HistorialConsulta.user_id != user_id,
+                HistorialConsulta.course_id != course_id
+            ))
+        consultas = consultas.limit(libres)
+    pendientes = consultas.all()
     if not pendientes:
         return
 
-    logger.info(f"📩 Iniciando procesamiento de {len(pendientes)} consultas pendientes")
+    logger.info("📩 Iniciando procesamiento de %s consultas pendientes", len(pendientes))
 
-    # ✅ Procesar una por una (más seguro que ThreadPool)
+    claves_reclamadas = set()
     for consulta in pendientes:
+        # El hilo de OpenAI es único por (usuario, curso)
+        clave_hilo = f"{consulta.user_id}:{consulta.course_id}"
+        if despachador is not None and clave_hilo in claves_reclamadas:
+            continue  # Va después de la anterior del mismo hilo: en el próximo ciclo
         try:
-            procesar_consulta_individual(consulta.consulta_id)  # Usa la app registrada
+            if not reclamar_consulta(consulta.consulta_id):
+                continue  # Otro worker la tomó
+            if despachador is None:
+                procesar_consulta_individual(consulta.consulta_id)
+            else:
+                claves_reclamadas.add(clave_hilo)
+                despachador.enviar(clave_hilo, consulta.consulta_id)
         except Exception as e:
-            logger.error(f"❌ Error procesando {consulta.consulta_id}: {e}")
-
-    
\ No newline at end of file
+            db.session.rollback()
+            logger.error("❌ Error procesando %s: %s", consulta.consulta_id, e)
@@ -0,0 +1,98 @@
+# worker/services/despachador.py
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from sqlalchemy import text
+from shared.models.db import db
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def bloqueo_hilo(clave):
+    """
+    Bloqueo consultivo de Postgres por hilo de conversación: serializa el
+    trabajo sobre el mismo thread de OpenAI entre procesos y máquinas.
+    En otros motores (SQLite local) no bloquea nada.
+    """
+    if db.engine.dialect.name != "postgresql":
+        yield
+        return
+
+    conn = db.engine.connect()
+    try:
+        conn.execute(text("SELECT pg_advisory_lock(hashtext(:clave))"), {"clave": clave})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext(:clave))"), {"clave": clave})
+    finally:
+        conn.close()
+
+
+class DespachadorConsultas:
+    """
+    Ejecuta consultas en paralelo con un buzón por hilo de conversación:
+    las del mismo hilo se procesan en orden, una a la vez; las de hilos
+    distintos corren en paralelo hasta `max_workers`.
+    """
+
+    def __init__(self, app, procesar, max_workers=4):
+        self.app = app
+        self.procesar = procesar
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consulta")
+        self._buzones = {}  # clave de hilo -> deque de consulta_id
+        self._ejecutando = 0  # consultas ya sacadas de su buzón que aún no terminan
+        self._lock = threading.Lock()
+
+    def enviar(self, clave, consulta_id):
+        """Encola la consulta en el buzón de su hilo."""
+        with self._lock:
+            buzon = self._buzones.get(clave)
+            if buzon is not None:
+                # Ya hay alguien drenando este hilo: se procesará después
+                buzon.append(consulta_id)
+                return
+            self._buzones[clave] = deque([consulta_id])
+        self.executor.submit(self._drenar, clave)
+
+    def _drenar(self, clave):
+        while True:
+            with self._lock:
+                buzon = self._buzones[clave]
+                if not buzon:
+                    del self._buzones[clave]
+                    return
+                consulta_id = buzon.popleft()
+                self._ejecutando += 1
+
+            try:
+                with self.app.app_context():
+                    with bloqueo_hilo(clave):
+                        self.procesar(consulta_id)
+            except Exception as e:
+                logger.error("❌ Error procesando %s: %s", consulta_id, e)
+            finally:
+                with self._lock:
+                    self._ejecutando -= 1
+
+    def en_curso(self):
+        """Cantidad de consultas reclamadas que aún no terminan."""
+        with self._lock:
+            return sum(len(b) for b in self._buzones.values()) + self._ejecutando
+
+    def libres(self):
+        """Consultas que se pueden reclamar sin que ninguna quede esperando un hilo libre."""
+        return max(self.max_workers - self.en_curso(), 0)
+
+    def claves_en_curso(self):
+        """Hilos de conversación con una consulta en proceso."""
+        with self._lock:
+            return set(self._buzones)
+
+    def cerrar(self):
+        """Espera a las consultas en proceso; las encoladas que no empezaron se descartan."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,80 @@
+# worker/services/fuentes_service.py
+import logging
+import threading
+from shared.models.db import ArchivoProcesado
+from shared.config import CANVAS_WEB_URL
+
+logger = logging.getLogger(__name__)
+
+# course_id -> {file_id_openai: {"canvas_file_id", "nombre", "url"}}
+_indices = {}
+_lock = threading.Lock()
+
+
+def _url_canvas(course_id, canvas_file_id):
+    return f"{CANVAS_WEB_URL}/courses/{course_id}/files/{canvas_file_id}"
+
+
+def _entrada(registro):
+    return {
+        "canvas_file_id": registro.canvas_file_id,
+        "nombre": registro.filename,
+        "url": _url_canvas(registro.course_id, registro.canvas_file_id)
+    }
+
+
+def _filas(course_id, canvas_file_ids=None):
+    consulta = ArchivoProcesado.query.with_entities(
+        ArchivoProcesado.canvas_file_id,
+        ArchivoProcesado.course_id,
+        ArchivoProcesado.filename,
+        ArchivoProcesado.file_id_openai
+    ).filter(ArchivoProcesado.course_id == course_id)
+    if canvas_file_ids is not None:
+        consulta = consulta.filter(ArchivoProcesado.canvas_file_id.in_(list(canvas_file_ids)))
+    return consulta.all()
+
+
+def obtener_indice_curso(course_id):
+    """Índice file_id de OpenAI → archivo de Canvas del curso (se carga una vez)."""
+    indice = _indices.get(course_id)
+    if indice is not None:
+        return indice
+
+    with _lock:
+        indice = _indices.get(course_id)
+        if indice is None:
+            indice = {r.file_id_openai: _entrada(r) for r in _filas(course_id)}
+            _indices[course_id] = indice
+            logger.info(f"🗂️ Índice de archivos del curso {course_id}: {len(indice)} archivos")
+    return indice
+
+
+def refrescar_indice_curso(course_id, canvas_file_ids):
+    """
+    Agrega al índice los archivos recién sincronizados.
+    Si el curso aún no estaba cargado, no hace nada: se cargará completo al usarse.
+    """
+    if course_id not in _indices or not canvas_file_ids:
+        return
+    nuevas = {r.file_id_openai: _entrada(r) for r in _filas(course_id, canvas_file_ids)}
+    with _lock:
+        # Se conservan los file_id anteriores: siguen apuntando al mismo archivo de Canvas
+        _indices[course_id] = {**_indices[course_id], **nuevas}
+
+
+def resolver_citas(course_id, citas):
+    """
+    Completa cada cita ({"file_id", "nombre", ...}) con el archivo de Canvas
+    que le corresponde: canvas_file_id, nombre original en la DB y URL.
+    """
+    if not citas:
+        return citas
+    indice = obtener_indice_curso(course_id)
+    resueltas = []
+    for cita in citas:
+        archivo = indice.get(cita.get("file_id"))
+        if archivo:
+            cita = {**cita, **archivo}
+        resueltas.append(cita)
+    return resueltas
@@ -0,0 +1,115 @@
+# worker/services/hilo_service.py
+import datetime
+import logging
+from shared.models.db import Hilo, Mensaje
+from shared.config import (
+    HILO_MAX_MENSAJES,
+    HILO_MAX_TOKENS_CONTEXTO,
+    HILO_MAX_DIAS,
+    HILO_TRUNCAR_ULTIMOS,
+    HILO_MAX_PROMPT_TOKENS,
+    HILO_RESUMEN_MENSAJES
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_CARACTERES_RESUMEN = 300  # por respuesta arrastrada
+
+
+def motivo_rotacion(hilo, ahora=None):
+    """
+    Indica por qué hay que rotar el hilo (o None si sigue vigente):
+    demasiados mensajes, contexto demasiado grande o demasiado antiguo.
+    """
+    ahora = ahora or datetime.datetime.utcnow()
+    if HILO_MAX_MENSAJES and (hilo.mensajes_total or 0) >= HILO_MAX_MENSAJES:
+        return f"{hilo.mensajes_total} mensajes"
+    if HILO_MAX_TOKENS_CONTEXTO and (hilo.tokens_contexto or 0) >= HILO_MAX_TOKENS_CONTEXTO:
+        return f"{hilo.tokens_contexto} tokens de contexto"
+    if HILO_MAX_DIAS and hilo.creado_en and ahora - hilo.creado_en >= datetime.timedelta(days=HILO_MAX_DIAS):
+        return f"más de {HILO_MAX_DIAS} días"
+    return None
+
+
+def construir_resumen(session, thread_id):
+    """
+    Resumen local (sin llamar a OpenAI) de las últimas preguntas del hilo,
+    para arrastrar algo de contexto al hilo nuevo.
+    """
+    if not HILO_RESUMEN_MENSAJES:
+        return None
+
+    ultimos = session.query(Mensaje.pregunta, Mensaje.respuesta) \
+        .filter(Mensaje.thread_id == thread_id) \
+        .order_by(Mensaje.timestamp.desc()) \
+        .limit(HILO_RESUMEN_MENSAJES) \
+        .all()
+    if not ultimos:
+        return None
+
+    lineas = ["Resumen de la conversación anterior con este estudiante:"]
+    for m in reversed(ultimos):
+        respuesta = (m.respuesta or "").strip()
+        if len(respuesta) > MAX_CARACTERES_RESUMEN:
+            respuesta = respuesta[:MAX_CARACTERES_RESUMEN] + "…"
+        lineas.append(f"- Pregunta: {m.pregunta.strip()}\n  Respuesta: {respuesta}")
+    return "\n".join(lineas)
+
+
+def obtener_hilo_vigente(session, client, user_id, course_id, asistente_id):
+    """
+    Devuelve el hilo activo del estudiante en el curso.
+    Si no existe o la política indica rotarlo, crea uno nuevo en OpenAI
+    (con el resumen del anterior como primer mensaje) y desactiva el viejo.
+    """
+    hilo = session.query(Hilo).filter_by(
+        user_id=user_id,
+        course_id=course_id,
+        activo=True
+    ).order_by(Hilo.creado_en.desc()).first()
+
+    resumen = None
+    if hilo:
+        motivo = motivo_rotacion(hilo)
+        if not motivo:
+            return hilo
+        logger.info("♻️ Rotando hilo %s (%s)", hilo.thread_id, motivo)
+        resumen = construir_resumen(session, hilo.thread_id)
+        hilo.activo = False
+
+    mensajes_iniciales = [{"role": "assistant", "content": resumen}] if resumen else []
+    thread = client.beta.threads.create(messages=mensajes_iniciales)
+    nuevo = Hilo(
+        thread_id=thread.id,
+        user_id=user_id,
+        course_id=course_id,
+        asistente_id=asistente_id,
+        activo=True,
+        mensajes_total=0,
+        tokens_contexto=0
+    )
+    session.add(nuevo)
+    session.commit()
+    logger.info("🧵 Hilo creado: %s", thread.id)
+    return nuevo
+
+
+def parametros_run():
+    """Límites de contexto que se aplican a cada run sobre un hilo reutilizado."""
+    parametros = {}
+    if HILO_TRUNCAR_ULTIMOS:
+        parametros["truncation_strategy"] = {
+            "type": "last_messages",
+            "last_messages": HILO_TRUNCAR_ULTIMOS
+        }
+    if HILO_MAX_PROMPT_TOKENS:
+        parametros["max_prompt_tokens"] = HILO_MAX_PROMPT_TOKENS
+    return parametros
+
+
+def registrar_uso_hilo(hilo, run):
+    """Actualiza los contadores que usa la política de rotación."""
+    hilo.mensajes_total = (hilo.mensajes_total or 0) + 1
+    usage = getattr(run, "usage", None)
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        hilo.tokens_contexto = usage.prompt_tokens
@@ -1,9 +1,9 @@
 # worker/services/mapa_service.py
-from openai import OpenAI
-from shared.config import OPENAI_API_KEY
+from shared.helpers.openai_cliente import obtener_openai
+from openai_utils.respuestas import obtener_respuesta_run
 import time
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = obtener_openai()
 
 def generar_mapa_mental(contenido):
     """Genera un mapa mental en Mermaid.js a partir de contenido"""
@@ -23,7 +23,7 @@ def generar_mapa_mental(contenido):
             time.sleep(1)
             run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
 
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        return messages.data[0].content[0].text.value
+        texto, _ = obtener_respuesta_run(client, thread.id, run.id)
+        return texto
     except Exception as e:
         return f"❌ Error: {e}"
\ No newline at end of file
@@ -1,12 +1,15 @@
 # worker/services/procesamiento_service.py
-from openai import OpenAI
-from shared.config import OPENAI_API_KEY, TEMP_DIR
+from shared.helpers.openai_cliente import obtener_openai
+from shared.config import TEMP_DIR
 from shared.models.db_services import obtener_asistente_interno_por_subtipo
+from openai_utils.respuestas import obtener_respuesta_run
 import os
 import time
+import logging
 
+logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = obtener_openai()
 
 def analizar_codigo_con_asistente(path, asistente_id):
     """
@@ -20,7 +23,7 @@ def analizar_codigo_con_asistente(path, asistente_id):
         if len(contenido) > 100_000:
             contenido = contenido[:100_000] + "\n\n... (truncado)"
 
-        print(f"🧠 Enviando código a {asistente_id} para análisis...")
+        logger.info(f"🧠 Enviando código a {asistente_id} para análisis...")
 
         # Crear thread
         thread = client.beta.threads.create()
@@ -47,13 +50,9 @@ def analizar_codigo_con_asistente(path, asistente_id):
         if run.status == "failed":
             raise Exception(f"Run falló: {run.last_error}")
 
-        # Obtener respuesta
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        for msg in messages:
-            if msg.role == "assistant":
-                return msg.content[0].text.value
-
-        raise Exception("No se recibió respuesta del asistente")
+        # Obtener respuesta (solo el mensaje de este run)
+        texto, _ = obtener_respuesta_run(client, thread.id, run.id)
+        return texto
 
     except Exception as e:
         raise Exception(f"Error al analizar código con asistente: {e}")
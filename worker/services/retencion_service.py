@@ -0,0 +1,140 @@
+# worker/services/retencion_service.py
+import datetime
+import logging
+import os
+import time
+from sqlalchemy import text
+from shared.models.db import db
+from shared.models.particiones import (
+    TABLAS_PARTICIONADAS,
+    es_particionada,
+    crear_particion_mes,
+    listar_particiones_mensuales,
+    inicio_mes,
+    sumar_meses
+)
+from shared.helpers.archivo_historico import (
+    archivo_disponible,
+    contar_filas_archivo,
+    exportar_parquet,
+    ruta_archivo
+)
+from shared.config import (
+    RETENCION_HABILITADA,
+    RETENCION_MESES,
+    PARTICIONES_MESES_ADELANTE,
+    DIRECTORIO_ARCHIVO
+)
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_RETENCION = 6 * 3600  # segundos entre ejecuciones
+ultima_ejecucion = 0
+
+
+def _archivar(conn, tabla, origen, mes, filtro="", parametros=None):
+    """
+    Exporta las filas de `origen` a Parquet y verifica el conteo.
+    Retorna True si el archivo quedó completo (y se puede borrar de la DB).
+    """
+    ruta = ruta_archivo(tabla, mes)
+    if os.path.exists(ruta):
+        # Ya exportado en una ejecución anterior que no alcanzó a borrar
+        logger.info(f"📦 {ruta} ya existe, se reutiliza")
+    else:
+        exportar_parquet(conn, tabla, text(f"SELECT * FROM {origen} {filtro}"), parametros or {}, ruta)
+
+    en_db = conn.execute(text(f"SELECT COUNT(*) FROM {origen} {filtro}"), parametros or {}).scalar()
+    try:
+        en_archivo = contar_filas_archivo(ruta)
+    except Exception as e:
+        logger.error("❌ %s no se puede leer (%s); no se borra", ruta, e)
+        os.remove(ruta)
+        return False
+    if en_archivo != en_db:
+        logger.error(f"❌ {ruta}: {en_archivo} filas archivadas y {en_db} en la DB; no se borra")
+        os.remove(ruta)  # se vuelve a exportar en la próxima ejecución
+        return False
+    logger.info(f"📦 {tabla} {mes:%Y-%m}: {en_archivo} filas → {ruta}")
+    return True
+
+
+def _retener_particionada(tabla, limite):
+    """Crea las particiones futuras y archiva/desacopla las cerradas anteriores a `limite`."""
+    with db.engine.begin() as conn:
+        mes = inicio_mes(datetime.date.today())
+        for i in range(PARTICIONES_MESES_ADELANTE + 1):
+            crear_particion_mes(conn, tabla, sumar_meses(mes, i))
+
+    with db.engine.connect() as conn:
+        particiones = listar_particiones_mensuales(conn, tabla)
+
+    for nombre, mes in particiones:
+        if mes >= limite:
+            break
+        with db.engine.begin() as conn:
+            if not _archivar(conn, tabla, nombre, mes):
+                continue
+            conn.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {nombre}"))
+            conn.execute(text(f"DROP TABLE {nombre}"))
+
+
+def _retener_por_rango(tabla, limite):
+    """Sin particiones (SQLite): archiva y borra mes a mes las filas anteriores a `limite`."""
+    with db.engine.connect() as conn:
+        mas_antigua = conn.execute(text(f'SELECT MIN("timestamp") FROM {tabla}')).scalar()
+    if not mas_antigua:
+        return
+    if isinstance(mas_antigua, str):
+        mas_antigua = datetime.datetime.fromisoformat(mas_antigua)
+
+    mes = inicio_mes(mas_antigua)
+    while mes < limite:
+        siguiente = sumar_meses(mes, 1)
+        filtro = 'WHERE "timestamp" >= :desde AND "timestamp" < :hasta'
+        parametros = {
+            "desde": datetime.datetime.combine(mes, datetime.time()),
+            "hasta": datetime.datetime.combine(siguiente, datetime.time())
+        }
+        with db.engine.begin() as conn:
+            hay_filas = conn.execute(text(f"SELECT 1 FROM {tabla} {filtro} LIMIT 1"), parametros).first()
+            if hay_filas and _archivar(conn, tabla, tabla, mes, filtro, parametros):
+                conn.execute(text(f"DELETE FROM {tabla} {filtro}"), parametros)
+        mes = siguiente
+
+
+def aplicar_retencion():
+    """
+    Mantiene acotadas las tablas calientes (historial_consultas, mensajes):
+    los meses anteriores a RETENCION_MESES se exportan a Parquet (zstd) y
+    se sacan de la DB. Se ejecuta cada INTERVALO_RETENCION, solo con
+    RETENCION_HABILITADA y un DIRECTORIO_ARCHIVO absoluto (volumen compartido).
+    """
+    global ultima_ejecucion
+    if not RETENCION_HABILITADA:
+        return
+    ahora = time.time()
+    if ahora - ultima_ejecucion < INTERVALO_RETENCION:
+        return
+    ultima_ejecucion = ahora
+
+    if not archivo_disponible():
+        logger.warning("⚠️ pyarrow no está instalado: se omite el archivo histórico")
+        return
+    if not os.path.isabs(DIRECTORIO_ARCHIVO):
+        # Una ruta relativa queda en el disco efímero del worker: lo archivado se perdería
+        logger.warning("⚠️ DIRECTORIO_ARCHIVO=%s no es una ruta absoluta: se omite la retención",
+                       DIRECTORIO_ARCHIVO)
+        return
+
+    limite = sumar_meses(inicio_mes(datetime.date.today()), -RETENCION_MESES)
+    for tabla in TABLAS_PARTICIONADAS:
+        try:
+            with db.engine.connect() as conn:
+                particionada = es_particionada(conn, tabla)
+            if particionada:
+                _retener_particionada(tabla, limite)
+            else:
+                _retener_por_rango(tabla, limite)
+        except Exception as e:
+            logger.error(f"❌ Error en la retención de {tabla}: {e}")
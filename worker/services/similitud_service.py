@@ -0,0 +1,252 @@
+# worker/services/similitud_service.py
+import logging
+import random
+import threading
+import zlib
+from collections import OrderedDict
+from sqlalchemy import func
+from shared.models.db import db, HistorialConsulta, ArchivoProcesado
+from shared.config import SIMILITUD_UMBRAL, SIMILITUD_UMBRAL_DIRECTO, SIMILITUD_MAX_POR_CURSO
+from shared.helpers.helpers import normalizar_pregunta
+from shared.helpers.cache import obtener_version_corpus
+
+logger = logging.getLogger(__name__)
+
+# === PARÁMETROS MINHASH / LSH ===
+NUM_PERMUTACIONES = 128
+BANDAS = 32                      # 32 bandas x 4 filas → umbral LSH ≈ 0.42
+FILAS_POR_BANDA = NUM_PERMUTACIONES // BANDAS
+TAM_SHINGLE = 4
+_PRIMO = (1 << 61) - 1
+# Palabras que cambian el sentido aunque el texto casi no cambie
+PALABRAS_NEGACION = {
+    "no", "sin", "ni", "nunca", "jamas", "tampoco", "nada", "nadie",
+    "ningun", "ninguna", "ninguno", "excepto", "salvo"
+}
+_MAX_HASH = (1 << 32) - 1
+
+# Coeficientes fijos: las firmas son comparables entre procesos y reinicios
+_rng = random.Random(20250701)
+_COEFICIENTES = [
+    (_rng.randrange(1, _PRIMO), _rng.randrange(0, _PRIMO))
+    for _ in range(NUM_PERMUTACIONES)
+]
+
+
+def _shingles(texto):
+    """Conjunto de 4-gramas de caracteres (hasheados) del texto normalizado."""
+    texto = f" {normalizar_pregunta(texto)} "
+    if len(texto) <= TAM_SHINGLE:
+        return {zlib.crc32(texto.encode("utf-8"))}
+    return {
+        zlib.crc32(texto[i:i + TAM_SHINGLE].encode("utf-8"))
+        for i in range(len(texto) - TAM_SHINGLE + 1)
+    }
+
+
+def calcular_firma(texto):
+    """Firma MinHash de NUM_PERMUTACIONES valores."""
+    shingles = _shingles(texto)
+    return tuple(
+        min(((a * h + b) % _PRIMO) & _MAX_HASH for h in shingles)
+        for a, b in _COEFICIENTES
+    )
+
+
+def tokens_criticos(texto):
+    """Números y negaciones de la pregunta: "tarea 3" y "tarea 4" se parecen en 4-gramas pero no son la misma."""
+    return sorted(
+        palabra for palabra in normalizar_pregunta(texto).split()
+        if palabra in PALABRAS_NEGACION or any(c.isdigit() for c in palabra)
+    )
+
+
+def similitud_estimada(firma_a, firma_b):
+    """Estimación de Jaccard: fracción de posiciones iguales."""
+    iguales = sum(1 for x, y in zip(firma_a, firma_b) if x == y)
+    return iguales / NUM_PERMUTACIONES
+
+
+class IndiceLSH:
+    """
+    Índice LSH de las preguntas respondidas de un curso.
+    Guarda solo firmas e IDs; la respuesta se lee de la DB al acertar.
+    """
+
+    def __init__(self, version_corpus=0, max_items=SIMILITUD_MAX_POR_CURSO):
+        self.version_corpus = version_corpus
+        self.max_items = max_items
+        self._entradas = OrderedDict()  # consulta_id -> {firma, asistente_id, vigente}
+        self._buckets = [dict() for _ in range(BANDAS)]
+        self._lock = threading.Lock()
+
+    def _claves_banda(self, firma):
+        for i in range(BANDAS):
+            inicio = i * FILAS_POR_BANDA
+            yield i, hash(firma[inicio:inicio + FILAS_POR_BANDA])
+
+    def agregar(self, consulta_id, asistente_id, firma, vigente=True):
+        with self._lock:
+            if consulta_id in self._entradas:
+                return
+            self._entradas[consulta_id] = {
+                "firma": firma,
+                "asistente_id": asistente_id,
+                "vigente": vigente
+            }
+            for i, clave in self._claves_banda(firma):
+                self._buckets[i].setdefault(clave, set()).add(consulta_id)
+
+            while len(self._entradas) > self.max_items:
+                viejo_id, viejo = self._entradas.popitem(last=False)
+                for i, clave in self._claves_banda(viejo["firma"]):
+                    bucket = self._buckets[i].get(clave)
+                    if bucket:
+                        bucket.discard(viejo_id)
+                        if not bucket:
+                            del self._buckets[i][clave]
+
+    def marcar_obsoletas(self, version_corpus):
+        """El corpus cambió: las respuestas previas quedan solo como sugerencia."""
+        with self._lock:
+            for entrada in self._entradas.values():
+                entrada["vigente"] = False
+            self.version_corpus = version_corpus
+
+    def buscar(self, firma, asistente_id=None, umbral=SIMILITUD_UMBRAL, limite=3):
+        """Candidatos de los buckets LSH, ordenados por similitud estimada."""
+        with self._lock:
+            candidatos = set()
+            for i, clave in self._claves_banda(firma):
+                candidatos |= self._buckets[i].get(clave, set())
+
+            resultados = []
+            for consulta_id in candidatos:
+                entrada = self._entradas[consulta_id]
+                if asistente_id and entrada["asistente_id"] != asistente_id:
+                    continue
+                similitud = similitud_estimada(firma, entrada["firma"])
+                if similitud >= umbral:
+                    resultados.append({
+                        "consulta_id": consulta_id,
+                        "similitud": similitud,
+                        "vigente": entrada["vigente"]
+                    })
+
+        resultados.sort(key=lambda r: r["similitud"], reverse=True)
+        return resultados[:limite]
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+_indices = {}
+_indices_lock = threading.Lock()  # solo para leer/reemplazar entradas de _indices
+_construcciones = {}  # course_id -> Lock: un solo hilo construye el índice de cada curso
+
+
+def _construir_indice(course_id):
+    """Carga las consultas completadas más recientes del curso en un índice nuevo."""
+    version = obtener_version_corpus(course_id)
+    indice = IndiceLSH(version_corpus=version)
+
+    # Las respuestas anteriores al último cambio de materiales no se sirven directo
+    corte = db.session.query(func.max(ArchivoProcesado.updated_at)) \
+        .filter(ArchivoProcesado.course_id == course_id) \
+        .scalar()
+
+    filas = db.session.query(
+        HistorialConsulta.consulta_id,
+        HistorialConsulta.asistente_id,
+        HistorialConsulta.pregunta,
+        HistorialConsulta.timestamp
+    ).filter(
+        HistorialConsulta.course_id == course_id,
+        HistorialConsulta.estado == "completado",
+        HistorialConsulta.respuesta.isnot(None)
+    ).order_by(HistorialConsulta.timestamp.desc()) \
+     .limit(indice.max_items) \
+     .all()
+
+    for fila in reversed(filas):
+        vigente = corte is None or (fila.timestamp is not None and fila.timestamp >= corte)
+        indice.agregar(fila.consulta_id, fila.asistente_id, calcular_firma(fila.pregunta), vigente)
+
+    logger.info("🧮 Índice LSH del curso %s: %s preguntas", course_id, len(indice))
+    return indice
+
+
+def obtener_indice(course_id):
+    """
+    Índice del curso, construido al primer uso y ajustado si cambia el corpus.
+    La construcción (consulta a la DB y firmas) corre fuera de `_indices_lock`:
+    las consultas de otros cursos no la esperan, y las del mismo curso esperan
+    a la que ya está en marcha en vez de repetirla.
+    """
+    with _indices_lock:
+        indice = _indices.get(course_id)
+        if indice is None:
+            construccion = _construcciones.setdefault(course_id, threading.Lock())
+
+    if indice is None:
+        with construccion:
+            with _indices_lock:
+                indice = _indices.get(course_id)  # la pudo terminar otro hilo
+            if indice is None:
+                indice = _construir_indice(course_id)
+                with _indices_lock:
+                    _indices[course_id] = indice
+                    _construcciones.pop(course_id, None)
+        return indice
+
+    version = obtener_version_corpus(course_id)
+    if version != indice.version_corpus:
+        indice.marcar_obsoletas(version)
+    return indice
+
+
+def buscar_preguntas_similares(course_id, asistente_id, pregunta, umbral=SIMILITUD_UMBRAL, limite=3):
+    """
+    Busca preguntas ya respondidas parecidas a `pregunta`.
+    Retorna [{consulta_id, similitud, vigente}] de mayor a menor similitud.
+    """
+    indice = obtener_indice(course_id)
+    return indice.buscar(calcular_firma(pregunta), asistente_id, umbral, limite)
+
+
+def buscar_respuesta_similar(course_id, asistente_id, pregunta):
+    """
+    Devuelve la respuesta de una pregunta casi idéntica si la confianza
+    supera SIMILITUD_UMBRAL_DIRECTO, sigue vigente y tiene los mismos números
+    y negaciones; si no, None.
+    """
+    for candidato in buscar_preguntas_similares(course_id, asistente_id, pregunta, limite=1):
+        if candidato["vigente"] and candidato["similitud"] >= SIMILITUD_UMBRAL_DIRECTO:
+            previa = HistorialConsulta.query.get(candidato["consulta_id"])
+            if previa and tokens_criticos(previa.pregunta) != tokens_criticos(pregunta):
+                logger.info(
+                    "💡 Pregunta similar a %s (similitud %.2f) con otros números o negaciones, "
+                    "se consulta a OpenAI", candidato["consulta_id"], candidato["similitud"]
+                )
+                continue
+            if previa and previa.estado == "completado" and previa.respuesta:
+                return {
+                    "consulta_id": previa.consulta_id,
+                    "respuesta": previa.respuesta,
+                    "respuesta_html": previa.respuesta_html,
+                    "render_version": previa.render_version,
+                    "similitud": candidato["similitud"]
+                }
+        else:
+            logger.info(
+                "💡 Pregunta similar a %s (similitud %.2f), se consulta a OpenAI",
+                candidato["consulta_id"], candidato["similitud"]
+            )
+    return None
+
+
+def registrar_pregunta_respondida(course_id, asistente_id, consulta_id, pregunta):
+    """Agrega una consulta recién completada al índice del curso (si está cargado)."""
+    indice = _indices.get(course_id)
+    if indice is not None:
+        indice.agregar(consulta_id, asistente_id, calcular_firma(pregunta))
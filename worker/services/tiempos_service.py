@@ -0,0 +1,91 @@
+# worker/services/tiempos_service.py
+import datetime
+import logging
+import time
+from contextlib import contextmanager
+from shared.models.db import db, TiempoConsulta
+from shared.helpers.metricas import CONSULTAS_PROCESADAS
+from shared.helpers.trazas import tramo
+
+logger = logging.getLogger(__name__)
+
+ETAPAS = (
+    "crear_hilo",
+    "crear_mensaje",
+    "run_en_cola",
+    "run_en_progreso",
+    "obtener_mensaje",
+    "postproceso",
+    "commit",
+)
+
+
+class TiemposConsulta:
+    """
+    Cronómetro por etapas de una consulta (ms) y uso de tokens del run.
+    Se guarda en tiempos_consulta al terminar, fuera de la transacción principal.
+    """
+
+    def __init__(self, consulta):
+        self.consulta_id = consulta.consulta_id
+        self.course_id = consulta.course_id
+        self.asistente_id = consulta.asistente_id
+        self.inicio = time.monotonic()
+        self.espera_cola_ms = None
+        if consulta.timestamp:
+            espera = datetime.datetime.utcnow() - consulta.timestamp
+            self.espera_cola_ms = max(0, int(espera.total_seconds() * 1000))
+        self.etapas = {}
+        self.tokens_prompt = None
+        self.tokens_completion = None
+        self.tokens_file_search = None
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide la etapa y la abre como span de la traza de la consulta."""
+        t0 = time.monotonic()
+        try:
+            with tramo(f"consulta.{nombre}"):
+                yield
+        finally:
+            self.sumar(nombre, time.monotonic() - t0)
+
+    def sumar(self, nombre, segundos):
+        self.etapas[nombre] = self.etapas.get(nombre, 0) + int(segundos * 1000)
+
+    def registrar_uso(self, run):
+        usage = getattr(run, "usage", None)
+        if usage is not None:
+            self.tokens_prompt = getattr(usage, "prompt_tokens", None)
+            self.tokens_completion = getattr(usage, "completion_tokens", None)
+
+    def registrar_paso(self, paso):
+        """Suma los tokens de los pasos de herramienta (file_search) del run."""
+        detalles = getattr(paso, "step_details", None)
+        usage = getattr(paso, "usage", None)
+        if getattr(detalles, "type", None) != "tool_calls" or usage is None:
+            return
+        if any(getattr(c, "type", None) == "file_search" for c in detalles.tool_calls or []):
+            self.tokens_file_search = (self.tokens_file_search or 0) + (usage.total_tokens or 0)
+
+    def guardar(self, origen):
+        """Inserta la fila de tiempos (origen: openai, cache, similar o error). Nunca lanza."""
+        CONSULTAS_PROCESADAS.labels(origen).inc()
+        try:
+            fila = TiempoConsulta(
+                consulta_id=self.consulta_id,
+                course_id=self.course_id,
+                asistente_id=self.asistente_id,
+                origen=origen,
+                espera_cola_ms=self.espera_cola_ms,
+                total_ms=int((time.monotonic() - self.inicio) * 1000),
+                tokens_prompt=self.tokens_prompt,
+                tokens_completion=self.tokens_completion,
+                tokens_file_search=self.tokens_file_search,
+                **{f"{nombre}_ms": self.etapas.get(nombre) for nombre in ETAPAS}
+            )
+            db.session.merge(fila)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"⚠️ No se pudieron guardar los tiempos de {self.consulta_id}: {e}")
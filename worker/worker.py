@@ -1,15 +1,15 @@
 # worker/worker.py
 import time
 import logging
-from config import DATABASE_URL, POLLING_INTERVAL
+import signal
+import sys
+from config import DATABASE_URL, POLLING_INTERVAL, MAX_CONSULTAS_CONCURRENTES, METRICAS_PUERTO_WORKER
 from shared.models.db import db
+from shared.helpers.registro import configurar_logging
 from flask import Flask
 
 # === Configurar logging ===
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configurar_logging("asistente-worker")
 logger = logging.getLogger(__name__)
 
 # === Crear app para el worker ===
@@ -19,7 +19,8 @@ def create_worker_app():
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'pool_pre_ping': True,
         'pool_recycle': 300,  # Recicla conexiones cada 5 min
-        'pool_size': 5,       # Máximo 5 conexiones en el pool
+        # Cada consulta en paralelo usa su sesión + el bloqueo del hilo
+        'pool_size': MAX_CONSULTAS_CONCURRENTES * 2 + 1,
         'max_overflow': 2,    # Hasta 2 adicionales si es necesario
         'pool_timeout': 30    # Timeout si no hay conexión disponible
     }
@@ -30,20 +31,85 @@ def create_worker_app():
 def main():
     app = create_worker_app()
 
+    from services.consulta_service import procesar_consulta_individual
+    from services.despachador import DespachadorConsultas
+    despachador = DespachadorConsultas(
+        app,
+        procesar_consulta_individual,
+        max_workers=MAX_CONSULTAS_CONCURRENTES
+    )
+
+    # Aplicar migraciones pendientes (columnas e índices) antes de empezar
+    from shared.models.migraciones import migrar
+    with app.app_context():
+        try:
+            migrar()
+        except Exception as e:
+            logger.error(f"❌ Error aplicando migraciones: {e}")
+
+    # Trazas: continúan las iniciadas en el formulario (traceparent de la consulta)
+    from shared.helpers.trazas import configurar_trazas, instrumentar_db
+    configurar_trazas("asistente-worker")
+    with app.app_context():
+        instrumentar_db(db.engine)
+
+    # Métricas en un puerto aparte (el worker no expone Flask)
+    if METRICAS_PUERTO_WORKER:
+        from shared.helpers.metricas import iniciar_servidor_metricas, instrumentar_pool, registrar_gauge_calculado
+        from shared.models.db_services import contar_consultas_en_curso
+
+        def consultas_en_curso():
+            with app.app_context():
+                return contar_consultas_en_curso()
+
+        with app.app_context():
+            instrumentar_pool(db.engine)
+        registrar_gauge_calculado(
+            "asistente_consultas_en_curso",
+            "Consultas pendientes o procesando",
+            "estado",
+            consultas_en_curso
+        )
+        iniciar_servidor_metricas(METRICAS_PUERTO_WORKER)
+
+    # docker stop envía SIGTERM: salir del ciclo igual que con Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
     logger.info("🚀 Worker local iniciado")
+    try:
+        _ciclo(app, despachador)
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("🛑 Deteniendo worker: esperando las consultas en proceso")
+    finally:
+        despachador.cerrar()
 
+def _ciclo(app, despachador):
     while True:
         try:
             # ✅ Usar app_context una sola vez
             with app.app_context():
                 # === 1. Procesar consultas (cada 5 segundos) ===
-                from services.consulta_service import procesar_nuevas_consultas
-                procesar_nuevas_consultas()
+                from services.consulta_service import procesar_nuevas_consultas, recuperar_consultas_colgadas
+                recuperar_consultas_colgadas()
+                procesar_nuevas_consultas(despachador)
 
-                # === 2. Sincronizar archivos (cada 30 min) ===
+                # === 2. Volcar contadores de uso de Redis a la DB ===
+                from shared.models.db_services import sincronizar_uso_redis
+                sincronizar_uso_redis()
+
+                # === 3. Sincronizar archivos (cada 30 min) ===
                 from services.archivo_service import sincronizar_archivos_canvas
                 sincronizar_archivos_canvas()
 
+                # === 4. Archivar meses viejos de historial y mensajes (cada 6 h) ===
+                from services.retencion_service import aplicar_retencion
+                aplicar_retencion()
+
+                # === 5. Agregados de uso (cada 15 min) y exportación diaria ===
+                from services.analitica_service import actualizar_resumenes, exportar_analitica
+                actualizar_resumenes()
+                exportar_analitica()
+
             # ✅ Esperar antes del próximo ciclo
             time.sleep(POLLING_INTERVAL)  # 5 segundos
 